@@ -0,0 +1,331 @@
+"""
+Модуль автоматического выбора лучшего сервера
+"""
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+from circuit_breaker import CircuitBreaker
+from connection_checker import ConnectionChecker, HandshakeResult
+from key_loader import KeyLoader
+from key_pool import KeyPool
+from key_store import KeyStore
+from latency_history import LatencyHistory
+from latency_stats import LatencyStats
+from probe_engine import ProbeEngine
+from config_cache import ConfigCache
+
+
+class Candidate:
+    """Сервер-кандидат и результаты его проверок"""
+
+    __slots__ = ('key', 'host', 'port', 'tcp_ms', 'stats', 'handshake', 'history', 'score')
+
+    def __init__(self, key: Dict[str, str], host: str, port: int, tcp_ms: float):
+        """
+        Args:
+            key: Ключ {'name': '...', 'url': 'vless://...'}
+            host, port: Адрес сервера
+            tcp_ms: Время подключения при первичной проверке
+        """
+        self.key = key
+        self.host = host
+        self.port = port
+        self.tcp_ms = tcp_ms
+        self.stats: Optional[LatencyStats] = None  # Серия TCP подключений
+        self.handshake: Optional[HandshakeResult] = None  # None - ключ без TLS
+        self.history: Optional[Dict[str, float]] = None  # LatencyHistory.stats
+        self.score = math.inf
+
+
+class AutoSelector:
+    """
+    Автоматический выбор сервера
+
+    1. Все ключи текущего списка проверяются TCP подключением (ProbeEngine).
+    2. FINALISTS самых быстрых серверов проверяются подробно и параллельно:
+       серия подключений (задержка, джиттер, потери) и TLS рукопожатие.
+    3. Кандидаты ранжируются по score (меньше - лучше) с учетом истории
+       проверок; побеждает первый.
+    Весь отбор укладывается в общий срок deadline. Ключи в карантине
+    (CircuitBreaker) не рассматриваются; результаты проверок передаются
+    выключателю.
+    """
+
+    DEADLINE = 15  # Общий срок отбора (сек)
+    SWEEP_SHARE = 0.4  # Доля срока на первичную проверку всех ключей
+    FINALISTS = 16  # Серверов для подробной проверки
+    SAMPLES = 4  # TCP подключений на финалиста
+    TOP_N = 5  # Строк в таблице результатов
+
+    LOSS_WEIGHT = 3.0  # 10% потерь увеличивают score на 30%
+    HISTORY_WEIGHT = 1.0  # Вклад доли неудач по истории
+    MIN_HISTORY = 3  # Замеров в истории, после которых она учитывается
+
+    @staticmethod
+    def score(candidate: Candidate) -> float:
+        """
+        Оценка кандидата (мс с поправками; inf - непригоден)
+
+        (avg задержки TCP + TLS рукопожатие + джиттер)
+            * (1 + LOSS_WEIGHT * потери)
+            * (1 + HISTORY_WEIGHT * доля неудач по истории)
+        """
+        stats = candidate.stats
+        handshake = candidate.handshake
+        if stats is None or not stats.ok:
+            return math.inf
+        if handshake is not None and not handshake.ok:
+            return math.inf
+
+        latency = stats.avg + stats.jitter
+        if handshake is not None:
+            latency += handshake.handshake_ms
+        score = latency * (1 + AutoSelector.LOSS_WEIGHT * stats.loss)
+
+        history = candidate.history
+        if history is not None and history['samples'] >= AutoSelector.MIN_HISTORY:
+            score *= 1 + AutoSelector.HISTORY_WEIGHT * (1 - history['success_rate'])
+        return score
+
+    @staticmethod
+    def current_keys() -> List[Dict[str, str]]:
+        """Текущий список ключей (загружается, если еще не загружен)"""
+        keys = KeyLoader.get_keys()
+        if keys:
+            return keys
+        sources = KeyLoader.get_sources()
+        if sources == [KeyLoader.GITHUB_URL]:
+            return KeyLoader.load_keys_from_github(force_refresh=False)
+        return KeyLoader.load_keys_from_sources(sources)
+
+    @staticmethod
+    def filter_keys(keys: List[Dict[str, str]], port: Optional[int] = None,
+                    transport: Optional[str] = None, security: Optional[str] = None,
+                    not_failed_within: Optional[float] = None) -> List[Dict[str, str]]:
+        """
+        Оставляет ключи, подходящие под условия (выборка по индексам KeyStore)
+
+        Ключи, которых еще нет в хранилище (оно отстает от текущего списка),
+        проверяются по разобранным полям в памяти; сбоев у них не записано.
+
+        Args:
+            keys: Ключи [{'name': '...', 'url': 'vless://...'}, ...]
+            port, transport, security, not_failed_within: Как у KeyStore.query
+
+        Returns:
+            Подходящие ключи в исходном порядке
+        """
+        with KeyStore() as store:
+            matched = {row['url'] for row in store.query(port=port, transport=transport, security=security,
+                                                         not_failed_within=not_failed_within)}
+            stored = store.existing(key['url'] for key in keys)
+
+        def matches(url: str) -> bool:
+            if url in matched:
+                return True
+            if url in stored:
+                return False
+            _, key_port, key_transport, key_security = KeyStore._describe(url)
+            return all(value is None or value == actual for value, actual in (
+                (port, key_port), (transport, key_transport), (security, key_security)))
+
+        return [key for key in keys if matches(key['url'])]
+
+    @staticmethod
+    def _finalists(keys: List[Dict[str, str]], deadline: float, history: LatencyHistory,
+                   sweep: Dict[str, Tuple[bool, Optional[str]]]) -> List[Candidate]:
+        """
+        Первичная проверка всех ключей и выбор самых быстрых разных серверов
+
+        Args:
+            sweep: Заполняется результатами проверки: URL -> (успех, ошибка);
+                в выключатель их передает rank, чтобы у ключа был один исход
+        """
+        pool = KeyPool.from_keys(keys)
+        probes = {}
+        endpoints = {}  # URL -> (IP, порт), к которому подключилась проверка
+        now = time.time()
+        for result in ProbeEngine.iter_probe(keys, deadline=deadline):
+            idx = pool.index_of(result.url)
+            if idx is not None:
+                pool.update_probe(idx, result.latency_ms if result.ok else None, timestamp=now)
+            if result.address is not None:
+                endpoints[result.url] = (result.address, result.port)
+            if result.skipped:
+                continue  # Не проверен к сроку: ни успех, ни неудача
+            sweep[result.url] = (result.ok, result.error)
+            if result.host is not None and (result.host, result.port) not in probes:
+                probes[(result.host, result.port)] = result
+                server = LatencyHistory.server_id(result.host, result.port)
+                history.record(server, result.latency_ms if result.ok else None, now)
+
+        alive = pool.filter(flags_none=KeyPool.FLAG_INVALID | KeyPool.FLAG_DEAD)
+        print(f"  Доступно: {len(alive)} из {len(keys)}")
+
+        finalists = []
+        seen = set()
+        for idx in pool.sort('latency', alive):
+            key = pool.key(idx)
+            host_port = (key['host'].strip('[]'), key['port'])
+            # Разные имена одного сервера (один IP и порт) - один финалист
+            endpoint = endpoints.get(key['url'], host_port)
+            if endpoint in seen:
+                continue
+            seen.add(endpoint)
+            finalists.append(Candidate(pool.keys([idx])[0], host_port[0], host_port[1], key['latency']))
+            if len(finalists) >= AutoSelector.FINALISTS:
+                break
+        return finalists
+
+    @staticmethod
+    def _inspect(candidate: Candidate) -> Tuple[LatencyStats, Optional[HandshakeResult]]:
+        """Подробная проверка кандидата: серия подключений и TLS рукопожатие"""
+        params = ConfigCache.shared().parse(candidate.key['url'])
+        stats = ConnectionChecker.measure_latency(
+            candidate.host, candidate.port, samples=AutoSelector.SAMPLES, timeout=2, interval=0.05)
+        handshake = None
+        if params['security'] in ('tls', 'reality') and stats.ok:
+            sni = (params.get('sni') or '').split(',')[0].strip() or None
+            handshake = ConnectionChecker.check_handshake(
+                candidate.host, candidate.port, sni, params.get('alpn'), timeout=3)
+        return stats, handshake
+
+    @staticmethod
+    def rank(keys: List[Dict[str, str]], deadline: float = DEADLINE) -> List[Candidate]:
+        """
+        Проверяет ключи и ранжирует серверы
+
+        Returns:
+            Кандидаты по возрастанию score (непригодные - в конце)
+        """
+        started = time.monotonic()
+        history = LatencyHistory.shared()
+        breaker = CircuitBreaker.shared()
+
+        allowed = breaker.filter(keys)
+        print(f"\n[1/3] Проверка доступности: {len(allowed)} ключей...")
+        if len(allowed) < len(keys):
+            print(f"  В карантине после повторных неудач: {len(keys) - len(allowed)}")
+        sweep: Dict[str, Tuple[bool, Optional[str]]] = {}
+        finalists = AutoSelector._finalists(allowed, deadline * AutoSelector.SWEEP_SHARE,
+                                            history, sweep)
+        if not finalists:
+            AutoSelector._record_sweep(breaker, sweep)
+            AutoSelector._save(history, breaker)
+            return []
+
+        print(f"[2/3] Подробная проверка {len(finalists)} самых быстрых серверов...")
+        remaining = max(deadline - (time.monotonic() - started), 1.0)
+        executor = ThreadPoolExecutor(max_workers=len(finalists), thread_name_prefix='auto-select')
+        try:
+            futures = [executor.submit(AutoSelector._inspect, c) for c in finalists]
+            wait(futures, timeout=remaining)
+        finally:
+            # Не дожидаемся кандидатов, не успевших к сроку
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        print("[3/3] Ранжирование...")
+        for candidate, future in zip(finalists, futures):
+            # Не успевшие к сроку кандидаты остаются без результатов (score = inf)
+            if future.done() and not future.cancelled() and future.exception() is None:
+                candidate.stats, candidate.handshake = future.result()
+            candidate.history = history.stats(LatencyHistory.server_id(candidate.host, candidate.port))
+            candidate.score = AutoSelector.score(candidate)
+            if candidate.stats is not None:
+                # Подробная проверка заменяет результат первичной: один исход на ключ.
+                # Не успевшие к сроку остаются с результатом первичной проверки
+                reason = candidate.handshake.error if candidate.handshake is not None else None
+                sweep[candidate.key['url']] = (math.isfinite(candidate.score),
+                                               reason or "сервер не отвечает")
+        AutoSelector._record_sweep(breaker, sweep)
+        AutoSelector._save(history, breaker)
+
+        return sorted(finalists, key=lambda c: c.score)
+
+    @staticmethod
+    def _record_sweep(breaker: CircuitBreaker, outcomes: Dict[str, Tuple[bool, Optional[str]]]) -> None:
+        """Передает выключателю и KeyStore по одному исходу на ключ"""
+        now = time.time()
+        for url, (ok, error) in outcomes.items():
+            breaker.record(url, ok, error, now)
+        KeyLoader.record_probes((url, ok) for url, (ok, _) in outcomes.items())
+
+    @staticmethod
+    def _save(history: LatencyHistory, breaker: CircuitBreaker) -> None:
+        try:
+            history.save()
+            breaker.save()
+        except OSError:
+            pass  # История и карантин - вспомогательные данные
+
+    @staticmethod
+    def print_ranking(candidates: List[Candidate], top_n: int = TOP_N) -> None:
+        """Печатает лучших кандидатов с показателями, из которых сложился score"""
+        print("\n" + "=" * 78)
+        print(f"{'#':>2}  {'Сервер':<24} {'Score':>6} {'TCP':>6} {'p95':>6} {'Джит.':>6} "
+              f"{'Потери':>6} {'TLS':>6} {'Ист.':>5}")
+        print("-" * 78)
+        for i, c in enumerate(candidates[:top_n], 1):
+            name = c.key['name'][:24]
+            if c.stats is None:
+                print(f"{i:>2}  {name:<24} {'—':>6}  не успел к сроку")
+                continue
+            if not c.stats.ok:
+                print(f"{i:>2}  {name:<24} {'—':>6}  недоступен")
+                continue
+            if c.handshake is None:
+                tls = 'нет'
+            elif c.handshake.ok:
+                tls = f"{c.handshake.handshake_ms:.0f}"
+            else:
+                tls = 'ошиб.'
+            rate = c.history['success_rate'] if c.history else None
+            history = f"{rate:.0%}" if rate is not None else '—'
+            score = f"{c.score:.0f}" if math.isfinite(c.score) else '—'
+            print(f"{i:>2}  {name:<24} {score:>6} {c.stats.avg:>6.0f} {c.stats.p95:>6.0f} "
+                  f"{c.stats.jitter:>6.0f} {c.stats.loss:>6.0%} {tls:>6} {history:>5}")
+            if c.handshake is not None and not c.handshake.ok:
+                print(f"    TLS: {c.handshake.error}")
+        print("=" * 78)
+        print("Score = (TCP avg + TLS + джиттер) × (1 + 3×потери) × (1 + доля неудач в истории), мс")
+
+    @staticmethod
+    def select(keys: Optional[List[Dict[str, str]]] = None, deadline: float = DEADLINE,
+               top_n: int = TOP_N, criteria: Optional[Dict[str, any]] = None) -> Optional[str]:
+        """
+        Выбирает лучший сервер
+
+        Args:
+            keys: Ключи (по умолчанию - текущий список KeyLoader)
+            deadline: Общий срок отбора (сек)
+            top_n: Сколько лучших кандидатов показать
+            criteria: Условия отбора ключей (аргументы filter_keys)
+
+        Returns:
+            VLESS URL победителя или None, если пригодных серверов нет
+        """
+        if keys is None:
+            keys = AutoSelector.current_keys()
+        if keys and criteria:
+            total = len(keys)
+            keys = AutoSelector.filter_keys(keys, **criteria)
+            print(f"Подходят под условия: {len(keys)} из {total}")
+        if not keys:
+            print("✗ Нет ключей для автовыбора")
+            return None
+
+        candidates = AutoSelector.rank(keys, deadline)
+        if not candidates:
+            print("✗ Ни один сервер не ответил")
+            return None
+
+        AutoSelector.print_ranking(candidates, top_n)
+        winner = candidates[0]
+        if not math.isfinite(winner.score):
+            print("✗ Пригодных серверов не найдено")
+            return None
+
+        print(f"\n✓ Выбран: {winner.key['name']} (score {winner.score:.0f})")
+        return winner.key['url']
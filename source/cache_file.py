@@ -0,0 +1,187 @@
+"""
+Модуль атомарной работы с файлом кэша
+"""
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:  # Linux/Mac
+    msvcrt = None
+
+
+class CacheFile:
+    """
+    JSON файл кэша с атомарной записью и кэшированием в памяти
+
+    - Прочитанное содержимое хранится в памяти и перечитывается, только
+      если у файла изменились время изменения, размер или inode.
+    - Запись идет во временный файл с последующим переименованием
+      под межпроцессной блокировкой (файл <путь>.lock).
+    - При compress=True файл пишется сжатым (gzip); при чтении формат
+      определяется автоматически, поэтому старые файлы остаются читаемыми.
+
+    Возвращаемый read() словарь общий для всех читателей - его нельзя
+    изменять на месте; для изменений используйте update().
+    """
+
+    GZIP_MAGIC = b'\x1f\x8b'
+    LOCK_TIMEOUT = 10  # Сколько секунд ждать блокировку
+
+    _instances: Dict[str, 'CacheFile'] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, path: str, compress: bool = False):
+        """
+        Args:
+            path: Путь к файлу кэша
+            compress: Записывать файл в сжатом виде (gzip)
+        """
+        self.path = os.path.abspath(path)
+        self.compress = compress
+        self._lock = threading.RLock()
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._data: Dict = {}
+
+    @staticmethod
+    def get(path: str, compress: bool = False) -> 'CacheFile':
+        """Возвращает общий для процесса объект CacheFile для указанного пути"""
+        key = os.path.abspath(path)
+        with CacheFile._instances_lock:
+            cache_file = CacheFile._instances.get(key)
+            if cache_file is None:
+                cache_file = CacheFile(key, compress)
+                CacheFile._instances[key] = cache_file
+            cache_file.compress = compress
+            return cache_file
+
+    @staticmethod
+    def _stat_signature(stat: os.stat_result) -> Tuple[int, int, int]:
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def read(self) -> Dict:
+        """
+        Возвращает содержимое файла (пустой словарь, если файла нет или он поврежден)
+        """
+        with self._lock:
+            try:
+                signature = self._stat_signature(os.stat(self.path))
+            except OSError:
+                self._signature = None
+                self._data = {}
+                return self._data
+
+            if signature != self._signature:
+                self._data = self._load()
+                self._signature = signature
+            return self._data
+
+    def _load(self) -> Dict:
+        """Читает и декодирует файл с диска"""
+        try:
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+            if raw.startswith(self.GZIP_MAGIC):
+                raw = gzip.decompress(raw)
+            data = json.loads(raw.decode('utf-8'))
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError, EOFError):
+            return {}
+
+    def write(self, data: Dict) -> None:
+        """Атомарно записывает содержимое файла под блокировкой"""
+        with self._lock, CacheFile.lock(self.path):
+            self._write_unlocked(data)
+
+    def update(self, mutator: Callable[[Dict], None]) -> Dict:
+        """
+        Атомарно изменяет файл: чтение, изменение и запись под одной блокировкой
+
+        Args:
+            mutator: Функция, изменяющая переданную ей копию содержимого
+
+        Returns:
+            Новое содержимое файла
+        """
+        with self._lock, CacheFile.lock(self.path):
+            data = dict(self.read())
+            mutator(data)
+            self._write_unlocked(data)
+            return data
+
+    def _write_unlocked(self, data: Dict) -> None:
+        raw = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        if self.compress:
+            raw = gzip.compress(raw, compresslevel=6)
+        CacheFile.write_atomic(self.path, [raw])
+
+        self._data = data
+        try:
+            self._signature = self._stat_signature(os.stat(self.path))
+        except OSError:
+            self._signature = None
+
+    @staticmethod
+    def write_atomic(path: str, chunks: Iterable[bytes]) -> None:
+        """
+        Атомарно записывает файл: временный файл, fsync и переименование
+
+        Вызывающий должен держать блокировку lock(path), если файл пишут
+        несколько процессов.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.',
+                                        suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @staticmethod
+    @contextmanager
+    def lock(path: str) -> Iterator[None]:
+        """Межпроцессная блокировка файла через файл <путь>.lock"""
+        fd = os.open(os.path.abspath(path) + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            elif msvcrt is not None:
+                deadline = time.time() + CacheFile.LOCK_TIMEOUT
+                while True:
+                    try:
+                        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        if time.time() > deadline:
+                            raise
+                        time.sleep(0.05)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
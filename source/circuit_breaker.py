@@ -0,0 +1,198 @@
+"""
+Модуль автоматического выключателя (карантина) для неработающих ключей
+"""
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from cache_file import CacheFile
+from key_index import KeyIndex
+
+
+class CircuitBreaker:
+    """
+    Выключатель на каждый ключ: закрыт - открыт - полуоткрыт
+
+    - closed: ключ используется как обычно, неудачи подряд считаются;
+    - open: после FAILURE_THRESHOLD неудач подряд ключ уходит в карантин -
+      он скрыт из автовыбора и показывается в меню последним;
+    - half_open: по истечении времени карантина ключ можно попробовать
+      снова. Успех закрывает выключатель, неудача снова открывает его
+      с удвоенным временем карантина (до MAX_COOLDOWN).
+    Результаты бывают двух видов. PROBE - проверка доступности сервера
+    (TCP/TLS); CONNECT - итог попытки подключения через Xray (запуск и
+    прохождение трафика по туннелю). Успех любого вида закрывает
+    выключатель, открытый неудачами проверок доступности. Если же среди
+    неудач была неудача подключения (сервер доступен, но ключ не работает:
+    неверный UUID, отвергнутая конфигурация), закрыть выключатель может
+    только успешное подключение - доступность порта ничего не доказывает.
+
+    Ключи различаются по отпечатку KeyIndex.fingerprint, поэтому копии
+    одного ключа под разными именами делят общий выключатель. Состояние
+    хранится в BREAKER_FILE и переживает перезапуск; записываются только
+    ключи с неудачами.
+    """
+
+    BREAKER_FILE = 'circuit_breaker.json'
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    PROBE = 'probe'  # Проверка доступности сервера
+    CONNECT = 'connect'  # Попытка подключения через Xray
+
+    FAILURE_THRESHOLD = 3  # Неудач подряд до открытия
+    COOLDOWN = 300.0  # Первый карантин (сек)
+    MAX_COOLDOWN = 6 * 3600.0
+    MAX_AGE = 7 * 24 * 3600.0  # Записи без событий дольше этого забываются
+
+    _shared: Optional['CircuitBreaker'] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Файл состояния (по умолчанию - BREAKER_FILE)
+        """
+        self.path = path or self.BREAKER_FILE
+        self._lock = threading.Lock()
+        self._fingerprints: Dict[str, str] = {}
+        self._dirty = set()
+        data = CacheFile.get(self.path).read()
+        self._entries: Dict[str, Dict] = {fp: dict(entry) for fp, entry in data.get('keys', {}).items()}
+
+    @staticmethod
+    def shared() -> 'CircuitBreaker':
+        """Возвращает общий для процесса выключатель (загружается из BREAKER_FILE)"""
+        with CircuitBreaker._shared_lock:
+            if CircuitBreaker._shared is None:
+                CircuitBreaker._shared = CircuitBreaker()
+            return CircuitBreaker._shared
+
+    def _fingerprint(self, url: str) -> str:
+        fp = self._fingerprints.get(url)
+        if fp is None:
+            fp = KeyIndex.fingerprint(url)
+            self._fingerprints[url] = fp
+        return fp
+
+    def _state(self, entry: Optional[Dict], now: float) -> str:
+        if entry is None or entry['state'] == self.CLOSED:
+            return self.CLOSED
+        if now >= entry['opened_at'] + entry['cooldown']:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def state(self, url: str, now: Optional[float] = None) -> str:
+        """Состояние выключателя ключа: CLOSED, OPEN или HALF_OPEN"""
+        with self._lock:
+            entry = self._entries.get(self._fingerprint(url))
+            return self._state(entry, time.time() if now is None else now)
+
+    def allow(self, url: str, now: Optional[float] = None) -> bool:
+        """Можно ли использовать ключ (выключатель закрыт или полуоткрыт)"""
+        return self.state(url, now) != self.OPEN
+
+    def retry_in(self, url: str, now: Optional[float] = None) -> float:
+        """Сколько секунд осталось до конца карантина (0 - ключ доступен)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(self._fingerprint(url))
+            if self._state(entry, now) != self.OPEN:
+                return 0.0
+            return entry['opened_at'] + entry['cooldown'] - now
+
+    def record(self, url: str, ok: bool, reason: Optional[str] = None,
+               now: Optional[float] = None, source: str = PROBE) -> str:
+        """
+        Учитывает результат проверки или подключения
+
+        Args:
+            url: VLESS URL
+            ok: Успешен ли результат
+            reason: Причина неудачи (для отображения)
+            now: Время события (по умолчанию - текущее)
+            source: Вид результата: PROBE или CONNECT
+
+        Returns:
+            Новое состояние выключателя
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            fp = self._fingerprint(url)
+            entry = self._entries.get(fp)
+            if ok:
+                if entry is None:
+                    return self.CLOSED
+                if source == self.PROBE and entry.get('source') == self.CONNECT:
+                    # Сервер доступен, но подключение через него не удавалось
+                    return self._state(entry, now)
+                del self._entries[fp]
+                self._dirty.add(fp)
+                return self.CLOSED
+
+            state = self._state(entry, now)
+            if entry is None:
+                entry = {'state': self.CLOSED, 'failures': 0, 'opened_at': 0.0, 'cooldown': 0.0,
+                         'source': self.PROBE}
+                self._entries[fp] = entry
+            if source == self.CONNECT:
+                entry['source'] = self.CONNECT
+            entry['updated'] = now
+            if reason:
+                entry['reason'] = reason
+            self._dirty.add(fp)
+
+            if state == self.OPEN:
+                return state  # Карантин уже идет, новые неудачи его не продлевают
+            if state == self.HALF_OPEN:
+                # Пробная попытка не удалась - карантин вдвое дольше
+                entry['opened_at'] = now
+                entry['cooldown'] = min(entry['cooldown'] * 2, self.MAX_COOLDOWN)
+                return self.OPEN
+
+            entry['failures'] += 1
+            if entry['failures'] >= self.FAILURE_THRESHOLD:
+                entry['state'] = self.OPEN
+                entry['opened_at'] = now
+                entry['cooldown'] = self.COOLDOWN
+                return self.OPEN
+            return self.CLOSED
+
+    def filter(self, keys: Iterable[Dict[str, str]], now: Optional[float] = None) -> List[Dict[str, str]]:
+        """Ключи, не находящиеся в карантине"""
+        now = time.time() if now is None else now
+        return [key for key in keys if self.allow(key['url'], now)]
+
+    def sort_keys(self, keys: Iterable[Dict[str, str]],
+                  now: Optional[float] = None) -> List[Dict[str, str]]:
+        """Ключи в карантине - в конец списка, порядок остальных сохраняется"""
+        now = time.time() if now is None else now
+        return sorted(keys, key=lambda key: not self.allow(key['url'], now))
+
+    def save(self) -> None:
+        """
+        Сохраняет изменения в файл
+
+        Записываются только ключи, изменившиеся в этом процессе, поэтому
+        изменения, сделанные параллельно другим процессом, не теряются.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            changes = {fp: dict(self._entries[fp]) if fp in self._entries else None for fp in self._dirty}
+            self._dirty = set()
+
+        def apply(data: Dict) -> None:
+            now = time.time()
+            entries = {fp: entry for fp, entry in data.get('keys', {}).items()
+                       if now - entry.get('updated', now) < self.MAX_AGE}
+            for fp, entry in changes.items():
+                if entry is None:
+                    entries.pop(fp, None)
+                else:
+                    entries[fp] = entry
+            data['keys'] = entries
+
+        CacheFile.get(self.path).update(apply)
@@ -0,0 +1,117 @@
+"""
+Модуль кэширования разбора VLESS URL и генерации конфигурации Xray
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from vless_parser import VlessKey
+from xray_config import XrayConfigGenerator
+
+
+class ConfigCache:
+    """
+    Ограниченный LRU кэш по хешу URL
+
+    Для каждого ключа хранит VlessKey, результат VLESSURLParser.parse и сгенерированный
+    outbound (вместе с streamSettings). Повторное подключение к тому же ключу
+    стоит одного поиска в словаре и подстановки локальных портов.
+
+    Возвращаемые словари общие для всех вызывающих - их нельзя изменять.
+    Статистика считает одно обращение на операцию: если URL уже разобран
+    через parse, generate вызывается с count=False.
+    """
+
+    # Через общий кэш разбирают ключи проверки, автовыбор, индекс и хранилище,
+    # поэтому в него должен помещаться весь список ключей подписки
+    MAX_SIZE = 4096
+
+    _shared: Optional['ConfigCache'] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_size: int = MAX_SIZE):
+        """
+        Args:
+            max_size: Максимальное количество хранимых ключей
+        """
+        self.max_size = max_size
+        self._entries: 'OrderedDict[bytes, Dict[str, any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def shared() -> 'ConfigCache':
+        """Возвращает общий для процесса кэш"""
+        with ConfigCache._shared_lock:
+            if ConfigCache._shared is None:
+                ConfigCache._shared = ConfigCache()
+            return ConfigCache._shared
+
+    @staticmethod
+    def _url_key(vless_url: str) -> bytes:
+        return hashlib.blake2b(vless_url.encode('utf-8'), digest_size=16).digest()
+
+    def _entry(self, vless_url: str, count: bool = True) -> Dict[str, any]:
+        """Возвращает (создавая при промахе) запись кэша для URL"""
+        key = self._url_key(vless_url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += count
+                return entry
+            self.misses += count
+
+        # Разбор выполняется вне блокировки; ошибки разбора не кэшируются
+        vless_key = VlessKey.from_url(vless_url)
+        entry = {'key': vless_key, 'params': vless_key.to_dict(), 'outbound': None}
+        with self._lock:
+            entry = self._entries.setdefault(key, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def parse(self, vless_url: str) -> Dict[str, any]:
+        """Кэшированный VLESSURLParser.parse"""
+        return self._entry(vless_url)['params']
+
+    def outbound(self, vless_url: str, count: bool = True) -> Dict:
+        """Кэшированный XrayConfigGenerator.generate_outbound"""
+        entry = self._entry(vless_url, count)
+        outbound = entry['outbound']
+        if outbound is None:
+            outbound = XrayConfigGenerator.generate_outbound(entry['key'])
+            entry['outbound'] = outbound
+        return outbound
+
+    def generate(self, vless_url: str, local_port: int = 10808, socks_port: int = 10809,
+                 count: bool = True) -> Dict:
+        """
+        Кэшированный XrayConfigGenerator.generate
+
+        Outbound берется из кэша, заново собираются только inbounds с портами.
+
+        Args:
+            count: Учитывать обращение в статистике; False - URL уже
+                получен через parse в рамках той же операции
+        """
+        return XrayConfigGenerator.build_config(
+            self.outbound(vless_url, count),
+            local_port=local_port,
+            socks_port=socks_port
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Статистика кэша: попадания, промахи, размер"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+    def clear(self) -> None:
+        """Очищает кэш и счетчики"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
@@ -1,16 +1,66 @@
 """
 Модуль для проверки соединения и пинга до сервера
 """
+import ipaddress
 import socket
+import ssl
 import subprocess
 import platform
+import threading
 import time
-from typing import Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, Optional, Dict, List
+
+from endpoint_resolver import EndpointResolver
+from icmp_pinger import IcmpPinger
+from latency_stats import LatencyStats
+from config_cache import ConfigCache
+
+
+class HandshakeResult:
+    """Результат проверки TLS рукопожатия"""
+    
+    __slots__ = ('ok', 'connect_ms', 'handshake_ms', 'error', 'tls_version', 'alpn')
+    
+    def __init__(self, ok: bool, connect_ms: Optional[float] = None,
+                 handshake_ms: Optional[float] = None, error: Optional[str] = None,
+                 tls_version: Optional[str] = None, alpn: Optional[str] = None):
+        """
+        Args:
+            ok: Соединение и рукопожатие (если оно нужно) успешны
+            connect_ms: Время TCP подключения в мс (None - не подключились)
+            handshake_ms: Время TLS рукопожатия в мс (None - не выполнено)
+            error: Сообщение об ошибке
+            tls_version: Согласованная версия TLS
+            alpn: Согласованный протокол ALPN
+        """
+        self.ok = ok
+        self.connect_ms = connect_ms
+        self.handshake_ms = handshake_ms
+        self.error = error
+        self.tls_version = tls_version
+        self.alpn = alpn
+    
+    @property
+    def total_ms(self) -> Optional[float]:
+        """Время до готовности соединения (TCP + TLS)"""
+        if self.connect_ms is None:
+            return None
+        return self.connect_ms + (self.handshake_ms or 0.0)
+    
+    def __repr__(self) -> str:
+        if not self.ok:
+            return f"HandshakeResult(✗ {self.error})"
+        return (f"HandshakeResult(tcp {self.connect_ms:.0f} мс, "
+                f"tls {self.handshake_ms or 0:.0f} мс, {self.tls_version})")
 
 
 class ConnectionChecker:
     """Проверка соединения с сервером"""
     
+    _tls_contexts: Dict[Tuple[str, ...], ssl.SSLContext] = {}
+    _tls_contexts_lock = threading.Lock()
+    
     @staticmethod
     def check_port(host: str, port: int, timeout: int = 5) -> Tuple[bool, Optional[str]]:
         """
@@ -25,22 +75,205 @@ class ConnectionChecker:
             Tuple[bool, Optional[str]]: (успешно, сообщение об ошибке)
         """
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(timeout)
-            result = sock.connect_ex((host, port))
+            # IPv4 и IPv6 адреса из общего кэша DNS, подключение - happy eyeballs
+            sock = EndpointResolver.connect(host, port, timeout)
             sock.close()
-            
-            if result == 0:
-                return True, None
-            else:
-                return False, f"Порт {port} недоступен"
+            return True, None
         except socket.gaierror:
             return False, f"Не удалось разрешить адрес {host}"
         except socket.timeout:
             return False, f"Таймаут подключения к {host}:{port}"
+        except OSError:
+            return False, f"Порт {port} недоступен"
         except Exception as e:
             return False, f"Ошибка подключения: {e}"
     
+    @staticmethod
+    def measure_latency(host: str, port: int, samples: int = 5, timeout: float = 2,
+                        interval: float = 0.1) -> LatencyStats:
+        """
+        Измеряет задержку по времени установки TCP соединения с портом сервера
+        
+        В отличие от ping замеряется путь до самого VLESS порта, без запуска
+        внешних процессов и без ICMP, который часто блокируется. Адрес
+        берется из общего кэша EndpointResolver, DNS в замеры не входит.
+        Адрес выбирается пробным подключением по схеме happy eyeballs, оно
+        в замеры не входит (включает задержку перебора адресов); все замеры -
+        подключения к победившему адресу, поэтому у серверов с IPv4 и IPv6
+        замеряется самый быстрый путь.
+        
+        Args:
+            host: Адрес сервера
+            port: Порт сервера
+            samples: Количество подключений
+            timeout: Таймаут одного подключения в секундах
+            interval: Пауза между подключениями в секундах
+            
+        Returns:
+            LatencyStats (потерянными считаются отказы и таймауты)
+        """
+        if not EndpointResolver.lookup(host):
+            return LatencyStats([None] * samples)
+        
+        family = sockaddr = None
+        results: List[Optional[float]] = []
+        for i in range(samples):
+            if i:
+                time.sleep(interval)
+            if sockaddr is None:
+                # Пробное подключение: выбирает адрес, но не замеряется
+                try:
+                    sock = EndpointResolver.connect(host, port, timeout)
+                except OSError:
+                    results.append(None)
+                    continue
+                family, sockaddr = sock.family, sock.getpeername()
+                sock.close()
+        
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            try:
+                sock.settimeout(timeout)
+                start = time.perf_counter()
+                result = sock.connect_ex(sockaddr)
+                elapsed = (time.perf_counter() - start) * 1000
+                results.append(elapsed if result == 0 else None)
+            except OSError:
+                results.append(None)
+            finally:
+                sock.close()
+        return LatencyStats(results)
+    
+    @staticmethod
+    def _tls_context(alpn: Tuple[str, ...]) -> ssl.SSLContext:
+        """
+        Контекст TLS для проверки рукопожатия (один на набор ALPN)
+        
+        Сертификат не проверяется: Reality сервер отдает сертификат сайта
+        маскировки, а цель проверки - живость сервера, а не его подлинность.
+        """
+        with ConnectionChecker._tls_contexts_lock:
+            context = ConnectionChecker._tls_contexts.get(alpn)
+            if context is None:
+                context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+                if alpn:
+                    context.set_alpn_protocols(list(alpn))
+                ConnectionChecker._tls_contexts[alpn] = context
+            return context
+    
+    @staticmethod
+    def check_handshake(host: str, port: int, sni: Optional[str] = None,
+                        alpn: Optional[List[str]] = None, timeout: float = 5) -> HandshakeResult:
+        """
+        Подключается к серверу и выполняет TLS рукопожатие
+        
+        Мертвый TLS/Reality сервер часто еще принимает TCP соединение, но
+        сбрасывает или не завершает рукопожатие - такая проверка отличает
+        рабочие серверы гораздо точнее, чем проверка порта.
+        
+        Args:
+            host: Адрес сервера
+            port: Порт сервера
+            sni: Имя сервера для ClientHello (по умолчанию - host, если это не IP)
+            alpn: Предлагаемые протоколы ALPN
+            timeout: Таймаут подключения и рукопожатия (каждого) в секундах
+        """
+        host = host.strip('[]')
+        if not sni:
+            try:
+                ipaddress.ip_address(host)
+            except ValueError:
+                sni = host  # SNI не может быть IP адресом
+        
+        if not EndpointResolver.lookup(host):
+            return HandshakeResult(False, error=f"Не удалось разрешить адрес {host}")
+        
+        start = time.perf_counter()
+        try:
+            sock = EndpointResolver.connect(host, port, timeout)
+        except socket.timeout:
+            return HandshakeResult(False, error=f"Таймаут подключения к {host}:{port}")
+        except OSError as e:
+            return HandshakeResult(False, error=f"Порт {port} недоступен ({e.strerror or e})")
+        connect_ms = (time.perf_counter() - start) * 1000
+        
+        try:
+            context = ConnectionChecker._tls_context(tuple(alpn or ()))
+            tls_sock = context.wrap_socket(sock, server_hostname=sni or None,
+                                           do_handshake_on_connect=False)
+            sock = tls_sock
+            start = time.perf_counter()
+            try:
+                tls_sock.do_handshake()
+            except socket.timeout:
+                return HandshakeResult(False, connect_ms, error="Таймаут TLS рукопожатия")
+            except ssl.SSLError as e:
+                return HandshakeResult(False, connect_ms, error=f"Ошибка TLS: {e.reason or e}")
+            except OSError as e:
+                return HandshakeResult(False, connect_ms,
+                                       error=f"Соединение разорвано при рукопожатии ({e.strerror or e})")
+            handshake_ms = (time.perf_counter() - start) * 1000
+            return HandshakeResult(True, connect_ms, handshake_ms,
+                                   tls_version=tls_sock.version(),
+                                   alpn=tls_sock.selected_alpn_protocol())
+        finally:
+            sock.close()
+    
+    @staticmethod
+    def check_handshakes(keys: List[Dict[str, str]], timeout: float = 5,
+                         max_workers: int = 32) -> Dict[str, HandshakeResult]:
+        """
+        Параллельно проверяет рукопожатие для списка ключей
+        
+        Для ключей с security=tls/reality выполняется TLS рукопожатие с их
+        sni и alpn, для остальных - только TCP подключение. Ключи с одинаковыми
+        адресом, sni и alpn проверяются один раз.
+        
+        Args:
+            keys: Ключи [{'name': '...', 'url': 'vless://...'}, ...]
+            timeout: Таймаут одной проверки в секундах
+            max_workers: Максимум одновременных проверок
+            
+        Returns:
+            Dict[str, HandshakeResult]: URL ключа -> результат
+        """
+        results = {}
+        targets: Dict[Tuple, List[str]] = {}
+        for key in keys:
+            try:
+                params = ConfigCache.shared().parse(key['url'])
+            except Exception as e:
+                results[key['url']] = HandshakeResult(False, error=f"Ошибка разбора: {e}")
+                continue
+            if params['security'] in ('tls', 'reality'):
+                # Для Reality допускается список имен - в ClientHello идет первое
+                sni = (params.get('sni') or '').split(',')[0].strip() or None
+                target = (params['host'], params['port'], True, sni, tuple(params.get('alpn') or ()))
+            else:
+                target = (params['host'], params['port'], False, None, ())
+            targets.setdefault(target, []).append(key['url'])
+        
+        def check(target: Tuple) -> HandshakeResult:
+            host, port, use_tls, sni, alpn = target
+            if use_tls:
+                return ConnectionChecker.check_handshake(host, port, sni, list(alpn), timeout)
+            stats = ConnectionChecker.measure_latency(host, port, samples=1, timeout=timeout)
+            if stats.ok:
+                return HandshakeResult(True, stats.min)
+            return HandshakeResult(False, error=f"Порт {port} недоступен")
+        
+        if not targets:
+            return results
+        
+        workers = max(1, min(max_workers, len(targets)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tls-check') as executor:
+            for target, result in zip(targets, executor.map(check, list(targets))):
+                for url in targets[target]:
+                    results[url] = result
+        
+        return results
+    
     @staticmethod
     def ping_host(host: str, count: int = 4, timeout: int = 3) -> Tuple[bool, Optional[str], Optional[float]]:
         """
@@ -54,8 +287,15 @@ class ConnectionChecker:
         Returns:
             Tuple[bool, Optional[str], Optional[float]]: (успешно, сообщение, средний пинг в мс)
         """
+        # Без привилегий и без внешнего процесса, если система это разрешает
+        stats = IcmpPinger.ping_many([host], count=count, timeout=timeout)
+        if stats is not None and host in stats:
+            if stats[host].ok:
+                return True, None, stats[host].avg
+            return False, f"Сервер {host} недоступен (ping failed)", None
+        
         try:
-            # Определяем команду ping в зависимости от ОС
+            # ICMP сокеты запрещены - используем системную команду ping
             if platform.system().lower() == 'windows':
                 cmd = ['ping', '-n', str(count), '-w', str(timeout * 1000), host]
             else:
@@ -104,14 +344,40 @@ class ConnectionChecker:
         return None
     
     @staticmethod
-    def check_connection(host: str, port: int, check_ping: bool = True) -> Tuple[bool, str]:
+    def _ping_diagnosis(host: str) -> Optional[str]:
+        """
+        Пингует хост через IcmpPinger (без внешних процессов)
+
+        Returns:
+            Сообщение для отчета или None, если ICMP сокеты без привилегий
+            недоступны для семейства адресов хоста
         """
-        Полная проверка соединения: порт + пинг
+        if not IcmpPinger.available():
+            return None
+        print(f"  Проверка ping до {host}...", end=' ', flush=True)
+        stats = IcmpPinger.ping_many([host], count=2, timeout=1, interval=0.1)
+        if stats is None or host not in stats:
+            print("-")
+            return None
+        if stats[host].ok:
+            print("✓")
+            return f"Ping: хост отвечает ({stats[host].avg:.0f} мс) - закрыт или фильтруется только порт"
+        print("✗")
+        return "Ping: хост не отвечает"
+
+    @staticmethod
+    def check_connection(host: str, port: int, check_ping: bool = True, tls: bool = False,
+                         sni: Optional[str] = None, alpn: Optional[List[str]] = None) -> Tuple[bool, str]:
+        """
+        Полная проверка соединения: порт + TLS рукопожатие + задержка
         
         Args:
             host: Адрес сервера
             port: Порт для проверки
-            check_ping: Проверять ли пинг
+            check_ping: Измерять ли задержку (серией TCP подключений; если
+                порт недоступен - ping хоста, когда ICMP разрешен)
+            tls: Проверять ли TLS рукопожатие (для security=tls/reality)
+            sni, alpn: Параметры рукопожатия из ключа
             
         Returns:
             Tuple[bool, str]: (успешно, сообщение)
@@ -135,25 +401,35 @@ class ConnectionChecker:
             messages.append(f"Порт {port}: ошибка проверки ({e})")
             all_ok = False
         
-        # Проверка пинга
-        if check_ping:
-            print(f"  Проверка пинга до {host}...", end=' ', flush=True)
+        # Порт недоступен: ICMP показывает, жив ли сам хост (закрыт порт или хост)
+        if not all_ok and check_ping:
+            diagnosis = ConnectionChecker._ping_diagnosis(host)
+            if diagnosis is not None:
+                messages.append(diagnosis)
+        
+        # TLS рукопожатие: мертвый сервер может принимать TCP, но не TLS
+        if tls and all_ok:
+            print(f"  Проверка TLS рукопожатия...", end=' ', flush=True)
+            result = ConnectionChecker.check_handshake(host, port, sni, alpn, timeout=5)
+            if result.ok:
+                print("✓")
+                messages.append(f"TLS: {result.tls_version}, рукопожатие {result.handshake_ms:.0f} мс")
+            else:
+                print("✗")
+                messages.append(f"TLS: {result.error}")
+                all_ok = False
+        
+        # Измерение задержки серией TCP подключений к тому же порту
+        if check_ping and all_ok:
+            print(f"  Измерение задержки до {host}:{port}...", end=' ', flush=True)
             try:
-                ping_ok, ping_error, avg_ping = ConnectionChecker.ping_host(host, count=3, timeout=2)
-                if ping_ok:
-                    ping_msg = f"Пинг: доступен"
-                    if avg_ping:
-                        ping_msg += f" (средний: {avg_ping:.0f} мс)"
-                    print("✓")
-                    messages.append(ping_msg)
-                else:
-                    print("✗")
-                    messages.append(f"Пинг: {ping_error}")
-                    # Пинг не критичен, не делаем all_ok = False
+                stats = ConnectionChecker.measure_latency(host, port, samples=5, timeout=2)
+                print("✓" if stats.ok else "✗")
+                messages.append(f"Задержка: {stats}")
+                # Задержка не критична, не делаем all_ok = False
             except Exception as e:
                 print("✗")
-                messages.append(f"Пинг: ошибка проверки ({e})")
-                # Пинг не критичен
+                messages.append(f"Задержка: ошибка проверки ({e})")
         
         status_msg = " | ".join(messages)
         
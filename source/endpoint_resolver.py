@@ -0,0 +1,195 @@
+"""
+Модуль разрешения адресов серверов
+"""
+import errno
+import os
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+Endpoint = Tuple[str, int]
+Address = Tuple[int, str]  # (семейство, IP)
+
+
+class EndpointResolver:
+    """
+    Разрешение хостов ключей в конечные точки (IP, порт)
+
+    Результаты DNS кэшируются на время TTL (неудачные - на NEGATIVE_TTL),
+    кэш общий для всех проверок процесса, поэтому повторные раунды проверок
+    не платят за DNS. Подключение к серверу с A и AAAA записями выполняется
+    по схеме happy eyeballs: адреса пробуются с небольшой задержкой друг
+    за другом, побеждает первое установленное соединение.
+    """
+
+    MAX_WORKERS = 16  # Одновременных DNS запросов
+    TTL = 300  # Время жизни успешного результата (сек); getaddrinfo не сообщает TTL записи
+    NEGATIVE_TTL = 30  # Время жизни неудачного результата (сек)
+    MAX_ENTRIES = 4096
+    HAPPY_EYEBALLS_DELAY = 0.25  # Задержка перед попыткой следующего адреса (сек)
+
+    # Хост -> (момент устаревания, адреса [(семейство, IP), ...] или None)
+    _cache: Dict[str, Tuple[float, Optional[List[Address]]]] = {}
+    _cache_lock = threading.Lock()
+
+    @staticmethod
+    def _interleave(addresses: List[Address]) -> List[Address]:
+        """Чередует семейства адресов, начиная с предпочтительного (RFC 8305)"""
+        if not addresses:
+            return addresses
+        first = [a for a in addresses if a[0] == addresses[0][0]]
+        other = [a for a in addresses if a[0] != addresses[0][0]]
+        result = []
+        for i in range(max(len(first), len(other))):
+            result.extend(group[i] for group in (first, other) if i < len(group))
+        return result
+
+    @staticmethod
+    def lookup(host: str) -> Optional[List[Address]]:
+        """
+        Разрешает имя в адреса IPv4 и IPv6 с кэшированием
+
+        Returns:
+            Адреса [(семейство, IP), ...] в порядке попыток подключения
+            или None, если имя не разрешается
+        """
+        host = host.strip('[]')
+        now = time.monotonic()
+        with EndpointResolver._cache_lock:
+            entry = EndpointResolver._cache.get(host)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        try:
+            infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+            addresses = EndpointResolver._interleave(list(dict.fromkeys(
+                (family, sockaddr[0]) for family, _, _, _, sockaddr in infos
+                if family in (socket.AF_INET, socket.AF_INET6)
+            ))) or None
+        except (socket.gaierror, UnicodeError, OSError):
+            addresses = None
+
+        ttl = EndpointResolver.TTL if addresses else EndpointResolver.NEGATIVE_TTL
+        with EndpointResolver._cache_lock:
+            cache = EndpointResolver._cache
+            if len(cache) >= EndpointResolver.MAX_ENTRIES:
+                for key in [k for k, (expires, _) in cache.items() if expires <= now] or list(cache)[:1]:
+                    del cache[key]
+            cache[host] = (now + ttl, addresses)
+        return addresses
+
+    @staticmethod
+    def lookup_many(hosts: Iterable[str]) -> Dict[str, Optional[List[Address]]]:
+        """
+        Разрешает несколько имен параллельно (не больше MAX_WORKERS запросов сразу)
+
+        Returns:
+            Словарь имя -> результат lookup
+        """
+        hosts = list(dict.fromkeys(hosts))
+        if not hosts:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(EndpointResolver.MAX_WORKERS, len(hosts)),
+                                thread_name_prefix='endpoint-resolver') as executor:
+            return dict(zip(hosts, executor.map(EndpointResolver.lookup, hosts)))
+
+    @staticmethod
+    def clear_cache() -> None:
+        """Очищает кэш DNS"""
+        with EndpointResolver._cache_lock:
+            EndpointResolver._cache.clear()
+
+    @staticmethod
+    def resolve(host: str, port: int) -> Optional[Endpoint]:
+        """
+        Разрешает адрес сервера
+
+        Returns:
+            (IP, порт) предпочтительного адреса или None, если адрес не разрешается
+        """
+        addresses = EndpointResolver.lookup(host)
+        if not addresses:
+            return None
+        return addresses[0][1], port
+
+    @staticmethod
+    def connect(host: str, port: int, timeout: float = 5) -> socket.socket:
+        """
+        Устанавливает TCP соединение по схеме happy eyeballs
+
+        Первый адрес пробуется сразу, каждый следующий - через
+        HAPPY_EYEBALLS_DELAY или сразу после неудачи предыдущего.
+        Побеждает первое установленное соединение, остальные закрываются.
+
+        Returns:
+            Подключенный сокет (с таймаутом timeout)
+
+        Raises:
+            socket.gaierror: Адрес не разрешается
+            socket.timeout: Ни одно подключение не установлено за timeout
+            OSError: Все адреса отказали (последняя ошибка)
+        """
+        addresses = EndpointResolver.lookup(host)
+        if not addresses:
+            raise socket.gaierror(f"Не удалось разрешить адрес {host}")
+
+        deadline = time.monotonic() + timeout
+        remaining = list(addresses)
+        attempts: Dict[socket.socket, Address] = {}
+        last_error: Optional[OSError] = None
+        selector = selectors.DefaultSelector()
+        winner = None
+        try:
+            while winner is None:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                if remaining:
+                    family, ip = remaining.pop(0)
+                    sock = socket.socket(family, socket.SOCK_STREAM)
+                    sock.setblocking(False)
+                    result = sock.connect_ex((ip, port))
+                    if result == 0:
+                        winner = sock
+                        break
+                    if result in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+                        attempts[sock] = (family, ip)
+                        selector.register(sock, selectors.EVENT_WRITE)
+                    else:
+                        last_error = OSError(result, os.strerror(result))
+                        sock.close()
+                        continue
+
+                if not attempts:
+                    if not remaining:
+                        break
+                    continue
+
+                wait = deadline - now
+                if remaining:
+                    wait = min(wait, EndpointResolver.HAPPY_EYEBALLS_DELAY)
+                for key, _ in selector.select(max(wait, 0)):
+                    sock = key.fileobj
+                    selector.unregister(sock)
+                    del attempts[sock]
+                    error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if error == 0:
+                        winner = sock
+                        break
+                    last_error = OSError(error, os.strerror(error))
+                    sock.close()
+        finally:
+            selector.close()
+            for sock in attempts:
+                if sock is not winner:
+                    sock.close()
+
+        if winner is None:
+            if last_error is not None and not attempts and not remaining:
+                raise last_error
+            raise socket.timeout(f"Таймаут подключения к {host}:{port}")
+        winner.settimeout(timeout)
+        return winner
@@ -0,0 +1,290 @@
+"""
+Модуль HTTP транспорта для загрузки подписок
+"""
+import http.client
+import threading
+import time
+import urllib.parse
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+
+class HTTPTransportError(Exception):
+    """Ошибка HTTP запроса (неуспешный код ответа или слишком много перенаправлений)"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class HttpResponse:
+    """
+    Ответ на запрос HttpTransport
+
+    Тело читается потоково через read(size) и при Content-Encoding: gzip
+    распаковывается на лету. Статистика (переданные байты, задержки)
+    заполняется по мере чтения и окончательна после close().
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, transport: 'HttpTransport', pool_key: Tuple[str, str, int],
+                 conn: http.client.HTTPConnection, response: http.client.HTTPResponse,
+                 url: str, started: float, reused: bool):
+        self._transport = transport
+        self._pool_key = pool_key
+        self._conn = conn
+        self._response = response
+        self._buffer = b''
+        self._closed = False
+
+        self.url = url
+        self.status = response.status
+        self.headers = response.headers
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+
+        encoding = (response.headers.get('Content-Encoding') or '').strip().lower()
+        if encoding in ('gzip', 'x-gzip'):
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            self._decompressor = zlib.decompressobj()
+        else:
+            self._decompressor = None
+
+        self.stats: Dict[str, any] = {
+            'url': url,
+            'status': response.status,
+            'reused': reused,  # Соединение взято из пула keep-alive
+            'bytes': 0,  # Байт тела ответа получено по сети
+            'decoded_bytes': 0,  # Байт после распаковки
+            'ttfb_ms': (time.perf_counter() - started) * 1000,  # До заголовков ответа
+            'elapsed_ms': None,  # До конца тела ответа
+        }
+        self._started = started
+
+    @property
+    def not_modified(self) -> bool:
+        """True, если сервер ответил 304 Not Modified"""
+        return self.status == 304
+
+    def __enter__(self) -> 'HttpResponse':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _read_raw(self) -> bytes:
+        """Читает следующий кусок тела и распаковывает его"""
+        while True:
+            raw = self._response.read(self.CHUNK_SIZE)
+            if not raw:
+                if self._decompressor is not None:
+                    data = self._decompressor.flush()
+                    self._decompressor = None
+                    self.stats['decoded_bytes'] += len(data)
+                    return data
+                return b''
+
+            self.stats['bytes'] += len(raw)
+            data = self._decompressor.decompress(raw) if self._decompressor else raw
+            if data:
+                self.stats['decoded_bytes'] += len(data)
+                return data
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Читает распакованное тело ответа
+
+        Args:
+            size: Максимум байт (-1 - до конца)
+        """
+        if self._closed:
+            return b''
+
+        if size is None or size < 0:
+            parts = [self._buffer]
+            self._buffer = b''
+            while True:
+                data = self._read_raw()
+                if not data:
+                    break
+                parts.append(data)
+            self._finish()
+            return b''.join(parts)
+
+        while len(self._buffer) < size:
+            data = self._read_raw()
+            if not data:
+                break
+            self._buffer += data
+
+        result, self._buffer = self._buffer[:size], self._buffer[size:]
+        if not result:
+            self._finish()
+        return result
+
+    def _finish(self) -> None:
+        if self.stats['elapsed_ms'] is None:
+            self.stats['elapsed_ms'] = (time.perf_counter() - self._started) * 1000
+
+    def close(self) -> None:
+        """Закрывает ответ; полностью прочитанное соединение возвращается в пул"""
+        if self._closed:
+            return
+        self._closed = True
+        self._finish()
+
+        if self._response.length == 0:
+            self._response.read()  # Пустое тело (например, 304) - помечаем ответ дочитанным
+        reusable = self._response.isclosed() and not self._response.will_close
+        if not reusable:
+            # Тело дочитано не до конца - соединение нельзя переиспользовать
+            self._response.close()
+        self._transport._release(self._pool_key, self._conn, reusable)
+        self._transport._record(self.stats)
+
+
+class HttpTransport:
+    """
+    HTTP клиент для загрузки подписок
+
+    - Отправляет Accept-Encoding: gzip и распаковывает ответ потоково.
+    - Держит keep-alive соединения к каждому хосту и переиспользует их
+      между источниками (потокобезопасный пул).
+    - Поддерживает условные запросы (If-None-Match / If-Modified-Since):
+      ответ 304 возвращается как обычный ответ с not_modified = True.
+    - Для каждого запроса сохраняет статистику: байты и задержки.
+    """
+
+    USER_AGENT = 'blackeggsx-vpn-client'
+    MAX_REDIRECTS = 5
+    MAX_IDLE_PER_HOST = 4
+    HISTORY_SIZE = 100
+
+    def __init__(self, timeout: float = 10):
+        """
+        Args:
+            timeout: Таймаут соединения и чтения в секундах
+        """
+        self.timeout = timeout
+        self._idle: Dict[Tuple[str, str, int], List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self.history: List[Dict[str, any]] = []
+
+    def _acquire(self, pool_key: Tuple[str, str, int]) -> Tuple[http.client.HTTPConnection, bool]:
+        """Берет свободное соединение из пула или создает новое"""
+        with self._lock:
+            idle = self._idle.get(pool_key)
+            if idle:
+                return idle.pop(), True
+
+        scheme, host, port = pool_key
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=self.timeout)
+        return conn, False
+
+    def _release(self, pool_key: Tuple[str, str, int], conn: http.client.HTTPConnection,
+                 reusable: bool) -> None:
+        """Возвращает соединение в пул (или закрывает его)"""
+        if reusable:
+            with self._lock:
+                idle = self._idle.setdefault(pool_key, [])
+                if len(idle) < self.MAX_IDLE_PER_HOST:
+                    idle.append(conn)
+                    return
+        conn.close()
+
+    def _record(self, stats: Dict[str, any]) -> None:
+        with self._lock:
+            self.history.append(stats)
+            if len(self.history) > self.HISTORY_SIZE:
+                del self.history[:-self.HISTORY_SIZE]
+
+    def close(self) -> None:
+        """Закрывает все свободные соединения"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+    def fetch(self, url: str, etag: Optional[str] = None,
+              last_modified: Optional[str] = None) -> HttpResponse:
+        """
+        Выполняет GET запрос
+
+        Args:
+            url: Адрес (http:// или https://)
+            etag: ETag из прошлого ответа (If-None-Match)
+            last_modified: Last-Modified из прошлого ответа (If-Modified-Since)
+
+        Returns:
+            HttpResponse со статусом 2xx или 304 (тело читается потоково)
+
+        Raises:
+            HTTPTransportError: Код ответа 4xx/5xx или слишком много перенаправлений
+            OSError, http.client.HTTPException: Сетевые ошибки
+        """
+        headers = {
+            'User-Agent': self.USER_AGENT,
+            'Accept-Encoding': 'gzip',
+            'Connection': 'keep-alive',
+        }
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        for _ in range(self.MAX_REDIRECTS + 1):
+            response = self._request(url, headers)
+            if response.status in (301, 302, 303, 307, 308):
+                location = response.headers.get('Location')
+                response.read()
+                response.close()
+                if not location:
+                    raise HTTPTransportError(f"HTTP {response.status} без Location", response.status)
+                url = urllib.parse.urljoin(url, location)
+                continue
+
+            if response.status >= 400:
+                status = response.status
+                response.close()
+                raise HTTPTransportError(f"HTTP Error {status}: {url}", status)
+
+            return response
+
+        raise HTTPTransportError(f"Слишком много перенаправлений: {url}")
+
+    def _request(self, url: str, headers: Dict[str, str]) -> HttpResponse:
+        """Отправляет запрос, повторяя его один раз, если переиспользованное соединение закрыто"""
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ('http', 'https'):
+            raise HTTPTransportError(f"Неподдерживаемая схема URL: {url}")
+
+        port = parts.port or (443 if scheme == 'https' else 80)
+        pool_key = (scheme, parts.hostname or '', port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        while True:
+            conn, reused = self._acquire(pool_key)
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError,
+                    BrokenPipeError, http.client.CannotSendRequest):
+                conn.close()
+                if reused:
+                    continue  # Сервер закрыл простаивающее соединение - пробуем новое
+                raise
+            except Exception:
+                conn.close()
+                raise
+
+            return HttpResponse(self, pool_key, conn, response, url, started, reused)
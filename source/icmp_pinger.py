@@ -0,0 +1,198 @@
+"""
+Модуль ICMP ping без привилегий и без запуска внешних процессов
+"""
+import os
+import selectors
+import socket
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from endpoint_resolver import EndpointResolver
+from latency_stats import LatencyStats
+
+
+class IcmpPinger:
+    """
+    Пакетный ICMP ping через датаграммные ICMP сокеты
+
+    Сокеты SOCK_DGRAM/IPPROTO_ICMP доступны обычному пользователю в Linux
+    (если его группа входит в net.ipv4.ping_group_range) и в macOS. Эхо-запросы
+    ко всем хостам отправляются из одного сокета, ответы ожидаются через
+    selectors (epoll/kqueue), поэтому проверка сотни хостов длится столько же,
+    сколько проверка одного.
+
+    Разрешение проверяется отдельно для IPv4 и IPv6. Если такие сокеты
+    запрещены для обоих семейств, ping_many возвращает None - вызывающий код
+    переходит на другой способ проверки.
+    """
+
+    ECHO_REQUEST = {socket.AF_INET: 8, socket.AF_INET6: 128}
+    ECHO_REPLY = {socket.AF_INET: 0, socket.AF_INET6: 129}
+    PROTOCOL = {socket.AF_INET: socket.IPPROTO_ICMP, socket.AF_INET6: socket.IPPROTO_ICMPV6}
+    PAYLOAD = b'blackeggsx-ping\x00' * 2
+    MAX_WORKERS = 16  # Одновременных DNS запросов
+
+    _available: Dict[int, bool] = {}
+
+    @staticmethod
+    def _open(family: int) -> Optional[socket.socket]:
+        """Открывает датаграммный ICMP сокет (None, если это запрещено)"""
+        try:
+            return socket.socket(family, socket.SOCK_DGRAM, IcmpPinger.PROTOCOL[family])
+        except OSError:
+            # PermissionError - группа не входит в ping_group_range,
+            # иные ошибки - платформа не поддерживает такие сокеты
+            return None
+
+    @staticmethod
+    def available(family: Optional[int] = None) -> bool:
+        """
+        Проверяет, разрешены ли ICMP сокеты без привилегий (результат запоминается)
+
+        Args:
+            family: socket.AF_INET или socket.AF_INET6; None - хотя бы одно из них
+        """
+        if family is None:
+            return any(IcmpPinger.available(f) for f in IcmpPinger.PROTOCOL)
+        if family not in IcmpPinger._available:
+            sock = IcmpPinger._open(family)
+            IcmpPinger._available[family] = sock is not None
+            if sock is not None:
+                sock.close()
+        return IcmpPinger._available[family]
+
+    @staticmethod
+    def _checksum(data: bytes) -> int:
+        if len(data) % 2:
+            data += b'\x00'
+        total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+        total = (total >> 16) + (total & 0xFFFF)
+        total += total >> 16
+        return ~total & 0xFFFF
+
+    @staticmethod
+    def _packet(family: int, seq: int) -> bytes:
+        """Эхо-запрос; идентификатор подставляет ядро (порт сокета)"""
+        header = struct.pack('!BBHHH', IcmpPinger.ECHO_REQUEST[family], 0, 0, 0, seq)
+        if family == socket.AF_INET:
+            # Для ICMPv6 сумму всегда считает ядро (нужен псевдозаголовок)
+            checksum = IcmpPinger._checksum(header + IcmpPinger.PAYLOAD)
+            header = struct.pack('!BBHHH', IcmpPinger.ECHO_REQUEST[family], 0, checksum, 0, seq)
+        return header + IcmpPinger.PAYLOAD
+
+    @staticmethod
+    def _parse_reply(family: int, data: bytes) -> Optional[int]:
+        """Возвращает номер последовательности эхо-ответа (None - не эхо-ответ)"""
+        if family == socket.AF_INET and data and data[0] >> 4 == 4:
+            # macOS отдает пакет вместе с IP заголовком
+            data = data[(data[0] & 0x0F) * 4:]
+        if len(data) < 8 or data[0] != IcmpPinger.ECHO_REPLY[family]:
+            return None
+        return struct.unpack('!H', data[6:8])[0]
+
+    @staticmethod
+    def _resolve(host: str) -> Optional[Tuple[int, str]]:
+        """Предпочтительный адрес хоста из общего кэша DNS"""
+        addresses = EndpointResolver.lookup(host)
+        return addresses[0] if addresses else None
+
+    @staticmethod
+    def ping_many(hosts: Iterable[str], count: int = 3, timeout: float = 2,
+                  interval: float = 0.2) -> Optional[Dict[str, LatencyStats]]:
+        """
+        Пингует несколько хостов одновременно
+
+        Args:
+            hosts: Имена или IP адреса
+            count: Эхо-запросов на хост
+            timeout: Время ожидания ответа на каждый запрос (сек)
+            interval: Пауза между сериями запросов (сек)
+
+        Returns:
+            Словарь хост -> LatencyStats или None, если ICMP сокеты без
+            привилегий недоступны. Хостов, для семейства адресов которых
+            ICMP сокеты запрещены, в словаре нет - их нельзя проверить
+            (в отличие от неразрешенных хостов, у которых все замеры потеряны).
+        """
+        if not IcmpPinger.available():
+            return None
+
+        hosts = list(dict.fromkeys(hosts))
+        samples: Dict[str, List[Optional[float]]] = {host: [None] * count for host in hosts}
+        if not hosts or count <= 0:
+            return {host: LatencyStats(samples[host]) for host in hosts}
+
+        with ThreadPoolExecutor(max_workers=max(1, min(IcmpPinger.MAX_WORKERS, len(hosts))),
+                                thread_name_prefix='icmp-resolver') as executor:
+            addresses = dict(zip(hosts, executor.map(IcmpPinger._resolve, hosts)))
+        for host, address in list(addresses.items()):
+            if address is not None and not IcmpPinger.available(address[0]):
+                del addresses[host]  # Например, IPv6 отключен или запрещен
+                del samples[host]
+
+        selector = selectors.DefaultSelector()
+        sockets: Dict[int, socket.socket] = {}
+        for family in {addr[0] for addr in addresses.values() if addr is not None}:
+            sock = IcmpPinger._open(family)
+            if sock is None:
+                continue  # Разрешение отозвано после проверки - хосты останутся без ответа
+            sock.setblocking(False)
+            sockets[family] = sock
+            selector.register(sock, selectors.EVENT_READ, family)
+
+        # (семейство, номер последовательности) -> (хост, номер замера, время отправки)
+        pending: Dict[Tuple[int, int], Tuple[str, int, float]] = {}
+        seq = int.from_bytes(os.urandom(2), 'big')
+
+        def receive(until: float) -> None:
+            while pending:
+                wait = until - time.perf_counter()
+                if wait <= 0:
+                    return
+                for selector_key, _ in selector.select(wait):
+                    family = selector_key.data
+                    while True:
+                        try:
+                            data, sender = selector_key.fileobj.recvfrom(2048)
+                        except (BlockingIOError, InterruptedError):
+                            break
+                        except OSError:
+                            break  # Например, ICMP ошибка назначения
+                        now = time.perf_counter()
+                        reply_seq = IcmpPinger._parse_reply(family, data)
+                        entry = pending.get((family, reply_seq))
+                        if entry is None:
+                            continue
+                        host, sample, sent_at = entry
+                        if sender[0] != addresses[host][1]:
+                            continue
+                        del pending[(family, reply_seq)]
+                        rtt = now - sent_at
+                        if rtt <= timeout:
+                            samples[host][sample] = rtt * 1000
+
+        try:
+            for sample in range(count):
+                round_start = time.perf_counter()
+                for host, address in addresses.items():
+                    if address is None or address[0] not in sockets:
+                        continue
+                    family, ip = address
+                    seq = (seq + 1) & 0xFFFF
+                    sent_at = time.perf_counter()
+                    try:
+                        sockets[family].sendto(IcmpPinger._packet(family, seq), (ip, 0))
+                    except OSError:
+                        continue  # Сеть недоступна или буфер переполнен - замер потерян
+                    pending[(family, seq)] = (host, sample, sent_at)
+                if sample < count - 1:
+                    receive(round_start + interval)
+            receive(time.perf_counter() + timeout)
+        finally:
+            selector.close()
+            for sock in sockets.values():
+                sock.close()
+
+        return {host: LatencyStats(values) for host, values in samples.items()}
@@ -0,0 +1,188 @@
+"""
+Модуль канонических отпечатков VLESS ключей и индекса для удаления повторов
+"""
+import hashlib
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from config_cache import ConfigCache
+
+
+class KeyIndex:
+    """
+    Хеш-индекс ключей по каноническому отпечатку
+
+    Публичные подписки повторяют один и тот же сервер много раз, меняя
+    только имя (#remark) или порядок параметров. Отпечаток строится из
+    полей, влияющих на подключение, поэтому такие копии схлопываются
+    в один ключ, а все их имена запоминаются.
+    """
+
+    # Параметры, определяющие сервер (остальные - косметика)
+    FINGERPRINT_PARAMS = ('type', 'security', 'sni', 'pbk', 'sid', 'flow', 'path', 'serviceName')
+    # Параметры, значения которых не зависят от регистра
+    CASE_INSENSITIVE = frozenset(('type', 'security', 'sni', 'flow'))
+    DEFAULTS = {'type': 'tcp', 'security': 'none'}
+
+    def __init__(self, keys: Optional[Iterable[Dict[str, str]]] = None,
+                 previous: Optional['KeyIndex'] = None):
+        """
+        Args:
+            keys: Начальный набор ключей [{'name': '...', 'url': 'vless://...'}, ...]
+            previous: Предыдущий индекс - отпечатки уже известных URL берутся
+                из него без повторного разбора
+        """
+        self._keys: Dict[str, Dict[str, str]] = {}
+        self._names: Dict[str, List[str]] = {}
+        self._url_fps: Dict[str, str] = {}
+        self._known_fps: Dict[str, str] = previous._url_fps if previous is not None else {}
+        if keys is not None:
+            self.update(keys)
+
+    @staticmethod
+    def fingerprint(url: str) -> str:
+        """
+        Возвращает канонический отпечаток ключа
+
+        Учитываются uuid, хост, порт и нормализованные параметры из
+        FINGERPRINT_PARAMS. Если URL не разбирается, отпечаток строится
+        по URL без имени.
+        """
+        try:
+            parsed = ConfigCache.shared().parse(url)
+        except Exception:
+            canonical = url.split('#', 1)[0]
+        else:
+            params = parsed['params']
+            parts = [
+                parsed['uuid'].lower(),
+                parsed['host'].lower().strip('[]'),
+                str(parsed['port']),
+            ]
+            for name in KeyIndex.FINGERPRINT_PARAMS:
+                value = params.get(name) or KeyIndex.DEFAULTS.get(name, '')
+                if name in KeyIndex.CASE_INSENSITIVE:
+                    value = value.lower()
+                parts.append(f"{name}={value}")
+            canonical = '\n'.join(parts)
+
+        return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+    def add(self, key: Dict[str, str]) -> bool:
+        """
+        Добавляет ключ в индекс
+
+        Returns:
+            True если это новый сервер, False если такой отпечаток уже есть
+            (тогда имя ключа добавляется к именам существующего)
+        """
+        url = key['url']
+        fp = self._url_fps.get(url) or self._known_fps.get(url)
+        if fp is None:
+            fp = KeyIndex.fingerprint(url)
+        self._url_fps[url] = fp
+        names = [key['name']] + list(key.get('aliases', ()))
+
+        known = self._names.get(fp)
+        if known is None:
+            self._keys[fp] = key
+            self._names[fp] = list(dict.fromkeys(names))
+            return True
+
+        for name in names:
+            if name not in known:
+                known.append(name)
+        return False
+
+    def update(self, keys: Iterable[Dict[str, str]]) -> None:
+        """Добавляет в индекс несколько ключей"""
+        for key in keys:
+            self.add(key)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, fp: str) -> bool:
+        return fp in self._keys
+
+    def has_url(self, url: str) -> bool:
+        """Проверяет, встречался ли в индексе ключ с таким URL"""
+        return url in self._url_fps
+
+    def fingerprints(self) -> Iterator[str]:
+        """Отпечатки в порядке добавления"""
+        return iter(self._keys)
+
+    def get(self, fp: str) -> Optional[Dict[str, str]]:
+        """Возвращает ключ-представитель по отпечатку"""
+        return self._keys.get(fp)
+
+    def names(self, fp: str) -> List[str]:
+        """Возвращает все имена, под которыми встречался сервер"""
+        return list(self._names.get(fp, ()))
+
+    def keys(self) -> List[Dict[str, str]]:
+        """
+        Возвращает уникальные ключи в порядке первого появления
+
+        У ключей с повторами появляется поле 'aliases' - остальные имена.
+        """
+        result = []
+        for fp, key in self._keys.items():
+            aliases = self._names[fp][1:]
+            if aliases:
+                key = {'name': key['name'], 'url': key['url'], 'aliases': aliases}
+            elif 'aliases' in key:
+                key = {'name': key['name'], 'url': key['url']}
+            result.append(key)
+        return result
+
+    def diff(self, previous: Optional['KeyIndex']) -> 'KeyDiff':
+        """
+        Сравнивает индекс с предыдущим снимком по отпечаткам
+
+        Args:
+            previous: Предыдущий индекс (None - пустой)
+        """
+        old_keys = previous._keys if previous is not None else {}
+        added = [key for fp, key in self._keys.items() if fp not in old_keys]
+        removed = [key for fp, key in old_keys.items() if fp not in self._keys]
+        unchanged = [key for fp, key in self._keys.items() if fp in old_keys]
+        return KeyDiff(self.keys(), added, removed, unchanged)
+
+    @staticmethod
+    def unique(keys: Iterable[Dict[str, str]],
+               previous: Optional['KeyIndex'] = None) -> List[Dict[str, str]]:
+        """Удаляет повторы серверов из списка ключей"""
+        return KeyIndex(keys, previous).keys()
+
+
+class KeyDiff:
+    """
+    Разница между двумя снимками ключей
+
+    Потребители могут разбирать и проверять только added и забывать
+    состояние removed вместо обработки всего списка заново.
+    """
+
+    def __init__(self, keys: List[Dict[str, str]], added: List[Dict[str, str]],
+                 removed: List[Dict[str, str]], unchanged: List[Dict[str, str]]):
+        """
+        Args:
+            keys: Новый полный список ключей
+            added: Ключи, которых не было в прошлом снимке
+            removed: Ключи прошлого снимка, которых больше нет
+            unchanged: Ключи, присутствующие в обоих снимках
+        """
+        self.keys = keys
+        self.added = added
+        self.removed = removed
+        self.unchanged = unchanged
+
+    @property
+    def changed(self) -> bool:
+        """True, если набор серверов изменился"""
+        return bool(self.added or self.removed)
+
+    def __repr__(self) -> str:
+        return (f"KeyDiff(+{len(self.added)}, -{len(self.removed)}, "
+                f"={len(self.unchanged)})")
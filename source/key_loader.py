@@ -1,13 +1,20 @@
 """
 Модуль для загрузки VLESS ключей с GitHub
 """
-import urllib.request
-import urllib.error
-from typing import List, Dict, Optional
-import re
+import http.client
 import os
-import json
+import time
+import threading
+from concurrent.futures import Future, wait
 from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from subscription_parser import SubscriptionParser
+from key_index import KeyIndex, KeyDiff
+from key_validator import KeyValidator
+from key_store import KeyStore
+from cache_file import CacheFile
+from http_transport import HttpTransport, HTTPTransportError
 
 
 class KeyLoader:
@@ -16,6 +23,29 @@ class KeyLoader:
     GITHUB_URL = "https://raw.githubusercontent.com/Morty3333/blackeggsx/main/vless_OpenRay_ru.txt"
     CACHE_FILE = 'keys_cache.json'
     CACHE_DURATION = 60  # Кэш на 60 секунд для частой проверки обновлений
+    CACHE_COMPRESS = False  # Хранить кэш сжатым (gzip) - быстрее холодный старт на больших списках
+    
+    # Источники подписок: URL или пути к локальным файлам, по одному в строке.
+    # Если файл отсутствует, используется только GITHUB_URL
+    SOURCES_FILE = 'sources.txt'
+    MAX_WORKERS = 8  # Максимум одновременных загрузок источников
+    SOURCE_TIMEOUT = 10  # Таймаут загрузки одного источника (сек)
+    
+    # Текущий набор ключей и состояние фонового обновления.
+    # Список ключей никогда не изменяется на месте: при обновлении
+    # подменяется ссылка целиком, поэтому читатели всегда видят целый снимок
+    _keys: List[Dict[str, str]] = []
+    _index: Optional[KeyIndex] = None  # Индекс текущего снимка (по отпечаткам)
+    _last_diff: Optional[KeyDiff] = None
+    _keys_lock = threading.Lock()
+    _publish_lock = threading.Lock()  # Упорядочивает подмену снимков
+    _refresh_thread: Optional[threading.Thread] = None
+    _listeners: List[Callable[[KeyDiff], None]] = []
+    keys_updated = threading.Event()
+    
+    # Общий HTTP транспорт: keep-alive соединения переиспользуются между
+    # загрузками и источниками на одном хосте
+    _transport = HttpTransport(timeout=SOURCE_TIMEOUT)
     
     @staticmethod
     def _get_cache_path() -> Path:
@@ -23,41 +53,110 @@ class KeyLoader:
         return Path(KeyLoader.CACHE_FILE)
     
     @staticmethod
-    def _load_cache() -> Optional[Dict]:
-        """Загружает кэш из файла"""
-        cache_path = KeyLoader._get_cache_path()
-        if not cache_path.exists():
-            return None
+    def _cache_file() -> CacheFile:
+        """Возвращает объект файла кэша (общий для процесса)"""
+        return CacheFile.get(str(KeyLoader._get_cache_path()), compress=KeyLoader.CACHE_COMPRESS)
+    
+    @staticmethod
+    def _read_cache_file() -> Dict:
+        """
+        Читает файл кэша целиком, без проверки срока годности
         
+        Результат кэшируется в памяти до изменения файла на диске;
+        возвращаемый словарь нельзя изменять.
+        """
         try:
-            import time
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                cache = json.load(f)
-            
-            # Проверяем, не устарел ли кэш
-            current_time = time.time()
-            cache_time = cache.get('timestamp', 0)
-            
-            if current_time - cache_time > KeyLoader.CACHE_DURATION:
-                return None  # Кэш устарел
-            
-            return cache
+            return KeyLoader._cache_file().read()
+        except:
+            return {}
+    
+    @staticmethod
+    def _update_cache_file(mutator: Callable[[Dict], None]) -> None:
+        """Атомарно изменяет файл кэша (чтение-изменение-запись под блокировкой)"""
+        try:
+            KeyLoader._cache_file().update(mutator)
         except:
+            pass
+    
+    @staticmethod
+    def _load_cache() -> Optional[Dict]:
+        """Загружает кэш из файла"""
+        cache = KeyLoader._read_cache_file()
+        if not cache:
             return None
+        
+        # Проверяем, не устарел ли кэш
+        current_time = time.time()
+        cache_time = cache.get('timestamp', 0)
+        
+        if current_time - cache_time > KeyLoader.CACHE_DURATION:
+            return None  # Кэш устарел
+        
+        return cache
     
     @staticmethod
-    def _save_cache(keys: List[Dict[str, str]], etag: Optional[str] = None) -> None:
+    def _save_cache(keys: List[Dict[str, str]], etag: Optional[str] = None,
+                    last_modified: Optional[str] = None) -> None:
         """Сохраняет кэш в файл"""
-        try:
-            import time
-            cache = {
+        def apply(cache: Dict) -> None:
+            cache.update({
                 'timestamp': time.time(),
                 'keys': keys,
-                'etag': etag
-            }
-            cache_path = KeyLoader._get_cache_path()
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                json.dump(cache, f, ensure_ascii=False, indent=2)
+                'etag': etag,
+                'last_modified': last_modified
+            })
+        
+        KeyLoader._update_cache_file(apply)
+        KeyLoader._sync_store({KeyLoader.GITHUB_URL: keys})
+    
+    @staticmethod
+    def _touch_cache() -> None:
+        """Продлевает срок кэша без перезаписи ключей (сервер ответил 304)"""
+        def apply(cache: Dict) -> None:
+            cache['timestamp'] = time.time()
+        
+        KeyLoader._update_cache_file(apply)
+    
+    @staticmethod
+    def _save_sources_cache(entries: Dict[str, Dict]) -> None:
+        """Сохраняет записи кэша отдельных источников"""
+        def apply(cache: Dict) -> None:
+            sources = cache.get('sources')
+            sources = dict(sources) if isinstance(sources, dict) else {}
+            sources.update(entries)
+            cache['sources'] = sources
+        
+        KeyLoader._update_cache_file(apply)
+        KeyLoader._sync_store({source: entry.get('keys', []) for source, entry in entries.items()})
+    
+    @staticmethod
+    def _sync_store(keys_by_source: Dict[str, List[Dict[str, str]]]) -> None:
+        """Записывает изменения ключей в индексированное хранилище KeyStore"""
+        try:
+            with KeyStore() as store:
+                for source, keys in keys_by_source.items():
+                    store.sync(keys, source)
+        except:
+            pass  # Хранилище - вспомогательный индекс, его ошибки не критичны
+    
+    @staticmethod
+    def record_probe(url: str, ok: bool) -> None:
+        """Запоминает в KeyStore результат проверки ключа"""
+        try:
+            with KeyStore() as store:
+                store.record_result(url, ok)
+        except:
+            pass
+    
+    @staticmethod
+    def record_probes(results: Iterable[Tuple[str, bool]]) -> None:
+        """Запоминает в KeyStore результаты проверки многих ключей (URL, успех)"""
+        results = list(results)
+        if not results:
+            return
+        try:
+            with KeyStore() as store:
+                store.record_results(results)
         except:
             pass
     
@@ -79,101 +178,50 @@ class KeyLoader:
                 keys = cache.get('keys', [])
                 if keys:
                     print(f"✓ Загружено ключей из кэша: {len(keys)}")
+                    KeyLoader._set_keys(keys)
                     # Проверяем обновления в фоне
                     KeyLoader._check_updates_async()
                     return keys
         
         keys = []
-        etag = None
         
         try:
             print("Загрузка ключей с GitHub...")
             
-            # Создаем запрос с проверкой ETag для определения обновлений
-            request = urllib.request.Request(KeyLoader.GITHUB_URL)
+            # Условный запрос: ETag/Last-Modified из кэша позволяют серверу
+            # ответить 304 без тела, если ключи не изменились
+            cache = KeyLoader._read_cache_file()
+            has_cached_keys = bool(cache.get('keys'))
             
-            # Добавляем ETag из кэша, если есть
-            cache = KeyLoader._load_cache()
-            if cache and cache.get('etag'):
-                request.add_header('If-None-Match', cache['etag'])
-            
-            with urllib.request.urlopen(request, timeout=10) as response:
-                # Получаем ETag для кэширования
-                etag = response.headers.get('ETag')
-                
+            with KeyLoader._transport.fetch(
+                KeyLoader.GITHUB_URL,
+                etag=cache.get('etag') if has_cached_keys else None,
+                last_modified=cache.get('last_modified') if has_cached_keys else None
+            ) as response:
                 # Если статус 304 (Not Modified), используем кэш
-                if response.status == 304:
-                    cache = KeyLoader._load_cache()
-                    if cache:
-                        keys = cache.get('keys', [])
-                        print(f"✓ Ключи актуальны (из кэша): {len(keys)}")
-                        return keys
-                
-                content = response.read().decode('utf-8', errors='ignore')
-            
-            # Парсим содержимое файла
-            # Ожидаем формат: каждая строка может быть VLESS URL или содержать его
-            lines = content.strip().split('\n')
-            
-            for i, line in enumerate(lines, 1):
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
+                if response.not_modified:
+                    keys = cache.get('keys', [])
+                    print(f"✓ Ключи актуальны (из кэша): {len(keys)}")
+                    KeyLoader._touch_cache()
+                    KeyLoader._set_keys(keys)
+                    return keys
                 
-                # Ищем VLESS URL в строке
-                vless_match = re.search(r'vless://[^\s]+', line)
-                if vless_match:
-                    vless_url = vless_match.group(0)
-                    
-                    # Пытаемся извлечь имя из комментария или используем номер
-                    name_match = re.search(r'#([^#\n]+)', line)
-                    if name_match:
-                        name = name_match.group(1).strip()
-                    else:
-                        name = f"Сервер {i}"
-                    
-                    keys.append({
-                        'name': name,
-                        'url': vless_url
-                    })
-                elif line.startswith('vless://'):
-                    # Если вся строка - это VLESS URL
-                    name = f"Сервер {i}"
-                    keys.append({
-                        'name': name,
-                        'url': line
-                    })
+                # Парсим содержимое потоково, по мере загрузки
+                # Ожидаем формат: каждая строка может быть VLESS URL или содержать его
+                keys = KeyLoader._ingest(SubscriptionParser.iter_keys_from_stream(response))
             
-            print(f"✓ Загружено ключей: {len(keys)}")
+            stats = response.stats
+            print(f"✓ Загружено ключей: {len(keys)} "
+                  f"({stats['bytes'] / 1024:.0f} КБ, {stats['elapsed_ms']:.0f} мс)")
             
             # Сохраняем в кэш
             if keys:
-                KeyLoader._save_cache(keys, etag)
+                KeyLoader._save_cache(keys, response.etag, response.last_modified)
+                KeyLoader._set_keys(keys)
             
             return keys
             
-        except urllib.error.HTTPError as e:
-            # Если 304 (Not Modified), используем кэш
-            if e.code == 304:
-                cache = KeyLoader._load_cache()
-                if cache:
-                    keys = cache.get('keys', [])
-                    print(f"✓ Ключи актуальны (из кэша): {len(keys)}")
-                    return keys
-            
-            print(f"✗ Ошибка загрузки с GitHub: {e}")
-            print(f"  URL: {KeyLoader.GITHUB_URL}")
-            
-            # Пытаемся использовать кэш при ошибке
-            cache = KeyLoader._load_cache()
-            if cache:
-                keys = cache.get('keys', [])
-                if keys:
-                    print(f"⚠ Используются ключи из кэша: {len(keys)}")
-                    return keys
-            
-            return []
-        except urllib.error.URLError as e:
+        except (HTTPTransportError, OSError, http.client.HTTPException) as e:
             print(f"✗ Ошибка загрузки с GitHub: {e}")
             print(f"  URL: {KeyLoader.GITHUB_URL}")
             
@@ -199,61 +247,351 @@ class KeyLoader:
             
             return []
     
+    @staticmethod
+    def get_sources() -> List[str]:
+        """
+        Возвращает список источников подписок
+        
+        Источники читаются из SOURCES_FILE (строки с '#' - комментарии).
+        """
+        sources = []
+        try:
+            with open(KeyLoader.SOURCES_FILE, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith('#') and line not in sources:
+                        sources.append(line)
+        except OSError:
+            pass
+        return sources or [KeyLoader.GITHUB_URL]
+    
+    @staticmethod
+    def _is_url(source: str) -> bool:
+        """Проверяет, является ли источник URL (иначе это путь к файлу)"""
+        return source.startswith(('http://', 'https://'))
+    
+    @staticmethod
+    def _fetch_source(source: str, entry: Dict) -> Tuple[List[Dict[str, str]], Optional[str], bool]:
+        """
+        Загружает один источник с учетом его ETag
+        
+        Args:
+            source: URL или путь к файлу
+            entry: Запись кэша источника ({'etag': ..., 'last_modified': ..., 'keys': [...]})
+            
+        Returns:
+            Tuple: (ключи, новый ETag, изменился ли источник)
+        """
+        cached_keys = entry.get('keys', [])
+        
+        if not KeyLoader._is_url(source):
+            # Для локальных файлов роль ETag играют время изменения и размер
+            stat = os.stat(source)
+            etag = f"file:{stat.st_mtime_ns}:{stat.st_size}"
+            if etag == entry.get('etag') and cached_keys:
+                return cached_keys, etag, False
+            return KeyLoader._ingest(SubscriptionParser.iter_keys_from_file(source)), etag, True
+        
+        use_validators = bool(cached_keys)
+        with KeyLoader._transport.fetch(
+            source,
+            etag=entry.get('etag') if use_validators else None,
+            last_modified=entry.get('last_modified') if use_validators else None
+        ) as response:
+            if response.not_modified:
+                return cached_keys, entry.get('etag'), False
+            keys = KeyLoader._ingest(SubscriptionParser.iter_keys_from_stream(response))
+        
+        entry['last_modified'] = response.last_modified
+        return keys, response.etag, True
+    
+    @staticmethod
+    def load_keys_from_sources(sources: Optional[List[str]] = None,
+                               force_refresh: bool = False,
+                               timeout: Optional[float] = None) -> List[Dict[str, str]]:
+        """
+        Параллельно загружает ключи из нескольких источников
+        
+        Каждый источник имеет свою запись в кэше и свой ETag. Если источник
+        недоступен или не успел ответить за timeout, используются его ключи
+        из кэша, остальные источники его не ждут.
+        
+        Args:
+            sources: Список URL и путей к файлам (по умолчанию get_sources())
+            force_refresh: Игнорировать сохраненные ETag
+            timeout: Общий срок ожидания всех источников (сек)
+            
+        Returns:
+            Объединенный список ключей без повторов (по отпечатку KeyIndex)
+        """
+        if sources is None:
+            sources = KeyLoader.get_sources()
+        if timeout is None:
+            timeout = KeyLoader.SOURCE_TIMEOUT + 2
+        
+        cached_entries = KeyLoader._read_cache_file().get('sources') or {}
+        entries = {}
+        for source in sources:
+            entry = dict(cached_entries.get(source) or {})
+            entries[source] = {} if force_refresh else entry
+        
+        print(f"Загрузка ключей из источников: {len(sources)}...")
+        
+        futures = KeyLoader._run_in_daemon_threads(
+            KeyLoader._fetch_source,
+            [(source, entries[source]) for source in sources],
+            KeyLoader.MAX_WORKERS
+        )
+        done, pending = wait(futures, timeout=timeout)
+        # Не ждем зависшие источники: еще не начатые загрузки отменяем
+        for future in pending:
+            future.cancel()
+        
+        results = {}
+        updated_entries = {}
+        for future, (source, _) in futures.items():
+            cached_keys = (cached_entries.get(source) or {}).get('keys', [])
+            if future not in done:
+                print(f"⚠ {source}: таймаут, используются ключи из кэша ({len(cached_keys)})")
+                results[source] = cached_keys
+                continue
+            
+            try:
+                keys, etag, changed = future.result()
+            except Exception as e:
+                print(f"✗ {source}: ошибка загрузки ({e}), ключей из кэша: {len(cached_keys)}")
+                results[source] = cached_keys
+                continue
+            
+            results[source] = keys
+            if changed:
+                updated_entries[source] = {
+                    'timestamp': time.time(),
+                    'etag': etag,
+                    'last_modified': entries[source].get('last_modified'),
+                    'keys': keys
+                }
+        
+        if updated_entries:
+            KeyLoader._save_sources_cache(updated_entries)
+        
+        # Объединяем ключи в порядке источников, убирая повторы серверов
+        index = KeyIndex()
+        for source in sources:
+            index.update(results.get(source, []))
+        merged = index.keys()
+        
+        print(f"✓ Загружено ключей: {len(merged)} (источников: {len(sources)})")
+        if merged:
+            KeyLoader._set_keys(merged)
+        return merged
+    
+    @staticmethod
+    def _run_in_daemon_threads(func: Callable, calls: List[Tuple], workers: int) -> Dict[Future, Tuple]:
+        """
+        Выполняет func(*args) для каждого набора аргументов в фоновых потоках
+        
+        В отличие от ThreadPoolExecutor, потоки - daemon: источник, который
+        так и не ответил, не задерживает выход из программы. Еще не начатую
+        задачу можно отменить через Future.cancel().
+        
+        Returns:
+            Dict: Future -> набор аргументов (в порядке calls)
+        """
+        futures = {Future(): args for args in calls}
+        queue = list(futures.items())
+        queue_lock = threading.Lock()
+        
+        def worker():
+            while True:
+                with queue_lock:
+                    if not queue:
+                        return
+                    future, args = queue.pop(0)
+                if not future.set_running_or_notify_cancel():
+                    continue  # Отменена, пока ждала очереди
+                try:
+                    result = func(*args)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        
+        for i in range(max(1, min(workers, len(calls)))):
+            threading.Thread(target=worker, name=f'KeyLoader-source-{i}', daemon=True).start()
+        return futures
+    
+    @staticmethod
+    def get_keys() -> List[Dict[str, str]]:
+        """Возвращает текущий снимок ключей (последний загруженный набор)"""
+        with KeyLoader._keys_lock:
+            return KeyLoader._keys
+    
+    @staticmethod
+    def get_last_diff() -> Optional[KeyDiff]:
+        """
+        Возвращает разницу между двумя последними снимками ключей
+        
+        Returns:
+            KeyDiff (added / removed / unchanged) или None, если ключи еще не загружались
+        """
+        with KeyLoader._keys_lock:
+            return KeyLoader._last_diff
+    
+    @staticmethod
+    def add_update_listener(callback: Callable[[KeyDiff], None]) -> None:
+        """
+        Подписывает обработчик на обновление ключей
+        
+        Обработчик получает KeyDiff: новый полный список (diff.keys) и
+        добавленные/удаленные ключи, чтобы обрабатывать только изменения.
+        Он вызывается из фонового потока, поэтому должен быть коротким
+        и не блокировать поток.
+        """
+        with KeyLoader._keys_lock:
+            if callback not in KeyLoader._listeners:
+                KeyLoader._listeners = KeyLoader._listeners + [callback]
+    
+    @staticmethod
+    def remove_update_listener(callback: Callable[[KeyDiff], None]) -> None:
+        """Отписывает обработчик обновления ключей"""
+        with KeyLoader._keys_lock:
+            KeyLoader._listeners = [cb for cb in KeyLoader._listeners if cb is not callback]
+    
+    @staticmethod
+    def _set_keys(keys: List[Dict[str, str]], notify: bool = False) -> KeyDiff:
+        """
+        Атомарно подменяет текущий набор ключей
+        
+        Разница с прошлым снимком считается по отпечаткам; отпечатки уже
+        известных URL берутся из прошлого индекса, поэтому работа
+        пропорциональна числу новых ключей.
+        
+        Args:
+            keys: Новый список ключей
+            notify: Выставить событие keys_updated и вызвать подписчиков,
+                если набор серверов изменился
+        
+        Returns:
+            KeyDiff относительно прошлого снимка
+        """
+        with KeyLoader._publish_lock:
+            previous = KeyLoader._index
+            index = KeyIndex(keys, previous=previous)
+            diff = index.diff(previous)
+            
+            with KeyLoader._keys_lock:
+                KeyLoader._keys = diff.keys
+                KeyLoader._index = index
+                KeyLoader._last_diff = diff
+                listeners = KeyLoader._listeners
+        
+        if notify and diff.changed:
+            KeyLoader.keys_updated.set()
+            for callback in listeners:
+                try:
+                    callback(diff)
+                except Exception:
+                    pass  # Ошибка подписчика не должна ломать обновление
+        return diff
+    
     @staticmethod
     def _check_updates_async() -> None:
-        """Проверяет обновления в фоновом режиме (не блокирует UI)"""
+        """Запускает проверку обновлений в фоновом потоке (не блокирует UI)"""
+        with KeyLoader._keys_lock:
+            thread = KeyLoader._refresh_thread
+            if thread is not None and thread.is_alive():
+                return  # Проверка уже идет
+            
+            thread = threading.Thread(
+                target=KeyLoader._check_updates,
+                name='KeyLoader-refresh',
+                daemon=True
+            )
+            KeyLoader._refresh_thread = thread
+        thread.start()
+    
+    @staticmethod
+    def wait_for_refresh(timeout: Optional[float] = None) -> bool:
+        """
+        Ожидает завершения фоновой проверки обновлений
+        
+        Returns:
+            True если фоновая проверка не выполняется (или успела завершиться)
+        """
+        thread = KeyLoader._refresh_thread
+        if thread is None:
+            return True
+        thread.join(timeout)
+        return not thread.is_alive()
+    
+    @staticmethod
+    def _check_updates() -> None:
+        """Проверяет обновления на GitHub и публикует новый набор ключей"""
         try:
-            # Создаем запрос с ETag
-            request = urllib.request.Request(KeyLoader.GITHUB_URL)
-            cache = KeyLoader._load_cache()
-            if cache and cache.get('etag'):
-                request.add_header('If-None-Match', cache['etag'])
+            cache = KeyLoader._read_cache_file()
+            has_cached_keys = bool(cache.get('keys'))
+            
+            with KeyLoader._transport.fetch(
+                KeyLoader.GITHUB_URL,
+                etag=cache.get('etag') if has_cached_keys else None,
+                last_modified=cache.get('last_modified') if has_cached_keys else None
+            ) as response:
+                if response.not_modified:
+                    return
+                # Есть обновления, загружаем их
+                keys = KeyLoader._ingest(SubscriptionParser.iter_keys_from_stream(response), quiet=True)
             
-            with urllib.request.urlopen(request, timeout=5) as response:
-                if response.status != 304:
-                    # Есть обновления, загружаем их
-                    content = response.read().decode('utf-8', errors='ignore')
-                    etag = response.headers.get('ETag')
-                    keys = KeyLoader._parse_keys(content)
-                    if keys:
-                        KeyLoader._save_cache(keys, etag)
-                        print(f"  (Обновление: найдено {len(keys)} ключей)")
+            if keys:
+                KeyLoader._save_cache(keys, response.etag, response.last_modified)
+                KeyLoader._set_keys(keys, notify=True)
         except:
             pass  # Игнорируем ошибки фоновой проверки
     
     @staticmethod
     def _parse_keys(content: str) -> List[Dict[str, str]]:
         """Парсит ключи из содержимого файла"""
-        keys = []
-        lines = content.strip().split('\n')
+        chunks = SubscriptionParser.iter_decoded([content.encode('utf-8')])
+        return KeyLoader._ingest(SubscriptionParser.iter_keys(SubscriptionParser.iter_lines(chunks)))
+    
+    @staticmethod
+    def _ingest(keys: Iterable[Dict[str, str]], quiet: bool = False) -> List[Dict[str, str]]:
+        """
+        Отбрасывает некорректные ключи и убирает повторы серверов
         
-        for i, line in enumerate(lines, 1):
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-            
-            vless_match = re.search(r'vless://[^\s]+', line)
-            if vless_match:
-                vless_url = vless_match.group(0)
-                
-                name_match = re.search(r'#([^#\n]+)', line)
-                if name_match:
-                    name = name_match.group(1).strip()
-                else:
-                    name = f"Сервер {i}"
-                
-                keys.append({
-                    'name': name,
-                    'url': vless_url
-                })
-            elif line.startswith('vless://'):
-                name = f"Сервер {i}"
-                keys.append({
-                    'name': name,
-                    'url': line
-                })
-        
-        return keys
+        URL, уже присутствующие в текущем индексе, повторно не проверяются.
+        
+        Args:
+            keys: Ключи из парсера подписки
+            quiet: Не печатать отклоненные ключи (для фоновой проверки)
+        """
+        index = KeyLoader._index
+        rejected = []
+        valid = KeyValidator.iter_valid(keys, rejected, known=index.has_url if index is not None else None)
+        unique = KeyIndex.unique(valid, index)
+        
+        if rejected and not quiet:
+            print(f"⚠ Отклонено некорректных ключей: {len(rejected)}")
+            for key, problems in rejected[:3]:
+                print(f"  {key['name']}: {'; '.join(problems)}")
+            if len(rejected) > 3:
+                print(f"  ... и еще {len(rejected) - 3}")
+        return unique
+    
+    @staticmethod
+    def iter_keys_from_github() -> Iterator[Dict[str, str]]:
+        """
+        Потоково загружает ключи с GitHub без кэша
+        
+        Первый ключ доступен до завершения загрузки всего файла.
+        Некорректные ключи (KeyValidator) пропускаются.
+        """
+        index = KeyIndex()
+        with KeyLoader._transport.fetch(KeyLoader.GITHUB_URL) as response:
+            for key in KeyValidator.iter_valid(SubscriptionParser.iter_keys_from_stream(response)):
+                # Повторы сервера пропускаются (их имена остаются в индексе)
+                if index.add(key):
+                    yield key
     
     @staticmethod
     def load_keys_from_file(filepath: str = 'keys.txt') -> List[Dict[str, str]]:
@@ -266,35 +604,8 @@ class KeyLoader:
         Returns:
             Список словарей с ключами
         """
-        keys = []
-        
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            lines = content.strip().split('\n')
-            
-            for i, line in enumerate(lines, 1):
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                
-                vless_match = re.search(r'vless://[^\s]+', line)
-                if vless_match:
-                    vless_url = vless_match.group(0)
-                    
-                    name_match = re.search(r'#([^#\n]+)', line)
-                    if name_match:
-                        name = name_match.group(1).strip()
-                    else:
-                        name = f"Сервер {i}"
-                    
-                    keys.append({
-                        'name': name,
-                        'url': vless_url
-                    })
-            
-            return keys
+            return KeyLoader._ingest(SubscriptionParser.iter_keys_from_file(filepath))
         except FileNotFoundError:
             return []
         except Exception as e:
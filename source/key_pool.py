@@ -0,0 +1,242 @@
+"""
+Модуль колоночного пула ключей для быстрой сортировки и фильтрации
+"""
+import heapq
+import math
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+from key_validator import KeyValidator
+from config_cache import ConfigCache
+
+
+class KeyPool:
+    """
+    Пул ключей в колоночном виде
+
+    Горячие поля (порт, задержка, потери, время последней проверки, флаги)
+    хранятся в буферах модуля array, строки (URL, имена, хосты) - в общей
+    таблице строк, на которую ссылаются номера. Фильтрация, сортировка и
+    выбор лучших выполняются проходами по буферам без создания словарей
+    на каждый ключ, поэтому ранжирование 100k ключей занимает миллисекунды.
+    """
+
+    # Флаги ключа (битовая маска)
+    FLAG_TLS = 1 << 0
+    FLAG_REALITY = 1 << 1
+    FLAG_TCP = 1 << 2
+    FLAG_WS = 1 << 3
+    FLAG_GRPC = 1 << 4
+    FLAG_INVALID = 1 << 5  # URL не разбирается или не прошел KeyValidator
+    FLAG_DEAD = 1 << 6  # Последняя проверка неуспешна
+
+    SECURITY_FLAGS = {'tls': FLAG_TLS, 'reality': FLAG_REALITY}
+    TRANSPORT_FLAGS = {'tcp': FLAG_TCP, 'ws': FLAG_WS, 'grpc': FLAG_GRPC}
+
+    UNKNOWN = math.inf  # Задержка/потери еще не измерены
+
+    COLUMNS = ('port', 'latency', 'loss', 'last_seen', 'flags')
+
+    def __init__(self):
+        self.port = array('H')
+        self.latency = array('f')  # мс
+        self.loss = array('f')  # доля потерянных проверок, 0..1
+        self.last_seen = array('d')  # время последней успешной проверки (unix time)
+        self.flags = array('H')
+
+        self.url_id = array('I')
+        self.name_id = array('I')
+        self.host_id = array('I')
+
+        self._strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self._index: Dict[str, int] = {}  # URL -> номер строки пула
+
+    def __len__(self) -> int:
+        return len(self.url_id)
+
+    def _intern(self, value: str) -> int:
+        """Возвращает номер строки в таблице строк (добавляя ее при необходимости)"""
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            value = sys.intern(value)
+            self._strings.append(value)
+            self._string_ids[value] = string_id
+        return string_id
+
+    @staticmethod
+    def from_keys(keys: Iterable[Dict[str, str]]) -> 'KeyPool':
+        """Создает пул из списка ключей [{'name': '...', 'url': 'vless://...'}, ...]"""
+        pool = KeyPool()
+        pool.extend(keys)
+        return pool
+
+    def extend(self, keys: Iterable[Dict[str, str]]) -> None:
+        """Добавляет несколько ключей"""
+        for key in keys:
+            self.add(key['url'], key.get('name', ''))
+
+    def add(self, url: str, name: str = '') -> int:
+        """
+        Добавляет ключ (если URL уже есть - возвращает его номер)
+
+        Returns:
+            Номер ключа в пуле
+        """
+        existing = self._index.get(url)
+        if existing is not None:
+            return existing
+
+        flags = 0
+        host = ''
+        port = 0
+        try:
+            params = ConfigCache.shared().parse(url)
+            host = params['host']
+            port = params['port']
+            flags |= self.SECURITY_FLAGS.get(params['security'], 0)
+            flags |= self.TRANSPORT_FLAGS.get(params['type'], 0)
+            if KeyValidator.check(params):
+                raise ValueError(url)
+        except Exception:
+            flags = self.FLAG_INVALID
+            port = 0
+
+        idx = len(self.url_id)
+        self.url_id.append(self._intern(url))
+        self.name_id.append(self._intern(name))
+        self.host_id.append(self._intern(host))
+        self.port.append(port)
+        self.latency.append(self.UNKNOWN)
+        self.loss.append(self.UNKNOWN)
+        self.last_seen.append(0.0)
+        self.flags.append(flags)
+        self._index[url] = idx
+        return idx
+
+    def index_of(self, url: str) -> Optional[int]:
+        """Номер ключа по URL (None, если ключа нет)"""
+        return self._index.get(url)
+
+    def update_probe(self, idx: int, latency: Optional[float], loss: float = 0.0,
+                     timestamp: Optional[float] = None) -> None:
+        """
+        Записывает результат проверки ключа
+
+        Args:
+            idx: Номер ключа
+            latency: Задержка в мс (None - сервер недоступен)
+            loss: Доля потерь 0..1
+            timestamp: Время проверки (для успешной проверки - last_seen)
+        """
+        if latency is None:
+            self.latency[idx] = self.UNKNOWN
+            self.loss[idx] = 1.0
+            self.flags[idx] |= self.FLAG_DEAD
+        else:
+            self.latency[idx] = latency
+            self.loss[idx] = loss
+            self.flags[idx] &= ~self.FLAG_DEAD & 0xFFFF
+            if timestamp is not None:
+                self.last_seen[idx] = timestamp
+
+    def filter(self, flags_all: int = 0, flags_none: int = 0, port: Optional[int] = None,
+               max_latency: Optional[float] = None, max_loss: Optional[float] = None,
+               seen_since: Optional[float] = None,
+               indices: Optional[Iterable[int]] = None) -> array:
+        """
+        Отбирает ключи по условиям
+
+        Args:
+            flags_all: Все эти флаги должны быть установлены
+            flags_none: Ни один из этих флагов не должен быть установлен
+            port: Порт сервера
+            max_latency: Максимальная задержка (мс)
+            max_loss: Максимальная доля потерь
+            seen_since: Последняя успешная проверка не раньше этого времени
+            indices: Ограничить выборку этими номерами (по умолчанию - все)
+
+        Returns:
+            array('I') номеров подходящих ключей
+        """
+        if indices is None:
+            indices = range(len(self))
+
+        # Каждое условие - отдельный проход по одному буферу
+        selected = indices
+        if flags_all or flags_none:
+            flags = self.flags
+            selected = [i for i in selected
+                        if flags[i] & flags_all == flags_all and not flags[i] & flags_none]
+        if port is not None:
+            selected = [i for i in selected if self.port[i] == port]
+        if max_latency is not None:
+            selected = [i for i in selected if self.latency[i] <= max_latency]
+        if max_loss is not None:
+            selected = [i for i in selected if self.loss[i] <= max_loss]
+        if seen_since is not None:
+            selected = [i for i in selected if self.last_seen[i] >= seen_since]
+
+        return array('I', selected)
+
+    def _column(self, column: str) -> array:
+        if column not in self.COLUMNS:
+            raise ValueError(f"Неизвестная колонка: {column}")
+        return getattr(self, column)
+
+    def sort(self, column: str = 'latency', indices: Optional[Iterable[int]] = None,
+             reverse: bool = False) -> array:
+        """
+        Сортирует номера ключей по колонке (неизмеренные значения - в конце)
+
+        Returns:
+            array('I') номеров в порядке сортировки
+        """
+        values = self._column(column)
+        if indices is None:
+            indices = range(len(self))
+        if not reverse:
+            return array('I', sorted(indices, key=values.__getitem__))
+        # По убыванию инвертируются только измеренные значения - inf остается в конце
+        return array('I', sorted(indices, key=lambda i: (values[i] == self.UNKNOWN, -values[i])))
+
+    def top_k(self, k: int, column: str = 'latency',
+              indices: Optional[Iterable[int]] = None) -> array:
+        """
+        Возвращает k ключей с наименьшими значениями колонки (частичная сортировка)
+        """
+        values = self._column(column)
+        if indices is None:
+            indices = range(len(self))
+        return array('I', heapq.nsmallest(k, indices, key=values.__getitem__))
+
+    def key(self, idx: int) -> Dict[str, any]:
+        """Возвращает ключ в виде словаря (вместе с измеренными значениями)"""
+        strings = self._strings
+        return {
+            'name': strings[self.name_id[idx]],
+            'url': strings[self.url_id[idx]],
+            'host': strings[self.host_id[idx]],
+            'port': self.port[idx],
+            'latency': self.latency[idx],
+            'loss': self.loss[idx],
+            'last_seen': self.last_seen[idx],
+            'flags': self.flags[idx],
+        }
+
+    def keys(self, indices: Optional[Iterable[int]] = None) -> List[Dict[str, str]]:
+        """Возвращает ключи {'name': '...', 'url': '...'} в указанном порядке"""
+        if indices is None:
+            indices = range(len(self))
+        strings = self._strings
+        names = self.name_id
+        urls = self.url_id
+        return [{'name': strings[names[i]], 'url': strings[urls[i]]} for i in indices]
+
+    def urls(self, indices: Optional[Iterable[int]] = None) -> Iterable[str]:
+        """Возвращает URL ключей в указанном порядке"""
+        if indices is None:
+            indices = range(len(self))
+        return map(self._strings.__getitem__, map(self.url_id.__getitem__, indices))
@@ -0,0 +1,264 @@
+"""
+Модуль индексированного хранилища VLESS ключей на SQLite
+"""
+import sqlite3
+import time
+from typing import List, Dict, Optional, Iterable, Set, Tuple
+
+from config_cache import ConfigCache
+
+
+class KeyStore:
+    """
+    Хранилище ключей с индексами по хосту, порту, транспорту, безопасности
+    и источнику
+
+    Обновление подписки записывает только изменившиеся строки, а выборки
+    вида "reality на 443 без сбоев за последний час" выполняются по
+    индексам без загрузки всех ключей. Один ключ может входить в несколько
+    источников (таблица key_sources); строка ключа удаляется, только когда
+    его не осталось ни в одном источнике.
+    """
+
+    DB_FILE = 'keys.db'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS keys (
+            url TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            source TEXT NOT NULL DEFAULT '',
+            host TEXT,
+            port INTEGER,
+            transport TEXT,
+            security TEXT,
+            first_seen REAL NOT NULL,
+            updated REAL NOT NULL,
+            last_ok REAL,
+            last_fail REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_keys_host ON keys(host, port);
+        CREATE INDEX IF NOT EXISTS idx_keys_security ON keys(security, port, transport);
+        CREATE INDEX IF NOT EXISTS idx_keys_transport ON keys(transport);
+        CREATE INDEX IF NOT EXISTS idx_keys_source ON keys(source);
+        CREATE INDEX IF NOT EXISTS idx_keys_last_fail ON keys(last_fail);
+        CREATE TABLE IF NOT EXISTS key_sources (
+            source TEXT NOT NULL,
+            url TEXT NOT NULL,
+            PRIMARY KEY (source, url)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_key_sources_url ON key_sources(url);
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Открывает (и при необходимости создает) базу ключей
+
+        Args:
+            db_path: Путь к файлу базы. Если None, используется DB_FILE
+        """
+        self.db_path = db_path or self.DB_FILE
+        self.conn = sqlite3.connect(self.db_path, timeout=10)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        migrate = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'key_sources'"
+        ).fetchone() is None
+        self.conn.executescript(self.SCHEMA)
+        if migrate:
+            # База прежней версии: источник каждого ключа хранился только в keys.source
+            with self.conn:
+                self.conn.execute('INSERT OR IGNORE INTO key_sources (source, url) SELECT source, url FROM keys')
+
+    def __enter__(self) -> 'KeyStore':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Закрывает соединение с базой"""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    @staticmethod
+    def _describe(url: str) -> Tuple[Optional[str], Optional[int], Optional[str], Optional[str]]:
+        """Извлекает индексируемые поля ключа: (host, port, transport, security)"""
+        try:
+            params = ConfigCache.shared().parse(url)
+            return params['host'], params['port'], params['type'], params['security']
+        except Exception:
+            return None, None, None, None
+
+    def sync(self, keys: Iterable[Dict[str, str]], source: str = '') -> Tuple[int, int, int]:
+        """
+        Синхронизирует ключи одного источника с базой
+
+        Новые ключи добавляются, у существующих обновляется только имя
+        (если оно изменилось), ключи, пропавшие из источника, исключаются
+        из него. Ключ, который уже есть в базе от другого источника, остается
+        за ним; строка ключа удаляется, только когда ключа нет ни в одном
+        источнике. Неизменившиеся строки не перезаписываются.
+
+        Args:
+            keys: Ключи источника [{'name': '...', 'url': 'vless://...'}, ...]
+            source: Идентификатор источника (URL или путь к файлу)
+
+        Returns:
+            Tuple[int, int, int]: (добавлено, изменено, удалено) строк ключей
+        """
+        existing = {
+            row['url']: (row['name'], row['source'])
+            for row in self.conn.execute(
+                'SELECT k.url, k.name, k.source FROM key_sources s JOIN keys k ON k.url = s.url '
+                'WHERE s.source = ?',
+                (source,)
+            )
+        }
+
+        now = time.time()
+        added = []
+        renamed = []
+        seen = set()
+        for key in keys:
+            url = key['url']
+            if url in seen:
+                continue
+            seen.add(url)
+
+            row = existing.get(url)
+            if row is None:
+                added.append((url, key['name'], source) + KeyStore._describe(url) + (now, now))
+            elif row[1] == source and row[0] != key['name']:
+                renamed.append((key['name'], now, url))
+
+        removed = [url for url in existing if url not in seen]
+
+        with self.conn:
+            self.conn.executemany('INSERT OR IGNORE INTO key_sources (source, url) VALUES (?, ?)',
+                                  [(source, row[0]) for row in added])
+            # Ключ, уже принадлежащий другому источнику, остается за ним
+            inserted = self.conn.executemany(
+                """
+                INSERT INTO keys (url, name, source, host, port, transport, security,
+                                  first_seen, updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO NOTHING
+                """,
+                added
+            ).rowcount if added else 0
+            self.conn.executemany('UPDATE keys SET name = ?, updated = ? WHERE url = ?', renamed)
+            self.conn.executemany('DELETE FROM key_sources WHERE source = ? AND url = ?',
+                                  [(source, url) for url in removed])
+            # Ключ, оставшийся в других источниках, переходит к одному из них
+            self.conn.executemany(
+                """
+                UPDATE keys SET source = (SELECT source FROM key_sources WHERE url = keys.url LIMIT 1)
+                WHERE url = ? AND source = ?
+                  AND EXISTS (SELECT 1 FROM key_sources WHERE url = keys.url)
+                """,
+                [(url, source) for url in removed]
+            )
+            deleted = self.conn.executemany(
+                'DELETE FROM keys WHERE url = ? AND NOT EXISTS (SELECT 1 FROM key_sources WHERE url = keys.url)',
+                [(url,) for url in removed]
+            ).rowcount if removed else 0
+
+        return inserted, len(renamed), deleted
+
+    def record_result(self, url: str, ok: bool, timestamp: Optional[float] = None) -> None:
+        """
+        Запоминает результат проверки ключа
+
+        Args:
+            url: VLESS URL
+            ok: Успешна ли проверка
+            timestamp: Время проверки (по умолчанию - текущее)
+        """
+        column = 'last_ok' if ok else 'last_fail'
+        with self.conn:
+            self.conn.execute(
+                f'UPDATE keys SET {column} = ? WHERE url = ?',
+                (timestamp or time.time(), url)
+            )
+
+    def record_results(self, results: Iterable[Tuple[str, bool]],
+                       timestamp: Optional[float] = None) -> None:
+        """
+        Запоминает результаты проверки многих ключей одной транзакцией
+
+        Args:
+            results: Пары (VLESS URL, успешна ли проверка)
+            timestamp: Время проверки (по умолчанию - текущее)
+        """
+        timestamp = timestamp or time.time()
+        ok_urls = []
+        fail_urls = []
+        for url, ok in results:
+            (ok_urls if ok else fail_urls).append((timestamp, url))
+        with self.conn:
+            self.conn.executemany('UPDATE keys SET last_ok = ? WHERE url = ?', ok_urls)
+            self.conn.executemany('UPDATE keys SET last_fail = ? WHERE url = ?', fail_urls)
+
+    def existing(self, urls: Iterable[str]) -> Set[str]:
+        """Возвращает те из URL, которые уже есть в базе"""
+        urls = list(urls)
+        found = set()
+        for i in range(0, len(urls), 500):
+            chunk = urls[i:i + 500]
+            found.update(row[0] for row in self.conn.execute(
+                f"SELECT url FROM keys WHERE url IN ({','.join('?' * len(chunk))})", chunk))
+        return found
+
+    def query(self, host: Optional[str] = None, port: Optional[int] = None,
+              transport: Optional[str] = None, security: Optional[str] = None,
+              source: Optional[str] = None, not_failed_within: Optional[float] = None,
+              limit: Optional[int] = None) -> List[Dict[str, any]]:
+        """
+        Выбирает ключи по индексированным полям
+
+        Args:
+            host: Адрес сервера
+            port: Порт сервера
+            transport: Тип транспорта (tcp, ws, grpc, ...)
+            security: Тип безопасности (none, tls, reality)
+            source: Источник, в который входит ключ
+            not_failed_within: Исключить ключи со сбоем за последние N секунд
+            limit: Максимальное количество результатов
+
+        Returns:
+            Список словарей с полями строки (name, url, host, port, ...)
+        """
+        conditions = []
+        args = []
+        for column, value in (('host', host), ('port', port), ('transport', transport),
+                              ('security', security)):
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                args.append(value)
+        if source is not None:
+            conditions.append('url IN (SELECT url FROM key_sources WHERE source = ?)')
+            args.append(source)
+
+        if not_failed_within is not None:
+            conditions.append('(last_fail IS NULL OR last_fail < ?)')
+            args.append(time.time() - not_failed_within)
+
+        sql = 'SELECT * FROM keys'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY first_seen, rowid'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            args.append(limit)
+
+        return [dict(row) for row in self.conn.execute(sql, args)]
+
+    def count(self, source: Optional[str] = None) -> int:
+        """Возвращает количество ключей (всего или для одного источника)"""
+        if source is None:
+            row = self.conn.execute('SELECT COUNT(*) FROM keys').fetchone()
+        else:
+            row = self.conn.execute('SELECT COUNT(*) FROM key_sources WHERE source = ?', (source,)).fetchone()
+        return row[0]
@@ -0,0 +1,188 @@
+"""
+Модуль быстрой структурной проверки VLESS ключей
+"""
+import ipaddress
+import re
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config_cache import ConfigCache
+
+
+class KeyValidator:
+    """
+    Структурная проверка ключей без обращения к сети
+
+    Ключ с ошибкой в параметрах (например, reality без pbk) иначе
+    обнаруживается только при генерации конфигурации Xray - после проверки
+    порта и ping. Проверка выполняется при загрузке, поэтому такие ключи
+    не попадают в меню, проверки соединения и автовыбор.
+    """
+
+    SECURITIES = frozenset(('none', 'tls', 'reality'))
+    TRANSPORTS = frozenset(('tcp', 'raw', 'ws', 'grpc', 'http', 'h2', 'httpupgrade',
+                            'splithttp', 'xhttp', 'kcp', 'quic'))
+    # Транспорты, поверх которых работает Reality
+    REALITY_TRANSPORTS = frozenset(('tcp', 'raw', 'grpc', 'http', 'h2', 'xhttp', 'splithttp'))
+    FLOWS = frozenset(('', 'xtls-rprx-vision', 'xtls-rprx-vision-udp443'))
+
+    MAX_CUSTOM_ID = 30  # Xray принимает произвольную строку до 30 байт вместо UUID
+    UUID_PATTERN = re.compile(r'[0-9a-fA-F]{32}')
+    PBK_PATTERN = re.compile(r'[A-Za-z0-9_-]{43}=?')  # X25519 ключ в base64url
+    SID_PATTERN = re.compile(r'(?:[0-9a-fA-F]{2}){0,8}')
+    LABEL_PATTERN = re.compile(r'(?!-)[A-Za-z0-9_-]{1,63}(?<!-)')
+
+    @staticmethod
+    def _is_ip(value: str) -> bool:
+        try:
+            ipaddress.ip_address(value)
+        except ValueError:
+            return False
+        return True
+
+    @staticmethod
+    def _is_hostname(value: str) -> bool:
+        """Проверяет доменное имя (допускаются IDN)"""
+        try:
+            value = value.encode('idna').decode('ascii')
+        except UnicodeError:
+            return False
+        value = value.rstrip('.')
+        if not value or len(value) > 253:
+            return False
+        return all(KeyValidator.LABEL_PATTERN.fullmatch(label) for label in value.split('.'))
+
+    @staticmethod
+    def _check_uuid(uuid: str) -> Optional[str]:
+        if not uuid:
+            return "пустой UUID"
+        if len(uuid.encode('utf-8')) <= KeyValidator.MAX_CUSTOM_ID:
+            return None
+        if not KeyValidator.UUID_PATTERN.fullmatch(uuid.replace('-', '')):
+            return f"неверный UUID: {uuid[:40]}"
+        return None
+
+    @staticmethod
+    def _check_host(host: str) -> Optional[str]:
+        if host.startswith('['):
+            if not host.endswith(']') or ':' not in host or not KeyValidator._is_ip(host[1:-1]):
+                return f"неверный IPv6 адрес: {host}"
+            return None
+        if KeyValidator._is_ip(host) or KeyValidator._is_hostname(host):
+            return None
+        return f"неверный адрес сервера: {host[:60]}"
+
+    @staticmethod
+    def _check_sni(sni: str) -> Optional[str]:
+        # Для Reality допускается список имен через запятую
+        for name in sni.split(','):
+            name = name.strip()
+            if KeyValidator._is_ip(name.strip('[]')):
+                return f"SNI не может быть IP адресом: {name}"
+            if not KeyValidator._is_hostname(name):
+                return f"неверный SNI: {name[:60]}"
+        return None
+
+    @staticmethod
+    def check(params: Dict[str, any]) -> List[str]:
+        """
+        Проверяет разобранный ключ (результат VLESSURLParser.parse)
+
+        Returns:
+            Список найденных проблем (пустой, если ключ корректен)
+        """
+        problems = []
+        query = params.get('params', {})
+        security = params.get('security', 'none')
+        stream_type = params.get('type', 'tcp')
+        flow = params.get('flow', '')
+
+        for problem in (KeyValidator._check_uuid(params['uuid']),
+                        KeyValidator._check_host(params['host'])):
+            if problem:
+                problems.append(problem)
+
+        if not 1 <= params['port'] <= 65535:
+            problems.append(f"порт вне диапазона: {params['port']}")
+        if security not in KeyValidator.SECURITIES:
+            problems.append(f"неизвестный security: {security}")
+        if stream_type not in KeyValidator.TRANSPORTS:
+            problems.append(f"неизвестный транспорт: {stream_type}")
+        if params.get('encryption', 'none') != 'none':
+            problems.append(f"VLESS поддерживает только encryption=none: {params['encryption']}")
+
+        if flow not in KeyValidator.FLOWS:
+            problems.append(f"неизвестный flow: {flow}")
+        elif flow and (security not in ('tls', 'reality') or stream_type not in ('tcp', 'raw')):
+            problems.append(f"flow {flow} требует tcp с tls или reality")
+
+        sni = query.get('sni') or params.get('sni')
+        if security in ('tls', 'reality') and sni:
+            problem = KeyValidator._check_sni(sni)
+            if problem:
+                problems.append(problem)
+
+        if security == 'reality':
+            pbk = query.get('pbk', '')
+            sid = query.get('sid', '')
+            if not pbk:
+                problems.append("reality без pbk (publicKey)")
+            elif not KeyValidator.PBK_PATTERN.fullmatch(pbk):
+                problems.append(f"неверный pbk: {pbk[:20]}")
+            if not sid:
+                problems.append("reality без sid (shortId)")
+            elif not all(KeyValidator.SID_PATTERN.fullmatch(s.strip()) for s in sid.split(',')):
+                problems.append(f"неверный sid: {sid[:20]}")
+            if not sni and KeyValidator._is_ip(params['host'].strip('[]')):
+                # Без SNI в serverNames попадет адрес сервера, а IP там недопустим
+                problems.append("reality без sni при IP адресе сервера")
+            if stream_type not in KeyValidator.REALITY_TRANSPORTS:
+                problems.append(f"reality не поддерживает транспорт {stream_type}")
+
+        if stream_type == 'ws' and not params.get('path', '/').startswith('/'):
+            problems.append(f"путь WebSocket должен начинаться с '/': {params['path'][:40]}")
+
+        return problems
+
+    @staticmethod
+    def validate(vless_url: str) -> List[str]:
+        """
+        Разбирает и проверяет VLESS URL
+
+        Returns:
+            Список найденных проблем (пустой, если ключ корректен)
+        """
+        try:
+            params = ConfigCache.shared().parse(vless_url)
+        except (ValueError, AttributeError) as e:
+            return [f"ошибка разбора: {e}"]
+        return KeyValidator.check(params)
+
+    @staticmethod
+    def is_valid(vless_url: str) -> bool:
+        """Проверяет, корректен ли VLESS URL"""
+        return not KeyValidator.validate(vless_url)
+
+    @staticmethod
+    def iter_valid(keys: Iterable[Dict[str, str]],
+                   rejected: Optional[List[Tuple[Dict[str, str], List[str]]]] = None,
+                   known: Optional[Callable[[str], bool]] = None) -> Iterator[Dict[str, str]]:
+        """
+        Пропускает только корректные ключи
+
+        Args:
+            keys: Ключи [{'name': '...', 'url': 'vless://...'}, ...]
+            rejected: Список, в который добавляются отклоненные ключи
+                вместе с проблемами
+            known: Функция, возвращающая True для уже проверенных URL -
+                они пропускаются без повторной проверки
+        """
+        for key in keys:
+            url = key['url']
+            if known is not None and known(url):
+                yield key
+                continue
+            problems = KeyValidator.validate(url)
+            if not problems:
+                yield key
+            elif rejected is not None:
+                rejected.append((key, problems))
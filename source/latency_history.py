@@ -0,0 +1,291 @@
+"""
+Модуль истории задержки и доступности серверов
+"""
+import heapq
+import json
+import math
+import os
+import struct
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+
+from cache_file import CacheFile
+
+
+class LatencyHistory:
+    """
+    История проверок серверов в кольцевых буферах фиксированного размера
+
+    Для каждого сервера хранятся последние WINDOW замеров (NaN - неудачная
+    проверка) в одном общем буфере array('f'), а также EWMA задержки,
+    счетчики и время последней проверки - тоже в array. Запись замера
+    стоит O(1), память на сервер постоянна (~WINDOW * 4 байт в буферах плюс
+    идентификатор), поэтому буферы 100k серверов занимают порядка 15 МБ
+    независимо от того, сколько месяцев идут проверки. При превышении
+    MAX_SERVERS место сервера, дольше всех не проверявшегося, отдается новому;
+    такие серверы отбираются пачками по EVICT_BATCH за один проход.
+    """
+
+    HISTORY_FILE = 'latency_history.bin'
+    MAGIC = b'BEXLH1\n'
+    WINDOW = 32  # Замеров в окне на сервер
+    ALPHA = 0.2  # Вес нового замера в EWMA
+    MAX_SERVERS = 200000
+    EVICT_BATCH = 1024  # Кандидатов на вытеснение, отбираемых за один проход
+
+    _shared: Optional['LatencyHistory'] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, window: int = WINDOW, alpha: float = ALPHA,
+                 max_servers: int = MAX_SERVERS):
+        """
+        Args:
+            window: Размер окна (замеров на сервер)
+            alpha: Вес нового замера в EWMA
+            max_servers: Максимум хранимых серверов
+        """
+        self.window = window
+        self.alpha = alpha
+        self.max_servers = max_servers
+
+        self.samples = array('f')  # window замеров на сервер, мс; NaN - неудача
+        self.head = array('H')  # Позиция следующей записи в кольце
+        self.filled = array('H')  # Заполненная часть кольца
+        self.ewma = array('f')  # EWMA задержки успешных проверок, NaN - еще нет
+        self.probes = array('I')  # Всего проверок
+        self.successes = array('I')  # Всего успешных проверок
+        self.last_probe = array('d')  # Время последней проверки (unix time)
+
+        self._ids: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._victims: List[Tuple[float, int]] = []  # (last_probe, номер), старые - в конце
+        self._dirty: Set[str] = set()  # Серверы, проверенные после последнего сохранения
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def server_id(host: str, port: int) -> str:
+        """Идентификатор сервера в истории"""
+        return f"{host.strip('[]').lower()}:{port}"
+
+    @staticmethod
+    def shared() -> 'LatencyHistory':
+        """Возвращает общую для процесса историю (загружается из HISTORY_FILE)"""
+        with LatencyHistory._shared_lock:
+            if LatencyHistory._shared is None:
+                LatencyHistory._shared = LatencyHistory.load(LatencyHistory.HISTORY_FILE)
+            return LatencyHistory._shared
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, server: str) -> bool:
+        return server in self._index
+
+    def _slot(self, server: str) -> int:
+        """Номер сервера (новый сервер получает слот, при переполнении - чужой)"""
+        idx = self._index.get(server)
+        if idx is not None:
+            return idx
+
+        if len(self._ids) < self.max_servers:
+            idx = len(self._ids)
+            self._ids.append(server)
+            self.samples.extend(array('f', [math.nan]) * self.window)
+            self.head.append(0)
+            self.filled.append(0)
+            self.ewma.append(math.nan)
+            self.probes.append(0)
+            self.successes.append(0)
+            self.last_probe.append(0.0)
+        else:
+            idx = self._oldest()
+            del self._index[self._ids[idx]]
+            self._ids[idx] = server
+            start = idx * self.window
+            self.samples[start:start + self.window] = array('f', [math.nan]) * self.window
+            self.head[idx] = self.filled[idx] = 0
+            self.ewma[idx] = math.nan
+            self.probes[idx] = self.successes[idx] = 0
+            self.last_probe[idx] = 0.0
+        self._index[server] = idx
+        return idx
+
+    def _oldest(self) -> int:
+        """
+        Номер сервера, дольше всех не проверявшегося
+
+        Один проход по last_probe отбирает EVICT_BATCH самых старых серверов,
+        следующие вытеснения берут их из списка. Сервер, проверенный после
+        отбора, пропускается.
+        """
+        last_probe = self.last_probe
+        while True:
+            if not self._victims:
+                oldest = heapq.nsmallest(self.EVICT_BATCH, range(len(last_probe)),
+                                         key=last_probe.__getitem__)
+                self._victims = [(last_probe[idx], idx) for idx in reversed(oldest)]
+            stamp, idx = self._victims.pop()
+            if last_probe[idx] == stamp:
+                return idx
+
+    def _row(self, idx: int) -> tuple:
+        """Все данные сервера (окно замеров и значения колонок)"""
+        start = idx * self.window
+        return (self.samples[start:start + self.window], self.head[idx], self.filled[idx],
+                self.ewma[idx], self.probes[idx], self.successes[idx], self.last_probe[idx])
+
+    def _set_row(self, server: str, row: tuple) -> None:
+        """Записывает данные сервера, полученные через _row"""
+        idx = self._slot(server)
+        start = idx * self.window
+        self.samples[start:start + self.window] = row[0]
+        (self.head[idx], self.filled[idx], self.ewma[idx], self.probes[idx],
+         self.successes[idx], self.last_probe[idx]) = row[1:]
+
+    def record(self, server: str, latency_ms: Optional[float],
+               timestamp: Optional[float] = None) -> None:
+        """
+        Записывает результат проверки за O(1)
+
+        Args:
+            server: Идентификатор сервера (server_id)
+            latency_ms: Задержка в мс (None - проверка неудачна)
+            timestamp: Время проверки (по умолчанию - текущее)
+        """
+        with self._lock:
+            idx = self._slot(server)
+            pos = self.head[idx]
+            self.samples[idx * self.window + pos] = math.nan if latency_ms is None else latency_ms
+            self.head[idx] = (pos + 1) % self.window
+            if self.filled[idx] < self.window:
+                self.filled[idx] += 1
+
+            self.probes[idx] += 1
+            if latency_ms is not None:
+                self.successes[idx] += 1
+                ewma = self.ewma[idx]
+                self.ewma[idx] = latency_ms if math.isnan(ewma) else (
+                    self.alpha * latency_ms + (1 - self.alpha) * ewma)
+            self.last_probe[idx] = time.time() if timestamp is None else timestamp
+            self._dirty.add(server)
+
+    def window_samples(self, server: str) -> List[Optional[float]]:
+        """Замеры окна от старых к новым (None - неудачная проверка)"""
+        with self._lock:
+            idx = self._index.get(server)
+            if idx is None:
+                return []
+            start = idx * self.window
+            filled = self.filled[idx]
+            head = self.head[idx]
+            ring = self.samples[start:start + self.window]
+        ordered = ring[head:] + ring[:head] if filled == self.window else ring[:filled]
+        return [None if math.isnan(value) else value for value in ordered]
+
+    def stats(self, server: str) -> Optional[Dict[str, float]]:
+        """
+        Статистика сервера по окну последних проверок
+
+        Returns:
+            Словарь с ключами ewma, p50, p95 (мс; None - успешных замеров нет),
+            success_rate (0..1, по окну), samples (замеров в окне), probes,
+            successes (всего), last_probe; None - сервер не проверялся
+        """
+        values = self.window_samples(server)
+        if not values:
+            return None
+        with self._lock:
+            idx = self._index[server]
+            ewma = self.ewma[idx]
+            probes = self.probes[idx]
+            successes = self.successes[idx]
+            last_probe = self.last_probe[idx]
+
+        ok = sorted(value for value in values if value is not None)
+
+        def percentile(p: float) -> Optional[float]:
+            if not ok:
+                return None
+            return ok[max(0, math.ceil(p * len(ok)) - 1)]
+
+        return {
+            'ewma': None if math.isnan(ewma) else ewma,
+            'p50': percentile(0.5),
+            'p95': percentile(0.95),
+            'success_rate': len(ok) / len(values),
+            'samples': len(values),
+            'probes': probes,
+            'successes': successes,
+            'last_probe': last_probe,
+        }
+
+    def save(self, path: Optional[str] = None) -> None:
+        """
+        Атомарно сохраняет историю в файл
+
+        Формат: MAGIC, длина и JSON заголовок (параметры и идентификаторы
+        серверов), затем буферы array в машинном представлении.
+
+        Файл пишется под межпроцессной блокировкой CacheFile: сохраненная
+        история перечитывается, и в нее записываются серверы, проверенные в
+        этом процессе (и отсутствующие в файле), поэтому замеры, сохраненные
+        параллельно другим процессом, не теряются. После сохранения история
+        в памяти совпадает с файлом.
+        """
+        path = os.path.abspath(path or self.HISTORY_FILE)
+        with self._lock, CacheFile.lock(path):
+            merged = LatencyHistory.load(path, self.max_servers)
+            if merged.window != self.window:
+                merged = LatencyHistory(self.window, self.alpha, self.max_servers)
+            for idx, server in enumerate(self._ids):
+                if server in self._dirty or server not in merged._index:
+                    merged._set_row(server, self._row(idx))
+
+            header = json.dumps({
+                'window': merged.window,
+                'alpha': merged.alpha,
+                'byteorder': 'little' if array('H', [1]).tobytes()[0] else 'big',
+                'servers': merged._ids,
+            }, ensure_ascii=False).encode('utf-8')
+            CacheFile.write_atomic(path, [self.MAGIC, struct.pack('<I', len(header)), header] +
+                                   [memoryview(column) for column in merged._columns()])
+
+            (self.samples, self.head, self.filled, self.ewma,
+             self.probes, self.successes, self.last_probe) = merged._columns()
+            self._ids = merged._ids
+            self._index = merged._index
+            self._victims = []
+            self._dirty = set()
+
+    def _columns(self) -> List[array]:
+        return [self.samples, self.head, self.filled, self.ewma,
+                self.probes, self.successes, self.last_probe]
+
+    @staticmethod
+    def load(path: Optional[str] = None, max_servers: int = MAX_SERVERS) -> 'LatencyHistory':
+        """
+        Загружает историю из файла
+
+        Если файла нет или он поврежден, возвращается пустая история.
+        """
+        path = path or LatencyHistory.HISTORY_FILE
+        try:
+            with open(path, 'rb') as f:
+                if f.read(len(LatencyHistory.MAGIC)) != LatencyHistory.MAGIC:
+                    raise ValueError("неизвестный формат")
+                (header_size,) = struct.unpack('<I', f.read(4))
+                header = json.loads(f.read(header_size).decode('utf-8'))
+                history = LatencyHistory(header['window'], header['alpha'], max_servers)
+                count = len(header['servers'])
+                sizes = [count * history.window] + [count] * 6
+                for column, size in zip(history._columns(), sizes):
+                    column.fromfile(f, size)
+                    if header['byteorder'] != ('little' if array('H', [1]).tobytes()[0] else 'big'):
+                        column.byteswap()
+                history._ids = header['servers']
+                history._index = {server: i for i, server in enumerate(history._ids)}
+                return history
+        except (OSError, ValueError, KeyError, EOFError, struct.error):
+            return LatencyHistory(max_servers=max_servers)
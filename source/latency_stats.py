@@ -0,0 +1,45 @@
+"""
+Модуль статистики задержки по серии замеров
+"""
+import math
+from typing import List, Optional
+
+
+class LatencyStats:
+    """Статистика задержки по серии измерений"""
+    
+    __slots__ = ('samples', 'sent', 'received', 'min', 'avg', 'p95', 'jitter', 'loss')
+    
+    def __init__(self, samples: List[Optional[float]]):
+        """
+        Args:
+            samples: Замеры в мс в порядке выполнения (None - потерянный замер)
+        """
+        received = [s for s in samples if s is not None]
+        self.samples = samples
+        self.sent = len(samples)
+        self.received = len(received)
+        self.loss = 1 - self.received / self.sent if self.sent else 1.0
+        
+        if received:
+            ordered = sorted(received)
+            self.min = ordered[0]
+            self.avg = sum(received) / len(received)
+            # p95 методом ближайшего ранга
+            self.p95 = ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)]
+            # Джиттер - среднее изменение между соседними успешными замерами
+            deltas = [abs(b - a) for a, b in zip(received, received[1:])]
+            self.jitter = sum(deltas) / len(deltas) if deltas else 0.0
+        else:
+            self.min = self.avg = self.p95 = self.jitter = None
+    
+    @property
+    def ok(self) -> bool:
+        """True, если успешен хотя бы один замер"""
+        return self.received > 0
+    
+    def __str__(self) -> str:
+        if not self.ok:
+            return f"нет ответа ({self.sent} попыток)"
+        return (f"min {self.min:.0f} / avg {self.avg:.0f} / p95 {self.p95:.0f} мс, "
+                f"джиттер {self.jitter:.0f} мс, потери {self.loss:.0%}")
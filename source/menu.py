@@ -4,7 +4,12 @@
 import sys
 from typing import List, Dict, Optional
 
+from auto_select import AutoSelector
+from circuit_breaker import CircuitBreaker
 from key_loader import KeyLoader
+from key_index import KeyDiff
+from latency_history import LatencyHistory
+from probe_engine import ProbeEngine, ProbeResult
 
 
 class Menu:
@@ -27,56 +32,161 @@ class Menu:
             print()
             return Menu._input_custom_key()
         
+        # Реагируем на фоновое обновление списка ключей
+        def on_keys_updated(diff: KeyDiff) -> None:
+            print(f"\n⟳ Список серверов обновлен: {len(diff.keys)} ключей "
+                  f"(+{len(diff.added)} новых, -{len(diff.removed)} удалено). "
+                  f"Введите 'r', чтобы показать новый список")
+        
+        # Обновление могло прийти еще до показа меню
+        if KeyLoader.keys_updated.is_set():
+            KeyLoader.keys_updated.clear()
+            keys = KeyLoader.get_keys() or keys
+        KeyLoader.add_update_listener(on_keys_updated)
+        probes: Dict[str, ProbeResult] = {}
+        # Ключи в карантине остаются доступны для выбора, но показываются последними
+        keys = CircuitBreaker.shared().sort_keys(keys)
+        try:
+            Menu._print_keys(keys)
+            
+            while True:
+                try:
+                    choice = input("\nВаш выбор: ").strip()
+                    
+                    if choice.lower() in ('r', 'к'):
+                        if KeyLoader.keys_updated.is_set():
+                            KeyLoader.keys_updated.clear()
+                            new_keys = KeyLoader.get_keys()
+                            if new_keys:
+                                keys = new_keys
+                        # После 'p' сохраняем порядок по задержке
+                        if probes:
+                            keys = Menu._sort_by_latency(keys, probes)
+                        else:
+                            keys = CircuitBreaker.shared().sort_keys(keys)
+                        Menu._print_keys(keys, probes)
+                        continue
+                    
+                    if choice.lower() in ('p', 'з'):
+                        probes.update(Menu._probe_keys(keys))
+                        keys = Menu._sort_by_latency(keys, probes)
+                        Menu._print_keys(keys, probes)
+                        continue
+                    
+                    if choice == '0':
+                        print("Возврат в главное меню...")
+                        return "RETURN_TO_MAIN_MENU"
+                    
+                    if choice == str(len(keys) + 1):
+                        # Ввод своего ключа
+                        custom_key = Menu._input_custom_key()
+                        if custom_key == "RETURN_TO_MAIN_MENU":
+                            return "RETURN_TO_MAIN_MENU"
+                        if custom_key:
+                            return custom_key
+                        # Если вернулись из ввода ключа, возвращаемся в главное меню
+                        return "RETURN_TO_MAIN_MENU"
+                    
+                    choice_num = int(choice)
+                    if 1 <= choice_num <= len(keys):
+                        selected_key = keys[choice_num - 1]
+                        print(f"\n✓ Выбран: {selected_key['name']}")
+                        return selected_key['url']
+                    else:
+                        print(f"✗ Неверный выбор. Введите число от 0 до {len(keys) + 1}")
+                        
+                except ValueError:
+                    print("✗ Введите число")
+                except KeyboardInterrupt:
+                    print("\n\nВозврат в главное меню...")
+                    return "RETURN_TO_MAIN_MENU"
+                except Exception as e:
+                    print(f"✗ Ошибка: {e}")
+        finally:
+            KeyLoader.remove_update_listener(on_keys_updated)
+    
+    @staticmethod
+    def _probe_keys(keys: List[Dict[str, str]]) -> Dict[str, ProbeResult]:
+        """Параллельно проверяет все ключи, показывая ход проверки"""
+        print(f"\nПроверка серверов: {len(keys)}...")
+        probes = {}
+        available = 0
+        history = LatencyHistory.shared()
+        breaker = CircuitBreaker.shared()
+        recorded = set()
+        outcomes = []
+        for result in ProbeEngine.iter_probe(keys):
+            probes[result.url] = result
+            available += result.ok
+            # Не проверенный к сроку ключ не считается ни успехом, ни неудачей
+            if not result.skipped:
+                breaker.record(result.url, result.ok, result.error)
+                outcomes.append((result.url, result.ok))
+                # Копии одного сервера проверяются одним подключением - пишем замер один раз
+                if result.host is not None:
+                    server = LatencyHistory.server_id(result.host, result.port)
+                    if server not in recorded:
+                        recorded.add(server)
+                        history.record(server, result.latency_ms if result.ok else None)
+            print(f"\r  Проверено: {len(probes)}/{len(keys)}, доступно: {available}", end='', flush=True)
+        print()
+        KeyLoader.record_probes(outcomes)
+        try:
+            history.save()
+            breaker.save()
+        except OSError as e:
+            print(f"⚠ Не удалось сохранить историю проверок: {e}")
+        return probes
+    
+    @staticmethod
+    def _sort_by_latency(keys: List[Dict[str, str]],
+                         probes: Dict[str, ProbeResult]) -> List[Dict[str, str]]:
+        """
+        Доступные серверы - по возрастанию задержки, остальные - в прежнем
+        порядке, ключи в карантине - последними
+        """
+        breaker = CircuitBreaker.shared()
+        
+        def sort_key(key: Dict[str, str]):
+            quarantined = not breaker.allow(key['url'])
+            result = probes.get(key['url'])
+            if result is None or not result.ok:
+                return quarantined, 1, 0.0
+            return quarantined, 0, result.latency_ms
+        return sorted(keys, key=sort_key)
+    
+    @staticmethod
+    def _print_keys(keys: List[Dict[str, str]],
+                    probes: Optional[Dict[str, ProbeResult]] = None) -> None:
+        """Печатает список ключей для выбора (с результатами проверки, если есть)"""
         print("\n" + "=" * 60)
         print("Выберите сервер для подключения:")
         print("=" * 60)
         
         # Показываем список ключей
+        breaker = CircuitBreaker.shared()
         for i, key in enumerate(keys, 1):
             # Обрезаем длинные имена
             name = key['name'][:50] if len(key['name']) > 50 else key['name']
             # Показываем краткую информацию об URL
             url_preview = key['url'][:60] + "..." if len(key['url']) > 60 else key['url']
+            aliases = key.get('aliases')
+            if aliases:
+                name += f" (+{len(aliases)} копий)"
+            result = probes.get(key['url']) if probes else None
+            if result is not None:
+                name += f" — {result.latency_ms:.0f} мс" if result.ok else " — недоступен"
+            retry_in = breaker.retry_in(key['url'])
+            if retry_in:
+                name += f" — карантин (еще {max(1, round(retry_in / 60))} мин)"
             print(f"  [{i}] {name}")
             print(f"      {url_preview}")
         
         print(f"\n  [{len(keys) + 1}] Ввести свой ключ вручную")
+        print(f"  [r]  Обновить список")
+        print(f"  [p]  Проверить все серверы")
         print(f"  [0]  Вернуться в главное меню")
         print("=" * 60)
-        
-        while True:
-            try:
-                choice = input("\nВаш выбор: ").strip()
-                
-                if choice == '0':
-                    print("Возврат в главное меню...")
-                    return "RETURN_TO_MAIN_MENU"
-                
-                if choice == str(len(keys) + 1):
-                    # Ввод своего ключа
-                    custom_key = Menu._input_custom_key()
-                    if custom_key == "RETURN_TO_MAIN_MENU":
-                        return "RETURN_TO_MAIN_MENU"
-                    if custom_key:
-                        return custom_key
-                    # Если вернулись из ввода ключа, возвращаемся в главное меню
-                    return "RETURN_TO_MAIN_MENU"
-                
-                choice_num = int(choice)
-                if 1 <= choice_num <= len(keys):
-                    selected_key = keys[choice_num - 1]
-                    print(f"\n✓ Выбран: {selected_key['name']}")
-                    return selected_key['url']
-                else:
-                    print(f"✗ Неверный выбор. Введите число от 0 до {len(keys) + 1}")
-                    
-            except ValueError:
-                print("✗ Введите число")
-            except KeyboardInterrupt:
-                print("\n\nВозврат в главное меню...")
-                return "RETURN_TO_MAIN_MENU"
-            except Exception as e:
-                print(f"✗ Ошибка: {e}")
     
     @staticmethod
     def _input_custom_key() -> Optional[str]:
@@ -130,6 +240,7 @@ class Menu:
             print("=" * 60)
             print("  [1] Ввести свой ключ вручную")
             print("  [2] Выбрать ключ с GitHub")
+            print("  [3] Автовыбор лучшего сервера")
             print("  [0] Выход")
             print("=" * 60)
             
@@ -154,8 +265,15 @@ class Menu:
                         continue  # Возвращаемся в главное меню
                     return result
                 
+                elif choice == '3':
+                    # Автоматический выбор по результатам проверок
+                    result = AutoSelector.select()
+                    if result is None:
+                        continue  # Возвращаемся в главное меню
+                    return result
+                
                 else:
-                    print("✗ Неверный выбор. Введите 1, 2 или 0")
+                    print("✗ Неверный выбор. Введите 1, 2, 3 или 0")
                     
             except ValueError:
                 print("✗ Введите число")
@@ -178,7 +296,12 @@ class Menu:
         print("=" * 60)
         
         # Загружаем ключи с GitHub (с автоматической проверкой обновлений)
-        keys = KeyLoader.load_keys_from_github(force_refresh=False)
+        # или параллельно из всех источников, перечисленных в sources.txt
+        sources = KeyLoader.get_sources()
+        if sources == [KeyLoader.GITHUB_URL]:
+            keys = KeyLoader.load_keys_from_github(force_refresh=False)
+        else:
+            keys = KeyLoader.load_keys_from_sources(sources)
         
         # Если не удалось загрузить с GitHub
         if not keys:
@@ -0,0 +1,339 @@
+"""
+Модуль массовой асинхронной проверки доступности серверов
+"""
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from endpoint_resolver import EndpointResolver
+from config_cache import ConfigCache
+
+HostPort = Tuple[str, int]
+# (успешно, время подключения в мс, сообщение об ошибке, IP адрес)
+Outcome = Tuple[bool, Optional[float], Optional[str], Optional[str]]
+# Результат ключа, до которого проверка не дошла к общему сроку
+SKIPPED: Outcome = (False, None, "Не проверен до истечения срока", None)
+
+
+class ProbeResult:
+    """Результат проверки одного ключа"""
+
+    __slots__ = ('url', 'name', 'host', 'port', 'ok', 'latency_ms', 'error', 'address', 'skipped')
+
+    def __init__(self, key: Dict[str, str], host: Optional[str], port: Optional[int],
+                 ok: bool, latency_ms: Optional[float] = None, error: Optional[str] = None,
+                 address: Optional[str] = None, skipped: bool = False):
+        """
+        Args:
+            key: Проверенный ключ {'name': '...', 'url': 'vless://...'}
+            host, port: Адрес сервера из ключа
+            ok: Удалось ли установить TCP соединение
+            latency_ms: Время установки соединения (без DNS) в мс
+            error: Сообщение об ошибке
+            address: IP адрес, к которому выполнено подключение
+            skipped: Ключ не проверялся (истек общий срок) - результат не
+                говорит о доступности сервера
+        """
+        self.url = key['url']
+        self.name = key.get('name', '')
+        self.host = host
+        self.port = port
+        self.ok = ok
+        self.latency_ms = latency_ms
+        self.error = error
+        self.address = address
+        self.skipped = skipped
+
+    def __repr__(self) -> str:
+        status = f"{self.latency_ms:.0f} мс" if self.ok else self.error
+        return f"ProbeResult({self.name!r}, {self.host}:{self.port}, {status})"
+
+
+class ProbeEngine:
+    """
+    Параллельная проверка TCP доступности всего списка ключей
+
+    Все подключения выполняются в одном цикле asyncio с общим ограничением
+    числа одновременных подключений и отдельным ограничением на IP сервера.
+    Ключи, указывающие после разрешения адреса на одну конечную точку
+    (IP, порт), проверяются одним подключением, даже если имена хостов
+    разные. Адреса берутся из общего кэша DNS EndpointResolver, а к серверам
+    с IPv4 и IPv6 подключение идет по схеме happy eyeballs.
+    Результаты выдаются по мере готовности, поэтому меню и автовыбор могут
+    обрабатывать их, не дожидаясь самых медленных серверов.
+    """
+
+    CONCURRENCY = 64  # Одновременных подключений всего
+    PER_HOST = 4  # Одновременных подключений к одному IP сервера
+    TIMEOUT = 3  # Таймаут одной проверки (сек)
+    DEADLINE = 10  # Общий срок проверки всего списка (сек)
+
+    @staticmethod
+    def _targets(keys: Iterable[Dict[str, str]]) -> Tuple[Dict[HostPort, List[Dict[str, str]]],
+                                                         List[ProbeResult]]:
+        """Группирует ключи по (хост, порт); неразобранные ключи сразу дают результат"""
+        targets: Dict[HostPort, List[Dict[str, str]]] = {}
+        failed = []
+        for key in keys:
+            try:
+                params = ConfigCache.shared().parse(key['url'])
+            except Exception as e:
+                failed.append(ProbeResult(key, None, None, False, error=f"Ошибка разбора: {e}"))
+                continue
+            targets.setdefault((params['host'].strip('[]'), params['port']), []).append(key)
+        return targets, failed
+
+    @staticmethod
+    async def _happy_connect(addresses: List[Tuple[int, str]],
+                             port: int) -> Tuple[asyncio.StreamWriter, str]:
+        """
+        Подключается по схеме happy eyeballs: следующий адрес пробуется через
+        EndpointResolver.HAPPY_EYEBALLS_DELAY или сразу после отказа предыдущего
+
+        Returns:
+            (writer победившего соединения, его IP адрес)
+        """
+        remaining = list(addresses)
+        attempts: Dict[asyncio.Future, str] = {}
+        last_error: Optional[OSError] = None
+        try:
+            while remaining or attempts:
+                if remaining:
+                    family, ip = remaining.pop(0)
+                    attempts[asyncio.ensure_future(asyncio.open_connection(ip, port, family=family))] = ip
+                done, _ = await asyncio.wait(
+                    attempts,
+                    timeout=EndpointResolver.HAPPY_EYEBALLS_DELAY if remaining else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                winner = None
+                for task in done:
+                    ip = attempts.pop(task)
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                    elif winner is None:
+                        winner = task.result()[1], ip
+                    else:
+                        task.result()[1].close()  # Одновременно подключился еще один адрес
+                if winner is not None:
+                    return winner
+            raise last_error
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    @staticmethod
+    async def _resolve(host: str, timeout: float, resolved: Dict[str, 'asyncio.Future'],
+                       resolver: ThreadPoolExecutor) -> Optional[List[Tuple[int, str]]]:
+        """Разрешает адрес один раз на хост (через общий кэш EndpointResolver)"""
+        loop = asyncio.get_running_loop()
+        lookup = resolved.get(host)
+        if lookup is None:
+            lookup = loop.run_in_executor(resolver, EndpointResolver.lookup, host)
+            resolved[host] = lookup
+        return await asyncio.wait_for(asyncio.shield(lookup), timeout)
+
+    @staticmethod
+    async def _connect(addresses: List[Tuple[int, str]], host: str, port: int,
+                       timeout: float) -> Outcome:
+        """Замеряет время TCP подключения к уже разрешенным адресам"""
+        try:
+            start = time.perf_counter()
+            writer, address = await asyncio.wait_for(
+                ProbeEngine._happy_connect(addresses, port), timeout)
+            latency_ms = (time.perf_counter() - start) * 1000
+        except asyncio.TimeoutError:
+            return False, None, f"Таймаут подключения к {host}:{port}", None
+        except OSError as e:
+            return False, None, f"Порт {port} недоступен ({e.strerror or e})", None
+
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return True, latency_ms, None, address
+
+    @staticmethod
+    async def probe_many_async(keys: Iterable[Dict[str, str]],
+                               concurrency: int = CONCURRENCY,
+                               per_host: int = PER_HOST,
+                               timeout: float = TIMEOUT,
+                               deadline: float = DEADLINE,
+                               on_result: Optional[Callable[[ProbeResult], None]] = None
+                               ) -> List[ProbeResult]:
+        """
+        Проверяет ключи внутри уже работающего цикла asyncio
+
+        Args:
+            keys: Ключи [{'name': '...', 'url': 'vless://...'}, ...]
+            concurrency: Максимум одновременных подключений
+            per_host: Максимум одновременных подключений к одному IP
+            timeout: Таймаут одной проверки (сек)
+            deadline: Общий срок (сек); не проверенные к сроку ключи
+                возвращаются с ошибкой и флагом skipped
+            on_result: Вызывается для каждого результата сразу по готовности
+
+        Returns:
+            Результаты в порядке готовности (по одному на ключ)
+        """
+        results: List[ProbeResult] = []
+
+        def emit(result: ProbeResult) -> None:
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+
+        targets, failed = ProbeEngine._targets(keys)
+        for result in failed:
+            emit(result)
+
+        def emit_outcome(host_port: HostPort, outcome: Outcome) -> None:
+            for key in targets[host_port]:
+                emit(ProbeResult(key, host_port[0], host_port[1], *outcome,
+                                 skipped=outcome is SKIPPED))
+
+        if not targets:
+            return results
+
+        loop = asyncio.get_running_loop()
+        end = loop.time() + deadline
+        limit = asyncio.Semaphore(concurrency)
+        ip_limits: Dict[str, asyncio.Semaphore] = {}
+        resolved: Dict[str, asyncio.Future] = {}
+        # Разные имена одного сервера (после DNS - один IP и порт) проверяются одним подключением
+        endpoints: Dict[HostPort, asyncio.Future] = {}
+        # Свой пул для DNS: зависший getaddrinfo нельзя прервать, а пул цикла по
+        # умолчанию asyncio.run дожидается при завершении - общий срок бы не соблюдался
+        resolver = ThreadPoolExecutor(max_workers=EndpointResolver.MAX_WORKERS,
+                                      thread_name_prefix='probe-resolver')
+
+        async def connect(addresses: List[Tuple[int, str]], host: str, port: int) -> Outcome:
+            ip_limit = ip_limits.setdefault(addresses[0][1], asyncio.Semaphore(per_host))
+            # Сначала ограничение сервера: ожидающие одного IP не занимают общие слоты
+            async with ip_limit, limit:
+                remaining = end - loop.time()
+                if remaining <= 0:
+                    return SKIPPED
+                return await ProbeEngine._connect(addresses, host, port, min(timeout, remaining))
+
+        async def probe(host: str, port: int) -> Outcome:
+            remaining = end - loop.time()
+            if remaining <= 0:
+                return SKIPPED
+            try:
+                addresses = await ProbeEngine._resolve(host, min(timeout, remaining),
+                                                       resolved, resolver)
+            except asyncio.TimeoutError:
+                return False, None, f"Таймаут разрешения адреса {host}", None
+            if not addresses:
+                return False, None, f"Не удалось разрешить адрес {host}", None
+
+            endpoint = (addresses[0][1], port)
+            shared = endpoints.get(endpoint)
+            if shared is None:
+                shared = asyncio.ensure_future(connect(addresses, host, port))
+                endpoints[endpoint] = shared
+            return await asyncio.shield(shared)
+
+        tasks = {asyncio.ensure_future(probe(*host_port)): host_port for host_port in targets}
+        pending = set(tasks)
+        try:
+            while pending:
+                remaining = end - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    emit_outcome(tasks[task], task.result())
+        finally:
+            for task in pending:
+                task.cancel()
+            for future in list(resolved.values()) + list(endpoints.values()):
+                future.cancel()
+            resolver.shutdown(wait=False, cancel_futures=True)
+
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task in pending:
+            emit_outcome(tasks[task], SKIPPED)
+        return results
+
+    @staticmethod
+    def iter_probe(keys: Iterable[Dict[str, str]],
+                   concurrency: int = CONCURRENCY,
+                   per_host: int = PER_HOST,
+                   timeout: float = TIMEOUT,
+                   deadline: float = DEADLINE) -> Iterator[ProbeResult]:
+        """
+        Проверяет ключи и выдает результаты по мере готовности
+
+        Цикл asyncio работает в отдельном потоке, поэтому генератор можно
+        использовать из обычного (синхронного) кода. Если генератор закрыт
+        раньше времени, оставшиеся проверки отменяются.
+
+        Параметры - как у probe_many_async.
+        """
+        keys = list(keys)
+        results: 'queue.Queue[Optional[ProbeResult]]' = queue.Queue()
+        state: Dict[str, any] = {}
+        state_lock = threading.Lock()
+
+        async def main() -> None:
+            with state_lock:
+                if state.get('cancelled'):
+                    return
+                state['loop'] = asyncio.get_running_loop()
+                state['task'] = asyncio.current_task()
+            await ProbeEngine.probe_many_async(keys, concurrency, per_host, timeout,
+                                               deadline, on_result=results.put)
+
+        def run() -> None:
+            try:
+                asyncio.run(main())
+            except asyncio.CancelledError:
+                pass
+            finally:
+                results.put(None)
+
+        thread = threading.Thread(target=run, name='probe-engine', daemon=True)
+        thread.start()
+        try:
+            while True:
+                result = results.get()
+                if result is None:
+                    break
+                yield result
+        finally:
+            with state_lock:
+                state['cancelled'] = True
+                task = state.get('task')
+                if task is not None and thread.is_alive():
+                    try:
+                        state['loop'].call_soon_threadsafe(task.cancel)
+                    except RuntimeError:
+                        pass  # Цикл уже завершился
+
+    @staticmethod
+    def probe_many(keys: Iterable[Dict[str, str]],
+                   concurrency: int = CONCURRENCY,
+                   per_host: int = PER_HOST,
+                   timeout: float = TIMEOUT,
+                   deadline: float = DEADLINE) -> List[ProbeResult]:
+        """
+        Проверяет все ключи параллельно
+
+        Args:
+            keys: Ключи [{'name': '...', 'url': 'vless://...'}, ...]
+            concurrency: Максимум одновременных подключений
+            per_host: Максимум одновременных подключений к одному IP
+            timeout: Таймаут одной проверки (сек)
+            deadline: Общий срок проверки всего списка (сек)
+
+        Returns:
+            Результаты в порядке готовности (по одному на ключ)
+        """
+        return list(ProbeEngine.iter_probe(keys, concurrency, per_host, timeout, deadline))
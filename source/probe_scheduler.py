@@ -0,0 +1,458 @@
+"""
+Модуль адаптивного планировщика фоновых проверок серверов
+"""
+import heapq
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from circuit_breaker import CircuitBreaker
+from connection_checker import ConnectionChecker
+from latency_history import LatencyHistory
+from config_cache import ConfigCache
+from endpoint_resolver import EndpointResolver
+from key_loader import KeyLoader
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты "корзина токенов"
+
+    Токены накапливаются со скоростью rate в секунду, но не больше burst;
+    каждая операция забирает один токен. Кратковременные всплески до burst
+    операций допустимы, средняя частота не превышает rate.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Args:
+            rate: Токенов в секунду
+            burst: Емкость корзины
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """
+        Пытается забрать токен без ожидания
+
+        Returns:
+            0 - токен получен, иначе время до появления токена (сек)
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, stop: Optional[threading.Event] = None) -> bool:
+        """
+        Ожидает и забирает токен
+
+        Args:
+            stop: Событие, прерывающее ожидание
+
+        Returns:
+            True - токен получен, False - ожидание прервано событием stop
+        """
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return True
+            if stop is None:
+                time.sleep(wait)
+            elif stop.wait(wait):
+                return False
+
+
+class ServerSchedule:
+    """Состояние сервера в планировщике"""
+
+    __slots__ = ('server', 'host', 'port', 'names', 'keys', 'interval', 'next_due',
+                 'failures', 'ewma', 'latency_ms', 'probes')
+
+    def __init__(self, server: str, host: str, port: int):
+        self.server = server  # Конечная точка (IP:порт) в формате LatencyHistory.server_id
+        self.host = host  # Адрес для подключения (IP или имя, если оно не разрешилось)
+        self.port = port
+        self.names: List[str] = []  # LatencyHistory.server_id имен ключей, ведущих сюда
+        self.keys: List[Dict[str, str]] = []
+        self.interval = 0.0  # Текущий интервал проверок (сек)
+        self.next_due = 0.0  # Время следующей проверки (time.monotonic)
+        self.failures = 0  # Неудачных проверок подряд
+        self.ewma: Optional[float] = None  # Сглаженная задержка (мс)
+        self.latency_ms: Optional[float] = None  # Последний замер (None - неудача)
+        self.probes = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.probes > 0 and self.failures == 0
+
+    def __repr__(self) -> str:
+        return f"ServerSchedule({self.server}, interval={self.interval:.0f}s, failures={self.failures})"
+
+
+class ProbeScheduler:
+    """
+    Адаптивный планировщик фоновых проверок
+
+    Все серверы (уникальные после разрешения адреса IP:порт ключей; разные
+    имена одного сервера проверяются вместе) стоят в одной очереди с
+    приоритетом по времени следующей проверки. Интервал каждого сервера
+    подстраивается под его поведение:
+    - новый, изменившийся или восстановившийся сервер проверяется часто
+      (MIN_INTERVAL);
+    - стабильный сервер - все реже (интервал растет в GROWTH раз до
+      MAX_INTERVAL, для медленных серверов - до SLOW_MAX_INTERVAL);
+    - недоступный сервер - с экспоненциальной задержкой от DEAD_INTERVAL
+      до MAX_BACKOFF.
+    Общий бюджет задают корзина токенов (проверок в секунду) и предел
+    одновременно открытых сокетов, поэтому планировщик можно оставлять
+    работать на шлюзе весь день. Результаты пишутся в LatencyHistory и,
+    если заданы, в CircuitBreaker и KeyStore.
+    """
+
+    RATE = 5.0  # Проверок в секунду
+    BURST = 10  # Допустимый всплеск проверок
+    MAX_SOCKETS = 16  # Одновременно открытых сокетов
+    TIMEOUT = 3  # Таймаут одной проверки (сек)
+
+    MIN_INTERVAL = 30.0
+    MAX_INTERVAL = 1800.0
+    SLOW_MAX_INTERVAL = 600.0
+    GROWTH = 1.5
+    DEAD_INTERVAL = 60.0
+    MAX_BACKOFF = 3600.0
+    JITTER = 0.1  # Случайный разброс интервала, чтобы проверки не шли пачками
+
+    FAST_MS = 300.0  # Сервер быстрее этого может проверяться редко
+    VOLATILITY = 0.3  # Относительное отклонение от EWMA, считающееся изменением
+    ALPHA = 0.3  # Вес нового замера в EWMA
+    SAVE_INTERVAL = 300.0  # Период сохранения истории (сек)
+
+    def __init__(self, keys: Iterable[Dict[str, str]] = (), rate: float = RATE,
+                 burst: int = BURST, max_sockets: int = MAX_SOCKETS, timeout: float = TIMEOUT,
+                 history: Optional[LatencyHistory] = None,
+                 breaker: Optional[CircuitBreaker] = None,
+                 store_results: bool = False,
+                 on_result: Optional[Callable[[ServerSchedule, bool], None]] = None):
+        """
+        Args:
+            keys: Ключи [{'name': '...', 'url': 'vless://...'}, ...]
+            rate: Проверок в секунду
+            burst: Допустимый всплеск проверок
+            max_sockets: Одновременно открытых сокетов
+            timeout: Таймаут одной проверки (сек)
+            history: История проверок (по умолчанию - LatencyHistory.shared())
+            breaker: Выключатель, которому передаются результаты проверок
+                ключей сервера (None - не передавать)
+            store_results: Записывать результаты ключей сервера в KeyStore
+                (по ним работает отбор --no-fail-within)
+            on_result: Обработчик результата (состояние сервера, изменилась ли
+                доступность); вызывается из рабочих потоков
+        """
+        self.bucket = TokenBucket(rate, burst)
+        self.max_sockets = max(1, max_sockets)
+        self.timeout = timeout
+        self.history = history if history is not None else LatencyHistory.shared()
+        self.breaker = breaker
+        self.store_results = store_results
+        self.on_result = on_result
+
+        self._servers: Dict[str, ServerSchedule] = {}
+        self._queue: List[Tuple[float, int, str]] = []  # (next_due, порядковый номер, сервер)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._sockets = threading.BoundedSemaphore(self.max_sockets)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self.set_keys(keys)
+
+    def __len__(self) -> int:
+        return len(self._servers)
+
+    def servers(self) -> List[ServerSchedule]:
+        """Серверы в порядке очереди проверок"""
+        with self._cond:
+            return sorted(self._servers.values(), key=lambda s: s.next_due)
+
+    def _push(self, state: ServerSchedule, delay: float) -> None:
+        """Ставит сервер в очередь (вызывается под self._cond)"""
+        state.next_due = time.monotonic() + delay
+        self._seq += 1
+        heapq.heappush(self._queue, (state.next_due, self._seq, state.server))
+        self._cond.notify()
+
+    @staticmethod
+    def _group(keys: Iterable[Dict[str, str]]) -> Dict[str, Tuple[str, int, List[str], List[Dict[str, str]]]]:
+        """
+        Группирует ключи по разрешенной конечной точке
+
+        Returns:
+            Словарь сервер (IP:порт) -> (адрес, порт, имена хост:порт, ключи);
+            имя, которое не разрешилось, образует отдельный сервер
+        """
+        by_name: Dict[str, Tuple[str, int, List[Dict[str, str]]]] = {}
+        for key in keys:
+            try:
+                params = ConfigCache.shared().parse(key['url'])
+            except Exception:
+                continue
+            host = params['host'].strip('[]')
+            name = LatencyHistory.server_id(host, params['port'])
+            by_name.setdefault(name, (host, params['port'], []))[2].append(key)
+
+        resolved = EndpointResolver.lookup_many(host for host, _, _ in by_name.values())
+        grouped: Dict[str, Tuple[str, int, List[str], List[Dict[str, str]]]] = {}
+        for name, (host, port, name_keys) in by_name.items():
+            addresses = resolved.get(host)
+            address = addresses[0][1] if addresses else host
+            server = LatencyHistory.server_id(address, port)
+            entry = grouped.setdefault(server, (address, port, [], []))
+            entry[2].append(name)
+            entry[3].extend(name_keys)
+        return grouped
+
+    def _add_servers(self, grouped: Dict[str, Tuple[str, int, List[str], List[Dict[str, str]]]],
+                     replace: bool) -> None:
+        """
+        Добавляет ключи в серверы, новые серверы ставит в очередь (под self._cond)
+
+        Args:
+            replace: Заменить ключи уже известных серверов, а не дополнить
+        """
+        now = time.time()
+        for server, (host, port, names, server_keys) in grouped.items():
+            state = self._servers.get(server)
+            if state is not None:
+                if replace:
+                    state.names = names
+                    state.keys = server_keys
+                else:
+                    known = {key['url'] for key in state.keys}
+                    state.names = state.names + [name for name in names if name not in state.names]
+                    state.keys = state.keys + [key for key in server_keys if key['url'] not in known]
+                continue
+            state = ServerSchedule(server, host, port)
+            state.names = names
+            state.keys = server_keys
+            state.interval = self.MIN_INTERVAL
+            # История ведется по именам; берем самую свежую проверку
+            known = [stats for stats in map(self.history.stats, names) if stats is not None]
+            delay = 0.0
+            if known:
+                stats = max(known, key=lambda item: item['last_probe'])
+                state.ewma = stats['ewma']
+                delay = max(0.0, stats['last_probe'] + self.MIN_INTERVAL - now)
+            self._servers[server] = state
+            self._push(state, delay)
+
+    def set_keys(self, keys: Iterable[Dict[str, str]]) -> None:
+        """
+        Обновляет набор проверяемых серверов
+
+        Новые серверы ставятся в очередь: без истории - немедленно, проверенные
+        в прошлых запусках - с учетом времени последней проверки. Серверы,
+        которых больше нет в ключах, снимаются с проверки.
+        """
+        grouped = self._group(keys)
+        with self._cond:
+            for server in list(self._servers):
+                if server not in grouped:
+                    # Записи в очереди станут устаревшими и будут пропущены
+                    del self._servers[server]
+            self._add_servers(grouped, replace=True)
+
+    def add_keys(self, keys: Iterable[Dict[str, str]]) -> None:
+        """
+        Добавляет ключи к проверяемым (например, KeyDiff.added)
+
+        Разбираются и разрешаются только переданные ключи; серверы, уже
+        стоящие в очереди, сохраняют свое расписание.
+        """
+        grouped = self._group(keys)
+        with self._cond:
+            self._add_servers(grouped, replace=False)
+
+    def remove_keys(self, keys: Iterable[Dict[str, str]]) -> None:
+        """
+        Снимает ключи с проверки (например, KeyDiff.removed)
+
+        Сервер, у которого не осталось ключей, снимается с проверки.
+        """
+        urls = {key['url'] for key in keys}
+        if not urls:
+            return
+        with self._cond:
+            for server, state in list(self._servers.items()):
+                remaining = [key for key in state.keys if key['url'] not in urls]
+                if len(remaining) == len(state.keys):
+                    continue
+                if not remaining:
+                    del self._servers[server]
+                    continue
+                state.keys = remaining
+                names = set()
+                for key in remaining:
+                    params = ConfigCache.shared().parse(key['url'])
+                    names.add(LatencyHistory.server_id(params['host'], params['port']))
+                state.names = [name for name in state.names if name in names]
+
+    def _jitter(self, interval: float) -> float:
+        return interval * random.uniform(1 - self.JITTER, 1 + self.JITTER)
+
+    def _next_interval(self, state: ServerSchedule, latency_ms: Optional[float]) -> float:
+        """
+        Обновляет состояние сервера по результату проверки
+
+        Returns:
+            Интервал до следующей проверки (сек, без разброса)
+        """
+        was_alive = state.alive
+        state.probes += 1
+        state.latency_ms = latency_ms
+
+        if latency_ms is None:
+            state.failures += 1
+            state.interval = min(self.DEAD_INTERVAL * 2 ** (state.failures - 1), self.MAX_BACKOFF)
+            return state.interval
+
+        recovered = not was_alive
+        state.failures = 0
+        if state.ewma is None:
+            changed = True
+            state.ewma = latency_ms
+        else:
+            changed = abs(latency_ms - state.ewma) > self.VOLATILITY * max(state.ewma, 1.0)
+            state.ewma = self.ALPHA * latency_ms + (1 - self.ALPHA) * state.ewma
+
+        if recovered or changed:
+            state.interval = self.MIN_INTERVAL
+        else:
+            limit = self.MAX_INTERVAL if state.ewma <= self.FAST_MS else self.SLOW_MAX_INTERVAL
+            state.interval = min(max(state.interval, self.MIN_INTERVAL) * self.GROWTH, limit)
+        return state.interval
+
+    def _probe(self, state: ServerSchedule) -> None:
+        """Проверка сервера в рабочем потоке"""
+        try:
+            stats = ConnectionChecker.measure_latency(state.host, state.port, samples=1,
+                                                      timeout=self.timeout)
+            latency_ms = stats.avg if stats.ok else None
+        except Exception:
+            latency_ms = None
+        finally:
+            self._sockets.release()
+
+        for name in state.names:
+            self.history.record(name, latency_ms)
+        if self.breaker is not None:
+            for key in state.keys:
+                self.breaker.record(key['url'], latency_ms is not None,
+                                    None if latency_ms is not None else "сервер недоступен")
+        if self.store_results:
+            KeyLoader.record_probes((key['url'], latency_ms is not None) for key in state.keys)
+        with self._cond:
+            was_alive = state.alive
+            interval = self._next_interval(state, latency_ms)
+            changed = state.probes == 1 or was_alive != state.alive
+            if self._servers.get(state.server) is state and not self._stop.is_set():
+                self._push(state, self._jitter(interval))
+
+        if self.on_result is not None:
+            try:
+                self.on_result(state, changed)
+            except Exception:
+                pass  # Ошибка обработчика не должна останавливать проверки
+
+    def _release_cancelled(self, future: Future) -> None:
+        """Возвращает сокет проверки, отмененной в stop() до начала (_probe не запускался)"""
+        if future.cancelled():
+            self._sockets.release()
+
+    def _next_due(self) -> Optional[ServerSchedule]:
+        """Ожидает сервер, которому пора на проверку (None - планировщик остановлен)"""
+        with self._cond:
+            while not self._stop.is_set():
+                if not self._queue:
+                    self._cond.wait(1.0)
+                    continue
+                due, _, server = self._queue[0]
+                state = self._servers.get(server)
+                if state is None or state.next_due != due:
+                    heapq.heappop(self._queue)  # Устаревшая запись
+                    continue
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(min(wait, 1.0))
+                    continue
+                heapq.heappop(self._queue)
+                return state
+        return None
+
+    def _run(self) -> None:
+        last_save = time.monotonic()
+        while True:
+            state = self._next_due()
+            if state is None:
+                break
+            # Бюджет: свободный сокет и токен частоты проверок
+            while not self._sockets.acquire(timeout=1.0):
+                if self._stop.is_set():
+                    return
+            if not self.bucket.acquire(self._stop):
+                self._sockets.release()
+                return
+            self._executor.submit(self._probe, state).add_done_callback(self._release_cancelled)
+
+            if time.monotonic() - last_save >= self.SAVE_INTERVAL:
+                last_save = time.monotonic()
+                self._save_state()
+
+    def _save_state(self) -> None:
+        try:
+            self.history.save()
+            if self.breaker is not None:
+                self.breaker.save()
+        except OSError:
+            pass  # История и карантин - вспомогательные данные
+
+    def start(self) -> None:
+        """Запускает проверки в фоновом потоке"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_sockets,
+                                            thread_name_prefix='probe-scheduler')
+        self._thread = threading.Thread(target=self._run, name='ProbeScheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Останавливает проверки и сохраняет историю и карантин"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self._save_state()
+
+        # Серверы, чьи проверки были отменены, вернутся в очередь при следующем запуске
+        with self._cond:
+            self._queue = []
+            for state in self._servers.values():
+                self._push(state, max(0.0, state.next_due - time.monotonic()))
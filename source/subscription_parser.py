@@ -0,0 +1,262 @@
+"""
+Модуль потокового разбора подписок с VLESS ключами
+"""
+import mmap
+import re
+import codecs
+import binascii
+import itertools
+import lzma
+import zlib
+from typing import Dict, Iterable, Iterator, BinaryIO, Tuple
+
+
+class SubscriptionParser:
+    """
+    Однопроходный потоковый парсер подписок
+
+    Содержимое читается кусками (из файла через mmap или из HTTP ответа),
+    при необходимости распаковывается (gzip/zlib/xz) и декодируется из
+    base64, режется на строки и превращается в ключи по мере поступления
+    данных, поэтому потребление памяти не зависит от размера подписки.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    SNIFF_SIZE = 256  # Сколько байт смотреть для определения формата
+
+    GZIP_MAGIC = b'\x1f\x8b'
+    XZ_MAGIC = b'\xfd7zXZ\x00'
+    BASE64_ALPHABET = frozenset(
+        b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=-_'
+    )
+    BASE64_URLSAFE = bytes.maketrans(b'-_', b'+/')
+    WHITESPACE = b' \t\r\n\v\f'
+
+    VLESS_PATTERN = re.compile(r'vless://\S+')
+    NAME_PATTERN = re.compile(r'#([^#\n]+)')
+
+    @staticmethod
+    def iter_keys(lines: Iterable[str]) -> Iterator[Dict[str, str]]:
+        """
+        Извлекает ключи из последовательности строк
+
+        Args:
+            lines: Строки подписки (без разбора на ключи)
+
+        Yields:
+            Словари вида {'name': '...', 'url': 'vless://...'}
+        """
+        vless_search = SubscriptionParser.VLESS_PATTERN.search
+        name_search = SubscriptionParser.NAME_PATTERN.search
+
+        for i, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            # Ищем VLESS URL в строке
+            vless_match = vless_search(line)
+            if not vless_match:
+                continue
+
+            # Пытаемся извлечь имя из комментария или используем номер
+            name_match = name_search(line)
+            if name_match:
+                name = name_match.group(1).strip()
+            else:
+                name = f"Сервер {i}"
+
+            yield {
+                'name': name,
+                'url': vless_match.group(0)
+            }
+
+    @staticmethod
+    def iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+        """
+        Режет поток байтовых кусков на текстовые строки
+
+        Неполная последняя строка куска переносится в следующий кусок,
+        многобайтовые символы UTF-8 на границе кусков декодируются корректно.
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        tail = ''
+
+        for chunk in chunks:
+            text = tail + decoder.decode(chunk)
+            lines = text.split('\n')
+            tail = lines.pop()
+            yield from lines
+
+        tail += decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+
+    @staticmethod
+    def _peek(chunks: Iterable[bytes], size: int) -> Tuple[bytes, Iterator[bytes]]:
+        """
+        Читает начало потока, не теряя его
+
+        Returns:
+            Tuple: (первые size байт или меньше, итератор по всему потоку)
+        """
+        chunks = iter(chunks)
+        head = []
+        length = 0
+        for chunk in chunks:
+            head.append(chunk)
+            length += len(chunk)
+            if length >= size:
+                break
+        return b''.join(head)[:size], itertools.chain(head, chunks)
+
+    @staticmethod
+    def _iter_decompressed(chunks: Iterable[bytes], decompressor) -> Iterator[bytes]:
+        """
+        Распаковывает поток порциями не больше CHUNK_SIZE
+
+        Распакованные данные никогда не накапливаются целиком, даже если
+        маленький сжатый кусок разворачивается в большой объем.
+        """
+        limit = SubscriptionParser.CHUNK_SIZE
+        is_lzma = isinstance(decompressor, lzma.LZMADecompressor)
+
+        for chunk in chunks:
+            data = chunk
+            while data and not decompressor.eof:
+                output = decompressor.decompress(data, limit)
+                if output:
+                    yield output
+                if is_lzma:
+                    data = b''
+                else:
+                    data = decompressor.unconsumed_tail
+            # У LZMA недораспакованный остаток хранится внутри декомпрессора
+            while is_lzma and not decompressor.eof and not decompressor.needs_input:
+                output = decompressor.decompress(b'', limit)
+                if not output:
+                    break
+                yield output
+            if decompressor.eof:
+                break
+
+        if not is_lzma:
+            output = decompressor.flush()
+            if output:
+                yield output
+
+    @staticmethod
+    def _iter_base64_decoded(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Декодирует base64 (обычный и URL-safe) по кускам
+
+        Пробельные символы игнорируются, отсутствующее выравнивание '='
+        в конце потока восстанавливается.
+        """
+        tail = b''
+        for chunk in chunks:
+            data = tail + chunk.translate(SubscriptionParser.BASE64_URLSAFE,
+                                          SubscriptionParser.WHITESPACE)
+            usable = len(data) - len(data) % 4
+            tail = data[usable:]
+            if usable:
+                try:
+                    yield binascii.a2b_base64(data[:usable])
+                except binascii.Error:
+                    return
+
+        if tail:
+            tail = tail.rstrip(b'=')
+            tail += b'=' * (-len(tail) % 4)
+            try:
+                yield binascii.a2b_base64(tail)
+            except binascii.Error:
+                pass
+
+    @staticmethod
+    def _looks_like_base64(head: bytes) -> bool:
+        """Проверяет, похоже ли начало потока на base64 (а не на текст с URL)"""
+        sample = head.translate(None, SubscriptionParser.WHITESPACE)
+        if len(sample) < 8:
+            return False
+        return all(byte in SubscriptionParser.BASE64_ALPHABET for byte in sample)
+
+    @staticmethod
+    def _looks_like_zlib(head: bytes) -> bool:
+        """
+        Проверяет заголовок zlib (RFC 1950)
+
+        Под контрольную сумму CMF/FLG попадает и обычный текст (например,
+        строка, начинающаяся с "x "), поэтому дополнительно проверяется метод
+        сжатия и пробно распаковывается начало потока.
+        """
+        if len(head) < 2 or head[0] & 0x0f != 8 or head[0] >> 4 > 7:
+            return False
+        if int.from_bytes(head[:2], 'big') % 31 != 0:
+            return False
+        try:
+            zlib.decompressobj().decompress(head, SubscriptionParser.CHUNK_SIZE)
+        except zlib.error:
+            return False
+        return True
+
+    @staticmethod
+    def iter_decoded(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Определяет формат подписки и декодирует ее потоково
+
+        Поддерживаются: обычный текст, gzip/zlib, xz и base64 (в том числе
+        base64 внутри сжатого файла).
+        """
+        head, chunks = SubscriptionParser._peek(chunks, SubscriptionParser.SNIFF_SIZE)
+
+        if head.startswith(SubscriptionParser.GZIP_MAGIC):
+            chunks = SubscriptionParser._iter_decompressed(
+                chunks, zlib.decompressobj(16 + zlib.MAX_WBITS))
+        elif head.startswith(SubscriptionParser.XZ_MAGIC):
+            chunks = SubscriptionParser._iter_decompressed(chunks, lzma.LZMADecompressor())
+        elif SubscriptionParser._looks_like_zlib(head):
+            chunks = SubscriptionParser._iter_decompressed(chunks, zlib.decompressobj())
+        else:
+            if SubscriptionParser._looks_like_base64(head):
+                return SubscriptionParser._iter_base64_decoded(chunks)
+            return chunks
+
+        head, chunks = SubscriptionParser._peek(chunks, SubscriptionParser.SNIFF_SIZE)
+        if SubscriptionParser._looks_like_base64(head):
+            return SubscriptionParser._iter_base64_decoded(chunks)
+        return chunks
+
+    @staticmethod
+    def iter_file_chunks(filepath: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Читает файл кусками через mmap (без загрузки файла целиком)"""
+        with open(filepath, 'rb') as f:
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return  # Пустой файл нельзя отобразить в память
+
+            with mapped:
+                for offset in range(0, len(mapped), chunk_size):
+                    yield mapped[offset:offset + chunk_size]
+
+    @staticmethod
+    def iter_stream_chunks(stream: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Читает файловый объект (например, HTTP ответ) кусками"""
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    @staticmethod
+    def iter_keys_from_file(filepath: str) -> Iterator[Dict[str, str]]:
+        """Потоково извлекает ключи из локального файла"""
+        chunks = SubscriptionParser.iter_decoded(SubscriptionParser.iter_file_chunks(filepath))
+        return SubscriptionParser.iter_keys(SubscriptionParser.iter_lines(chunks))
+
+    @staticmethod
+    def iter_keys_from_stream(stream: BinaryIO) -> Iterator[Dict[str, str]]:
+        """Потоково извлекает ключи из файлового объекта (HTTP ответа)"""
+        chunks = SubscriptionParser.iter_decoded(SubscriptionParser.iter_stream_chunks(stream))
+        return SubscriptionParser.iter_keys(SubscriptionParser.iter_lines(chunks))
@@ -0,0 +1,147 @@
+"""
+Тестовый скрипт для проверки автоматического выбора сервера
+"""
+import math
+import os
+import socket
+import tempfile
+
+from auto_select import AutoSelector, Candidate
+from circuit_breaker import CircuitBreaker
+from connection_checker import HandshakeResult
+from key_store import KeyStore
+from latency_history import LatencyHistory
+from latency_stats import LatencyStats
+
+
+def listening_socket() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(64)
+    return sock
+
+
+def candidate(samples, history=None) -> Candidate:
+    c = Candidate({'name': 'x', 'url': 'vless://uuid@example.com:443'}, 'example.com', 443, 10.0)
+    c.stats = LatencyStats(samples)
+    c.history = history
+    return c
+
+
+def test_score():
+    assert AutoSelector.score(candidate([10.0, 10.0])) == 10.0
+    # Джиттер и потери ухудшают оценку
+    assert AutoSelector.score(candidate([10.0, 20.0])) == 25.0
+    assert AutoSelector.score(candidate([10.0, None])) == 10.0 * (1 + AutoSelector.LOSS_WEIGHT * 0.5)
+    assert AutoSelector.score(candidate([None, None])) == math.inf
+    # История учитывается только при достаточном числе замеров
+    history = {'samples': 10, 'success_rate': 0.5}
+    assert AutoSelector.score(candidate([10.0], history)) == 15.0
+    assert AutoSelector.score(candidate([10.0], dict(history, samples=1))) == 10.0
+
+
+def test_select():
+    servers = [listening_socket() for _ in range(3)]
+    dead = socket.socket()
+    dead.bind(('127.0.0.1', 0))
+    dead_port = dead.getsockname()[1]
+    dead.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        saved = LatencyHistory.HISTORY_FILE, LatencyHistory._shared, CircuitBreaker._shared, KeyStore.DB_FILE
+        LatencyHistory.HISTORY_FILE = os.path.join(tmp, 'history.bin')
+        KeyStore.DB_FILE = os.path.join(tmp, 'keys.db')
+        LatencyHistory._shared = None
+        CircuitBreaker._shared = CircuitBreaker(os.path.join(tmp, 'breaker.json'))
+        try:
+            keys = [{'name': f's{i}', 'url': f"vless://uuid@127.0.0.1:{s.getsockname()[1]}?security=none#s{i}"}
+                    for i, s in enumerate(servers)]
+            keys.append({'name': 'dead', 'url': f"vless://uuid@127.0.0.1:{dead_port}?security=none#dead"})
+
+            ranked = AutoSelector.rank(keys, deadline=5)
+            assert len(ranked) == 3  # Недоступный сервер отсеян первичной проверкой
+            assert all(math.isfinite(c.score) for c in ranked)
+            assert [c.score for c in ranked] == sorted(c.score for c in ranked)
+
+            assert AutoSelector.select(keys, deadline=5) in {k['url'] for k in keys[:3]}
+            assert AutoSelector.select(keys[3:], deadline=2) is None
+            assert os.path.exists(LatencyHistory.HISTORY_FILE)
+
+            # Ключи в карантине в автовыборе не участвуют
+            assert CircuitBreaker._shared.record(keys[3]['url'], False) == CircuitBreaker.OPEN
+            quarantined = keys[0]['url']
+            for _ in range(CircuitBreaker.FAILURE_THRESHOLD):
+                CircuitBreaker._shared.record(quarantined, False)
+            assert quarantined not in {c.key['url'] for c in AutoSelector.rank(keys, deadline=5)}
+        finally:
+            LatencyHistory.HISTORY_FILE, LatencyHistory._shared, CircuitBreaker._shared, KeyStore.DB_FILE = saved
+            for s in servers:
+                s.close()
+
+
+def test_deadline_miss_not_recorded():
+    """Ключи, до которых проверка не дошла к сроку, не попадают в историю и карантин"""
+    with tempfile.TemporaryDirectory() as tmp:
+        history = LatencyHistory()
+        breaker = CircuitBreaker(os.path.join(tmp, 'breaker.json'))
+        keys = [{'name': f'k{i}', 'url': f"vless://uuid@127.0.0.1:{9 + i}?security=none#k{i}"}
+                for i in range(3)]
+        sweep = {}
+        assert AutoSelector._finalists(keys, 0, history, sweep) == []
+        assert len(history) == 0 and sweep == {}
+
+
+def test_one_outcome_per_selection():
+    """Финалист, прошедший первичную проверку, но не прошедший TLS, уходит в карантин"""
+    server = listening_socket()
+    url = f"vless://uuid@127.0.0.1:{server.getsockname()[1]}?security=none#s"
+    inspect = AutoSelector._inspect
+    AutoSelector._inspect = staticmethod(
+        lambda c: (LatencyStats([10.0]), HandshakeResult(False, error="TLS: ошибка")))
+    with tempfile.TemporaryDirectory() as tmp:
+        saved = LatencyHistory.HISTORY_FILE, LatencyHistory._shared, CircuitBreaker._shared, KeyStore.DB_FILE
+        LatencyHistory.HISTORY_FILE = os.path.join(tmp, 'history.bin')
+        KeyStore.DB_FILE = os.path.join(tmp, 'keys.db')
+        LatencyHistory._shared = None
+        CircuitBreaker._shared = CircuitBreaker(os.path.join(tmp, 'breaker.json'))
+        try:
+            for _ in range(CircuitBreaker.FAILURE_THRESHOLD):
+                assert not math.isfinite(AutoSelector.rank([{'name': 's', 'url': url}], deadline=5)[0].score)
+            assert CircuitBreaker._shared.state(url) == CircuitBreaker.OPEN
+        finally:
+            AutoSelector._inspect = inspect
+            LatencyHistory.HISTORY_FILE, LatencyHistory._shared, CircuitBreaker._shared, KeyStore.DB_FILE = saved
+            server.close()
+
+
+def test_filter_keys():
+    keys = [{'name': 'r', 'url': "vless://uuid@a.com:443?security=reality&sni=a.com&pbk=k#r"},
+            {'name': 't', 'url': "vless://uuid@b.com:443?security=tls&sni=b.com&type=ws#t"},
+            {'name': 'p', 'url': "vless://uuid@c.com:8080?security=none#p"}]
+    with tempfile.TemporaryDirectory() as tmp:
+        saved = KeyStore.DB_FILE
+        KeyStore.DB_FILE = os.path.join(tmp, 'keys.db')
+        try:
+            # Пустое хранилище: условия проверяются по разобранным полям
+            assert AutoSelector.filter_keys(keys, port=443) == keys[:2]
+            with KeyStore() as store:
+                assert store.count() == 0  # Отбор ничего не записывает
+
+            # Хранилище отстает от списка: недостающий ключ не теряется
+            with KeyStore() as store:
+                store.sync(keys[:1], 'src')
+                store.record_result(keys[0]['url'], False)
+            assert AutoSelector.filter_keys(keys, port=443) == keys[:2]
+            assert AutoSelector.filter_keys(keys, port=443, not_failed_within=3600) == keys[1:2]
+            assert AutoSelector.filter_keys(keys[2:], security='reality') == []
+        finally:
+            KeyStore.DB_FILE = saved
+
+
+if __name__ == '__main__':
+    test_score()
+    test_select()
+    test_deadline_miss_not_recorded()
+    test_one_outcome_per_selection()
+    test_filter_keys()
+    print("✓ Все тесты пройдены")
@@ -0,0 +1,174 @@
+"""
+Тестовый скрипт для проверки карантина неработающих ключей
+"""
+import os
+import tempfile
+
+import vpn_client
+from circuit_breaker import CircuitBreaker
+from connection_checker import ConnectionChecker
+from key_loader import KeyLoader
+from tunnel_probe import TunnelProbe, TunnelProbeResult
+
+URL = "vless://uuid@example.com:443?security=tls&sni=example.com#Main"
+VALID = "vless://11111111-2222-3333-4444-555555555555@example.com:443?security=tls&sni=example.com#Valid"
+COPY = "vless://uuid@example.com:443?security=tls&sni=example.com#Copy"
+OTHER = "vless://uuid@other.com:443?security=tls&sni=other.com#Other"
+
+
+def test_states():
+    with tempfile.TemporaryDirectory() as tmp:
+        breaker = CircuitBreaker(os.path.join(tmp, 'breaker.json'))
+        now = 1000.0
+
+        # Неудачи ниже порога выключатель не открывают
+        for _ in range(CircuitBreaker.FAILURE_THRESHOLD - 1):
+            assert breaker.record(URL, False, now=now) == CircuitBreaker.CLOSED
+        assert breaker.record(URL, True, now=now) == CircuitBreaker.CLOSED
+        for _ in range(CircuitBreaker.FAILURE_THRESHOLD - 1):
+            breaker.record(URL, False, now=now)
+        assert breaker.allow(URL, now)
+
+        # Порог достигнут - карантин; копия ключа под другим именем тоже в карантине
+        assert breaker.record(URL, False, "таймаут", now=now) == CircuitBreaker.OPEN
+        assert not breaker.allow(URL, now) and not breaker.allow(COPY, now)
+        assert breaker.retry_in(URL, now) == CircuitBreaker.COOLDOWN
+        assert breaker.filter([{'name': 'a', 'url': URL}, {'name': 'b', 'url': OTHER}], now) == \
+            [{'name': 'b', 'url': OTHER}]
+        assert [k['url'] for k in breaker.sort_keys([{'url': URL}, {'url': OTHER}], now)] == [OTHER, URL]
+
+        # Неудачи во время карантина его не продлевают
+        breaker.record(URL, False, now=now + 10)
+        assert breaker.retry_in(URL, now + 10) == CircuitBreaker.COOLDOWN - 10
+
+        # После карантина - пробная попытка; неудача удваивает карантин
+        later = now + CircuitBreaker.COOLDOWN
+        assert breaker.state(URL, later) == CircuitBreaker.HALF_OPEN and breaker.allow(URL, later)
+        assert breaker.record(URL, False, now=later) == CircuitBreaker.OPEN
+        assert breaker.retry_in(URL, later) == 2 * CircuitBreaker.COOLDOWN
+
+        # Успех закрывает выключатель
+        assert breaker.record(URL, True, now=later + 1) == CircuitBreaker.CLOSED
+        assert breaker.state(URL, later + 1) == CircuitBreaker.CLOSED
+
+
+def test_persistence():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'breaker.json')
+        first = CircuitBreaker(path)
+        for _ in range(CircuitBreaker.FAILURE_THRESHOLD):
+            first.record(URL, False)
+        first.record(OTHER, False)
+        first.save()
+
+        # Параллельный процесс закрывает другой ключ - изменения не теряются
+        second = CircuitBreaker(path)
+        assert second.state(URL) == CircuitBreaker.OPEN
+        second.record(OTHER, True)
+        first.record(COPY, False)
+        second.save()
+        first.save()
+
+        third = CircuitBreaker(path)
+        assert third.state(URL) == CircuitBreaker.OPEN
+        assert third.record(OTHER, False) == CircuitBreaker.CLOSED
+        assert third._entries[third._fingerprint(OTHER)]['failures'] == 1
+
+
+def test_probe_success_keeps_connect_quarantine():
+    with tempfile.TemporaryDirectory() as tmp:
+        breaker = CircuitBreaker(os.path.join(tmp, 'breaker.json'))
+        now = 1000.0
+        for _ in range(CircuitBreaker.FAILURE_THRESHOLD):
+            breaker.record(URL, False, "туннель: таймаут", now=now, source=CircuitBreaker.CONNECT)
+        assert breaker.state(URL, now) == CircuitBreaker.OPEN
+
+        # Доступность порта не снимает карантин, вызванный неудачными подключениями
+        assert breaker.record(URL, True, now=now) == CircuitBreaker.OPEN
+        later = now + CircuitBreaker.COOLDOWN
+        assert breaker.record(URL, True, now=later) == CircuitBreaker.HALF_OPEN
+        assert breaker.record(URL, True, now=later, source=CircuitBreaker.CONNECT) == CircuitBreaker.CLOSED
+
+        # Карантин по одним проверкам доступности снимается успешной проверкой
+        for _ in range(CircuitBreaker.FAILURE_THRESHOLD):
+            breaker.record(OTHER, False, now=now)
+        assert breaker.record(OTHER, True, now=now) == CircuitBreaker.CLOSED
+
+
+class FakeXrayRunner:
+    def __init__(self, exit_code=None):
+        self.exit_code = exit_code
+        self.last_exit_code = None
+
+    def start(self, config_path):
+        self.last_exit_code = self.exit_code
+        return self.exit_code is None
+
+    def stop(self):
+        return True
+
+
+class FakeProxyManager:
+    def set_proxy(self, host, port):
+        return True
+
+    def remove_proxy(self):
+        return True
+
+
+def test_connect_sequence():
+    """Попытки подключения: проверка доступности успешна, Xray или туннель - нет"""
+    saved = (CircuitBreaker._shared, ConnectionChecker.check_connection,
+             TunnelProbe.check, KeyLoader.record_probe)
+    with tempfile.TemporaryDirectory() as tmp:
+        breaker = CircuitBreaker._shared = CircuitBreaker(os.path.join(tmp, 'breaker.json'))
+        ConnectionChecker.check_connection = staticmethod(lambda *args, **kwargs: (True, "Сервер доступен"))
+        KeyLoader.record_probe = staticmethod(lambda url, ok: None)
+        tunnel_ok = [False]
+        TunnelProbe.check = staticmethod(lambda *args, **kwargs: TunnelProbeResult(
+            tunnel_ok[0], 'target:80', 1.0, 1.0, None if tunnel_ok[0] else "таймаут"))
+
+        client = object.__new__(vpn_client.VPNClient)
+        client.config_cache = vpn_client.ConfigCache()
+        client.config_generator = vpn_client.XrayConfigGenerator()
+        client.proxy_manager = FakeProxyManager()
+        client.config_file = os.path.join(tmp, 'config.json')
+        client.tunnel_monitor = None
+
+        def connect():
+            result = client.connect(VALID)
+            if client.tunnel_monitor is not None:
+                client.tunnel_monitor.stop(timeout=1)
+                client.tunnel_monitor = None
+            return result
+
+        try:
+            # Xray отвергает конфигурацию: каждая попытка - одна неудача
+            client.xray_runner = FakeXrayRunner(exit_code=23)
+            for _ in range(CircuitBreaker.FAILURE_THRESHOLD):
+                assert not connect()
+            assert breaker.state(VALID) == CircuitBreaker.OPEN
+
+            # Xray запускается, но трафик по туннелю не идет
+            breaker.record(VALID, True, source=CircuitBreaker.CONNECT)
+            client.xray_runner = FakeXrayRunner()
+            for _ in range(CircuitBreaker.FAILURE_THRESHOLD):
+                connect()
+            assert breaker.state(VALID) == CircuitBreaker.OPEN
+            assert breaker.record(VALID, True) == CircuitBreaker.OPEN  # Проверка доступности
+
+            # Успешное подключение снимает карантин
+            tunnel_ok[0] = True
+            assert connect()
+            assert breaker.state(VALID) == CircuitBreaker.CLOSED
+        finally:
+            (CircuitBreaker._shared, ConnectionChecker.check_connection,
+             TunnelProbe.check, KeyLoader.record_probe) = saved
+
+
+if __name__ == '__main__':
+    test_states()
+    test_persistence()
+    test_probe_success_keeps_connect_quarantine()
+    test_connect_sequence()
+    print("✓ Все тесты пройдены")
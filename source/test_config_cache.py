@@ -0,0 +1,66 @@
+"""
+Тестовый скрипт для проверки кэша разбора ключей и конфигурации Xray
+"""
+from config_cache import ConfigCache
+from vless_parser import VLESSURLParser
+from xray_config import XrayConfigGenerator
+
+URL = "vless://11111111-2222-3333-4444-555555555555@example.com:443?security=tls&sni=example.com&type=ws&path=%2Fws#Main"
+
+
+def url(i: int) -> str:
+    return f"vless://11111111-2222-3333-4444-555555555555@host{i}.com:443?security=none#k{i}"
+
+
+def test_hits_and_misses():
+    cache = ConfigCache()
+    params = cache.parse(URL)
+    assert params == VLESSURLParser.parse(URL)
+    assert cache.parse(URL) is params
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 1}
+
+    # Подключение: parse и generate одного URL - одно обращение
+    cache.clear()
+    cache.parse(URL)
+    config = cache.generate(URL, local_port=1080, socks_port=1081, count=False)
+    assert cache.stats() == {'hits': 0, 'misses': 1, 'size': 1}
+    assert config == XrayConfigGenerator.generate(VLESSURLParser.parse(URL), local_port=1080, socks_port=1081)
+
+    # Outbound общий, inbounds собираются заново под порты
+    other = cache.generate(URL, local_port=2080, socks_port=2081)
+    assert cache.stats()['hits'] == 1
+    assert other['outbounds'][0] is config['outbounds'][0]
+    assert other['inbounds'] != config['inbounds']
+
+    # Ошибки разбора не кэшируются
+    try:
+        cache.parse("vless://broken")
+        assert False, "ожидалась ошибка разбора"
+    except ValueError:
+        pass
+    assert cache.stats()['size'] == 1
+
+
+def test_lru_eviction():
+    cache = ConfigCache()
+    for i in range(ConfigCache.MAX_SIZE):
+        cache.parse(url(i))
+    assert cache.stats()['size'] == ConfigCache.MAX_SIZE
+
+    # Обращение продлевает жизнь записи: вытесняется самая давняя
+    cache.parse(url(0))
+    cache.parse(url(ConfigCache.MAX_SIZE))
+    stats = cache.stats()
+    assert stats['size'] == ConfigCache.MAX_SIZE
+    assert stats['misses'] == ConfigCache.MAX_SIZE + 1 and stats['hits'] == 1
+
+    cache.parse(url(0))
+    assert cache.stats()['hits'] == 2  # Не вытеснен
+    cache.parse(url(1))
+    assert cache.stats()['misses'] == ConfigCache.MAX_SIZE + 2  # Вытеснен
+
+
+if __name__ == '__main__':
+    test_hits_and_misses()
+    test_lru_eviction()
+    print("✓ Все тесты пройдены")
@@ -0,0 +1,171 @@
+"""
+Тестовый скрипт для проверки измерения задержки
+"""
+import os
+import shutil
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+
+from connection_checker import ConnectionChecker, LatencyStats
+from endpoint_resolver import EndpointResolver
+from icmp_pinger import IcmpPinger
+
+
+def test_latency_stats():
+    stats = LatencyStats([10.0, None, 14.0, 12.0, None])
+    assert stats.sent == 5 and stats.received == 3
+    assert stats.loss == 0.4
+    assert stats.min == 10.0 and stats.avg == 12.0 and stats.p95 == 14.0
+    assert stats.jitter == 3.0  # |14-10| и |12-14|
+
+    lost = LatencyStats([None, None])
+    assert not lost.ok and lost.loss == 1.0 and lost.avg is None
+
+
+def test_measure_latency():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(16)  # Подключения принимает очередь ядра, accept не нужен
+    port = server.getsockname()[1]
+    try:
+        stats = ConnectionChecker.measure_latency('127.0.0.1', port, samples=4, interval=0)
+        assert stats.received == 4 and stats.loss == 0
+        assert 0 <= stats.min <= stats.avg <= stats.p95
+    finally:
+        server.close()
+
+    # Порт закрыт - все замеры потеряны
+    stats = ConnectionChecker.measure_latency('127.0.0.1', port, samples=3, interval=0)
+    assert not stats.ok and stats.loss == 1.0
+
+
+def test_measure_latency_skips_warmup():
+    """Перебор адресов при выборе (happy eyeballs) в замеры не попадает"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(16)
+    connect = EndpointResolver.connect
+
+    def slow_connect(host, port, timeout=5):
+        time.sleep(0.3)  # Как ожидание отказавшего первого адреса
+        return connect(host, port, timeout)
+
+    EndpointResolver.connect = staticmethod(slow_connect)
+    try:
+        stats = ConnectionChecker.measure_latency('127.0.0.1', server.getsockname()[1],
+                                                  samples=3, interval=0)
+        assert stats.received == 3 and stats.p95 < 200
+    finally:
+        EndpointResolver.connect = connect
+        server.close()
+
+
+def test_port_failure_ping_diagnosis():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    saved = IcmpPinger.available, IcmpPinger.ping_many
+    try:
+        IcmpPinger.available = staticmethod(lambda family=None: True)
+        IcmpPinger.ping_many = staticmethod(
+            lambda hosts, **kwargs: {host: LatencyStats([1.0, 2.0]) for host in hosts})
+        ok, message = ConnectionChecker.check_connection('127.0.0.1', port)
+        assert not ok and 'хост отвечает' in message
+
+        IcmpPinger.ping_many = staticmethod(lambda hosts, **kwargs: {host: LatencyStats([None]) for host in hosts})
+        assert 'хост не отвечает' in ConnectionChecker.check_connection('127.0.0.1', port)[1]
+
+        # ICMP недоступен - только результат проверки порта
+        IcmpPinger.available = staticmethod(lambda family=None: False)
+        assert 'Ping' not in ConnectionChecker.check_connection('127.0.0.1', port)[1]
+    finally:
+        IcmpPinger.available, IcmpPinger.ping_many = saved
+
+
+def _serve(server: socket.socket, handle) -> None:
+    def run():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            handle(conn)
+    threading.Thread(target=run, daemon=True).start()
+
+
+def _tls_context():
+    """Контекст локального TLS сервера с самоподписанным сертификатом (нужен openssl)"""
+    if shutil.which('openssl') is None:
+        return None
+    directory = tempfile.mkdtemp()
+    cert = os.path.join(directory, 'cert.pem')
+    key = os.path.join(directory, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=localhost', '-keyout', key, '-out', cert],
+                   check=True, capture_output=True)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    context.set_alpn_protocols(['h2', 'http/1.1'])
+    shutil.rmtree(directory)
+    return context
+
+
+def test_handshake():
+    # Порт открыт, но сервер сразу закрывает соединение - рукопожатие не удается
+    plain = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    plain.bind(('127.0.0.1', 0))
+    plain.listen(16)
+    _serve(plain, lambda conn: conn.close())
+    try:
+        result = ConnectionChecker.check_handshake('127.0.0.1', plain.getsockname()[1], timeout=2)
+        assert not result.ok and result.connect_ms is not None and result.handshake_ms is None
+    finally:
+        plain.close()
+
+    context = _tls_context()
+    if context is None:
+        return
+
+    def handle(conn):
+        try:
+            with context.wrap_socket(conn, server_side=True) as tls_conn:
+                tls_conn.recv(1)
+        except (OSError, ssl.SSLError):
+            conn.close()
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(16)
+    _serve(server, lambda conn: threading.Thread(target=handle, args=(conn,), daemon=True).start())
+    port = server.getsockname()[1]
+    try:
+        result = ConnectionChecker.check_handshake('127.0.0.1', port, sni='example.com', alpn=['h2'])
+        assert result.ok and result.alpn == 'h2' and result.tls_version.startswith('TLS')
+        assert result.handshake_ms is not None and result.total_ms >= result.connect_ms
+
+        keys = [
+            {'name': 'tls', 'url': f"vless://uuid@127.0.0.1:{port}?security=tls&sni=example.com"},
+            {'name': 'same', 'url': f"vless://uuid@127.0.0.1:{port}?security=tls&sni=example.com#2"},
+            {'name': 'none', 'url': f"vless://uuid@127.0.0.1:{port}?security=none"},
+        ]
+        results = ConnectionChecker.check_handshakes(keys, timeout=2)
+        assert all(r.ok for r in results.values()) and len(results) == 3
+        assert results[keys[0]['url']] is results[keys[1]['url']]  # Одна проверка на цель
+        assert results[keys[2]['url']].handshake_ms is None
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    test_latency_stats()
+    test_measure_latency()
+    test_measure_latency_skips_warmup()
+    test_port_failure_ping_diagnosis()
+    test_handshake()
+    print("✓ Все тесты пройдены")
@@ -0,0 +1,68 @@
+"""
+Тестовый скрипт для проверки кэша DNS и подключения happy eyeballs
+"""
+import socket
+import time
+
+from endpoint_resolver import EndpointResolver
+
+
+def _listen(family: int, address: str) -> socket.socket:
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.bind((address, 0))
+    sock.listen(16)
+    return sock
+
+
+def test_cache():
+    EndpointResolver.clear_cache()
+    assert EndpointResolver.lookup('127.0.0.1') == [(socket.AF_INET, '127.0.0.1')]
+    assert EndpointResolver.lookup('[::1]') == [(socket.AF_INET6, '::1')]
+
+    # Отрицательный результат кэшируется на NEGATIVE_TTL
+    assert EndpointResolver.lookup('nonexistent.invalid') is None
+    expires, addresses = EndpointResolver._cache['nonexistent.invalid']
+    assert addresses is None
+    assert expires - time.monotonic() <= EndpointResolver.NEGATIVE_TTL
+
+    # Пока запись не устарела, DNS не запрашивается
+    EndpointResolver._cache['cached.test'] = (time.monotonic() + 60, [(socket.AF_INET, '127.0.0.9')])
+    assert EndpointResolver.resolve('cached.test', 443) == ('127.0.0.9', 443)
+    EndpointResolver.clear_cache()
+
+
+def test_interleave():
+    v4 = [(socket.AF_INET, f'10.0.0.{i}') for i in range(3)]
+    v6 = [(socket.AF_INET6, f'2001:db8::{i}') for i in range(2)]
+    result = EndpointResolver._interleave(v6 + v4)
+    assert [a[0] for a in result] == [socket.AF_INET6, socket.AF_INET] * 2 + [socket.AF_INET]
+
+
+def test_happy_eyeballs():
+    server = _listen(socket.AF_INET6, '::1')
+    port = server.getsockname()[1]  # На 127.0.0.1 этот порт не слушается
+    try:
+        # IPv4 адрес отказывает - подключение сразу переходит к IPv6
+        EndpointResolver._cache['dual.test'] = (
+            time.monotonic() + 60, [(socket.AF_INET, '127.0.0.1'), (socket.AF_INET6, '::1')])
+        start = time.perf_counter()
+        sock = EndpointResolver.connect('dual.test', port, timeout=2)
+        assert sock.getpeername()[0] == '::1'
+        assert time.perf_counter() - start < EndpointResolver.HAPPY_EYEBALLS_DELAY
+        sock.close()
+    finally:
+        server.close()
+        EndpointResolver.clear_cache()
+
+    try:
+        EndpointResolver.connect('127.0.0.1', port, timeout=2)
+        assert False, "Ожидался отказ в подключении"
+    except ConnectionRefusedError:
+        pass
+
+
+if __name__ == '__main__':
+    test_cache()
+    test_interleave()
+    test_happy_eyeballs()
+    print("✓ Все тесты пройдены")
@@ -0,0 +1,109 @@
+"""
+Тестовый скрипт для проверки HTTP транспорта на локальном http.server
+"""
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_transport import HttpTransport, HTTPTransportError
+
+BODY = "\n".join(
+    f"vless://uuid@server{i}.com:443?security=tls&sni=server{i}.com#Сервер-{i}"
+    for i in range(2000)
+).encode('utf-8')
+ETAG = '"v1"'
+LAST_MODIFIED = 'Wed, 01 Jan 2025 00:00:00 GMT'
+
+
+class SubscriptionHandler(BaseHTTPRequestHandler):
+    """Имитация сервера подписок: gzip, ETag, Last-Modified, keep-alive"""
+
+    protocol_version = 'HTTP/1.1'
+    connections = set()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        SubscriptionHandler.connections.add(self.client_address)
+
+        if self.path == '/missing':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if self.path == '/old':
+            self.send_response(302)
+            self.send_header('Location', '/keys.txt')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if (self.headers.get('If-None-Match') == ETAG or
+                self.headers.get('If-Modified-Since') == LAST_MODIFIED):
+            self.send_response(304)
+            self.send_header('ETag', ETAG)
+            self.end_headers()
+            return
+
+        body = BODY
+        self.send_response(200)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(BODY)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('ETag', ETAG)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def run_with_server(test):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SubscriptionHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    SubscriptionHandler.connections = set()
+    try:
+        test(f"http://127.0.0.1:{server.server_address[1]}")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_gzip_conditional_and_keepalive():
+    def test(base_url):
+        transport = HttpTransport(timeout=5)
+
+        with transport.fetch(base_url + '/keys.txt') as response:
+            assert response.status == 200
+            assert response.read() == BODY
+        assert response.etag == ETAG
+        assert response.stats['bytes'] < len(BODY)  # Передано сжатым
+        assert response.stats['decoded_bytes'] == len(BODY)
+        assert response.stats['elapsed_ms'] is not None
+
+        with transport.fetch(base_url + '/keys.txt', etag=ETAG) as response:
+            assert response.not_modified
+        with transport.fetch(base_url + '/keys.txt', last_modified=LAST_MODIFIED) as response:
+            assert response.not_modified
+        with transport.fetch(base_url + '/old') as response:
+            assert response.read() == BODY
+
+        # Все запросы прошли по одному keep-alive соединению
+        assert len(SubscriptionHandler.connections) == 1
+        assert [stats['reused'] for stats in transport.history] == [False, True, True, True, True]
+
+        try:
+            transport.fetch(base_url + '/missing')
+            assert False, "Ожидалась ошибка 404"
+        except HTTPTransportError as e:
+            assert e.status == 404
+        transport.close()
+
+    run_with_server(test)
+
+
+if __name__ == '__main__':
+    test_gzip_conditional_and_keepalive()
+    print("✓ Все тесты HTTP транспорта пройдены")
@@ -0,0 +1,51 @@
+"""
+Тестовый скрипт для проверки ICMP ping без привилегий
+"""
+import socket
+
+from icmp_pinger import IcmpPinger
+
+
+def test_packet():
+    packet = IcmpPinger._packet(socket.AF_INET, 7)
+    assert packet[0] == 8 and IcmpPinger._checksum(packet) == 0
+
+    reply = bytes([0, 0, 0, 0, 0, 0, 0, 7]) + IcmpPinger.PAYLOAD
+    assert IcmpPinger._parse_reply(socket.AF_INET, reply) == 7
+    # Ответ с IP заголовком (macOS)
+    ip_header = bytes([0x45]) + bytes(19)
+    assert IcmpPinger._parse_reply(socket.AF_INET, ip_header + reply) == 7
+    assert IcmpPinger._parse_reply(socket.AF_INET, packet) is None
+
+
+def test_ping_many():
+    stats = IcmpPinger.ping_many(['127.0.0.1', 'nonexistent.invalid'], count=3, timeout=1, interval=0.05)
+    if not IcmpPinger.available():
+        assert stats is None  # ping_group_range запрещает ICMP сокеты
+        return
+    assert stats['127.0.0.1'].received == 3 and stats['127.0.0.1'].loss == 0
+    assert not stats['nonexistent.invalid'].ok
+
+
+def test_available_per_family():
+    saved = IcmpPinger._available
+    try:
+        IcmpPinger._available = {socket.AF_INET: False, socket.AF_INET6: False}
+        assert not IcmpPinger.available()
+        assert IcmpPinger.ping_many(['127.0.0.1']) is None
+
+        # Разрешен только IPv6: IPv4 хосты проверить нельзя - их нет в результате
+        IcmpPinger._available = {socket.AF_INET: False, socket.AF_INET6: True}
+        assert IcmpPinger.available() and not IcmpPinger.available(socket.AF_INET)
+        stats = IcmpPinger.ping_many(['127.0.0.1', 'nonexistent.invalid'], count=2, timeout=0.2)
+        assert set(stats) == {'nonexistent.invalid'} and not stats['nonexistent.invalid'].ok
+    finally:
+        IcmpPinger._available = saved
+
+
+if __name__ == '__main__':
+    test_packet()
+    test_ping_many()
+    test_available_per_family()
+    print("✓ Все тесты пройдены" if IcmpPinger.available()
+          else "✓ Тесты пройдены (ICMP сокеты недоступны)")
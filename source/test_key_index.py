@@ -0,0 +1,85 @@
+"""
+Тестовый скрипт для проверки отпечатков ключей и индекса повторов
+"""
+from key_index import KeyIndex
+
+BASE = "vless://UUID-1@Example.com:443?type=ws&security=tls&sni=Example.com&path=%2Fws#Main"
+REORDERED = "vless://uuid-1@example.com:443?sni=example.com&path=%2Fws&security=TLS&type=ws#Copy"
+OTHER_PATH = "vless://uuid-1@example.com:443?type=ws&security=tls&sni=example.com&path=%2Fother#Other"
+OTHER_PORT = "vless://uuid-1@example.com:8443?type=ws&security=tls&sni=example.com&path=%2Fws#Port"
+
+
+def key(url: str, name: str = None):
+    return {'name': name or url.rsplit('#', 1)[1], 'url': url}
+
+
+def test_fingerprint():
+    fp = KeyIndex.fingerprint(BASE)
+    # Порядок параметров, регистр и имя (#remark) не влияют на отпечаток
+    assert KeyIndex.fingerprint(REORDERED) == fp
+    assert KeyIndex.fingerprint(BASE.replace('#Main', '#Renamed')) == fp
+    assert KeyIndex.fingerprint(BASE.replace('#', '&fp=chrome#')) == fp  # Косметический параметр
+    # Параметры сервера - влияют
+    assert KeyIndex.fingerprint(OTHER_PATH) != fp
+    assert KeyIndex.fingerprint(OTHER_PORT) != fp
+    # Значения по умолчанию равны отсутствующим параметрам
+    assert KeyIndex.fingerprint("vless://u@h.com:443#a") == \
+        KeyIndex.fingerprint("vless://u@h.com:443?type=tcp&security=none#b")
+    # Неразбираемый URL сравнивается без имени
+    assert KeyIndex.fingerprint("broken#a") == KeyIndex.fingerprint("broken#b")
+
+
+def test_aliases():
+    index = KeyIndex()
+    assert index.add(key(BASE))
+    assert not index.add(key(REORDERED))
+    assert not index.add(key(BASE, 'Main'))  # Повтор имени не дублируется
+    assert index.add(key(OTHER_PATH))
+    assert len(index) == 2 and index.has_url(REORDERED)
+
+    fp = KeyIndex.fingerprint(BASE)
+    assert fp in index and index.get(fp)['url'] == BASE
+    assert index.names(fp) == ['Main', 'Copy']
+    assert index.keys() == [{'name': 'Main', 'url': BASE, 'aliases': ['Copy']}, key(OTHER_PATH)]
+
+    # Имена ключа с aliases (из кэша) сохраняются при повторной индексации
+    assert KeyIndex.unique(index.keys() + [key(BASE, 'Third')])[0]['aliases'] == ['Copy', 'Third']
+    assert list(index.fingerprints()) == [fp, KeyIndex.fingerprint(OTHER_PATH)]
+
+
+def test_diff():
+    old = KeyIndex([key(BASE), key(OTHER_PATH)])
+    new = KeyIndex([key(REORDERED), key(OTHER_PORT)], previous=old)
+    diff = new.diff(old)
+    assert [k['url'] for k in diff.added] == [OTHER_PORT]
+    assert [k['url'] for k in diff.removed] == [OTHER_PATH]
+    assert [k['url'] for k in diff.unchanged] == [REORDERED]
+    assert diff.changed and diff.keys == new.keys()
+
+    same = KeyIndex([key(BASE), key(OTHER_PATH)], previous=old).diff(old)
+    assert not same.changed and len(same.unchanged) == 2
+
+    first = KeyIndex([key(BASE)]).diff(None)
+    assert first.changed and len(first.added) == 1 and not first.removed
+
+
+def test_previous_fingerprints_reused():
+    old = KeyIndex([key(BASE), key(OTHER_PATH)])
+    calls = []
+    fingerprint = KeyIndex.fingerprint
+    KeyIndex.fingerprint = staticmethod(lambda url: calls.append(url) or fingerprint(url))
+    try:
+        new = KeyIndex([key(BASE), key(OTHER_PATH), key(OTHER_PORT)], previous=old)
+    finally:
+        KeyIndex.fingerprint = fingerprint
+    # Разбирается только новый URL
+    assert calls == [OTHER_PORT]
+    assert len(new) == 3
+
+
+if __name__ == '__main__':
+    test_fingerprint()
+    test_aliases()
+    test_diff()
+    test_previous_fingerprints_reused()
+    print("✓ Все тесты пройдены")
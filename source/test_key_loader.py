@@ -0,0 +1,197 @@
+"""
+Тестовый скрипт для проверки загрузчика ключей на локальном http.server
+"""
+import os
+import socket
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_transport import HttpTransport
+from key_loader import KeyLoader
+from key_store import KeyStore
+
+
+def body(*hosts: str) -> bytes:
+    return "\n".join(
+        f"vless://11111111-2222-3333-4444-555555555555@{host}:443?security=tls&sni={host}#{host}"
+        for host in hosts
+    ).encode('utf-8')
+
+
+def closed_port() -> int:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class SourceHandler(BaseHTTPRequestHandler):
+    """Имитация источников подписок: ETag на каждый путь, медленное зеркало"""
+
+    protocol_version = 'HTTP/1.1'
+    # Путь -> (ETag, тело)
+    sources = {}
+    requests = []  # (путь, ответ 304)
+    release = threading.Event()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/slow':
+            SourceHandler.release.wait(10)  # Зеркало, которое не отвечает в срок
+
+        etag, data = SourceHandler.sources.get(self.path, (None, None))
+        if data is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        not_modified = self.headers.get('If-None-Match') == etag
+        SourceHandler.requests.append((self.path, not_modified))
+        if not_modified:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def run_isolated(test):
+    """Запускает тест с локальным сервером, своим кэшем, базой и состоянием KeyLoader"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SourceHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    SourceHandler.sources = {}
+    SourceHandler.requests = []
+    SourceHandler.release = threading.Event()
+
+    names = ('CACHE_FILE', 'SOURCES_FILE', 'GITHUB_URL', 'SOURCE_TIMEOUT', '_transport',
+             '_keys', '_index', '_last_diff', '_listeners', '_refresh_thread')
+    saved = {name: getattr(KeyLoader, name) for name in names}
+    saved_db = KeyStore.DB_FILE
+    with tempfile.TemporaryDirectory() as tmp:
+        KeyLoader.CACHE_FILE = os.path.join(tmp, 'keys_cache.json')
+        KeyLoader.SOURCES_FILE = os.path.join(tmp, 'sources.txt')
+        KeyLoader._transport = HttpTransport(timeout=5)
+        KeyLoader._keys, KeyLoader._index, KeyLoader._last_diff = [], None, None
+        KeyLoader._listeners, KeyLoader._refresh_thread = [], None
+        KeyLoader.keys_updated.clear()
+        KeyStore.DB_FILE = os.path.join(tmp, 'keys.db')
+        try:
+            test(f"http://127.0.0.1:{server.server_address[1]}")
+        finally:
+            KeyLoader.wait_for_refresh(5)
+            KeyLoader._transport.close()
+            for name, value in saved.items():
+                setattr(KeyLoader, name, value)
+            KeyStore.DB_FILE = saved_db
+            KeyLoader.keys_updated.clear()
+            SourceHandler.release.set()
+            server.shutdown()
+            server.server_close()
+
+
+def test_cache_hit_and_background_refresh():
+    def test(base_url):
+        KeyLoader.GITHUB_URL = base_url + '/github.txt'
+        SourceHandler.sources['/github.txt'] = ('"v1"', body('a.com', 'b.com'))
+        first = KeyLoader.load_keys_from_github(force_refresh=True)
+        assert [k['name'] for k in first] == ['a.com', 'b.com']
+
+        # Подписка изменилась: кэш отдается сразу, обновление приходит из фона
+        SourceHandler.sources['/github.txt'] = ('"v2"', body('b.com', 'c.com'))
+        diffs = []
+        KeyLoader.add_update_listener(diffs.append)
+        SourceHandler.requests = []
+        started = time.monotonic()
+        assert KeyLoader.load_keys_from_github() == first
+        assert time.monotonic() - started < 1
+        assert KeyLoader.wait_for_refresh(5)
+
+        assert SourceHandler.requests == [('/github.txt', False)]
+        assert len(diffs) == 1 and KeyLoader.keys_updated.is_set()
+        diff = diffs[0]
+        assert [k['name'] for k in diff.added] == ['c.com']
+        assert [k['name'] for k in diff.removed] == ['a.com']
+        assert [k['name'] for k in diff.unchanged] == ['b.com']
+        assert KeyLoader.get_keys() == diff.keys and KeyLoader.get_last_diff() is diff
+
+        # Фоновая проверка без изменений (304) подписчиков не вызывает
+        KeyLoader._check_updates_async()
+        assert KeyLoader.wait_for_refresh(5)
+        assert SourceHandler.requests[-1] == ('/github.txt', True) and len(diffs) == 1
+        KeyLoader.remove_update_listener(diffs.append)
+
+    run_isolated(test)
+
+
+def test_sources_timeout_and_dedupe():
+    def test(base_url):
+        SourceHandler.sources['/a.txt'] = ('"a"', body('a.com', 'shared.com'))
+        SourceHandler.sources['/b.txt'] = ('"b"', body('shared.com', 'b.com'))
+        SourceHandler.sources['/slow'] = ('"s"', body('fresh.com'))
+        dead = f"http://127.0.0.1:{closed_port()}/dead"
+        with open(KeyLoader.SOURCES_FILE, 'w', encoding='utf-8') as f:
+            f.write(f"# Источники\n{base_url}/a.txt\n{base_url}/b.txt\n{base_url}/a.txt\n"
+                    f"{dead}\n{base_url}/slow\n")
+
+        sources = KeyLoader.get_sources()
+        assert sources == [f"{base_url}/a.txt", f"{base_url}/b.txt", dead, f"{base_url}/slow"]
+
+        # У медленного зеркала есть ключи в кэше - они и используются
+        cached = [{'name': 'cached.com', 'url': body('cached.com').decode()}]
+        KeyLoader._save_sources_cache({f"{base_url}/slow": {
+            'timestamp': time.time(), 'etag': '"old"', 'keys': cached
+        }})
+        KeyLoader.SOURCE_TIMEOUT = 0.5
+        started = time.monotonic()
+        keys = KeyLoader.load_keys_from_sources()
+        # Общий срок - SOURCE_TIMEOUT + 2, зависшее зеркало его не продлевает
+        assert time.monotonic() - started < KeyLoader.SOURCE_TIMEOUT + 3
+        assert [k['name'] for k in keys] == ['a.com', 'shared.com', 'b.com', 'cached.com']
+        assert sum(1 for path, _ in SourceHandler.requests if path == '/a.txt') == 1
+
+    run_isolated(test)
+
+
+def test_source_etag():
+    def test(base_url):
+        SourceHandler.sources['/a.txt'] = ('"a1"', body('a.com'))
+        SourceHandler.sources['/b.txt'] = ('"b1"', body('b.com'))
+        sources = [base_url + '/a.txt', base_url + '/b.txt']
+        assert len(KeyLoader.load_keys_from_sources(sources)) == 2
+
+        # Изменился только один источник: второй отвечает 304 по своему ETag
+        SourceHandler.sources['/b.txt'] = ('"b2"', body('b.com', 'c.com'))
+        SourceHandler.requests = []
+        keys = KeyLoader.load_keys_from_sources(sources)
+        assert [k['name'] for k in keys] == ['a.com', 'b.com', 'c.com']
+        assert sorted(SourceHandler.requests) == [('/a.txt', True), ('/b.txt', False)]
+
+        entries = KeyLoader._read_cache_file()['sources']
+        assert entries[sources[0]]['etag'] == '"a1"' and entries[sources[1]]['etag'] == '"b2"'
+
+        # Принудительное обновление не отправляет ETag
+        SourceHandler.requests = []
+        KeyLoader.load_keys_from_sources(sources, force_refresh=True)
+        assert sorted(SourceHandler.requests) == [('/a.txt', False), ('/b.txt', False)]
+
+    run_isolated(test)
+
+
+if __name__ == '__main__':
+    test_cache_hit_and_background_refresh()
+    test_sources_timeout_and_dedupe()
+    test_source_etag()
+    print("✓ Все тесты пройдены")
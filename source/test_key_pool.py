@@ -0,0 +1,87 @@
+"""
+Тестовый скрипт для проверки колоночного пула ключей
+"""
+from key_pool import KeyPool
+
+UUID = "11111111-2222-3333-4444-555555555555"
+PBK = "SbVKOEMjK0sIlbwg4akyBg5mL5KZwwB-ed4eEE7YnRc"
+
+
+def key(name: str, host: str, port: int = 443, query: str = "security=tls&sni=example.com"):
+    return {'name': name, 'url': f"vless://{UUID}@{host}:{port}?{query}#{name}"}
+
+
+KEYS = [
+    key('tls', 'a.com'),
+    key('reality', 'b.com', query=f"security=reality&sni=b.com&pbk={PBK}&sid=ab&type=grpc&serviceName=s"),
+    key('ws', 'c.com', 8443, query="security=tls&sni=c.com&type=ws&path=%2F"),
+    key('plain', 'd.com', 80, query="security=none"),
+    {'name': 'broken', 'url': "vless://not-a-key"},
+]
+
+
+def test_flags():
+    pool = KeyPool.from_keys(KEYS + KEYS[:1])
+    assert len(pool) == 5  # Повтор URL не добавляется
+    assert pool.add(KEYS[0]['url']) == 0 and pool.index_of(KEYS[3]['url']) == 3
+    assert pool.index_of("vless://unknown") is None
+
+    assert pool.flags[0] == KeyPool.FLAG_TLS | KeyPool.FLAG_TCP
+    assert pool.flags[1] == KeyPool.FLAG_REALITY | KeyPool.FLAG_GRPC
+    assert pool.flags[2] == KeyPool.FLAG_TLS | KeyPool.FLAG_WS
+    assert pool.flags[4] == KeyPool.FLAG_INVALID and pool.port[4] == 0
+    assert list(pool.filter(flags_all=KeyPool.FLAG_TLS)) == [0, 2]
+    assert list(pool.filter(flags_none=KeyPool.FLAG_INVALID, port=443)) == [0, 1]
+
+    item = pool.key(2)
+    assert item['name'] == 'ws' and item['host'] == 'c.com' and item['port'] == 8443
+    assert item['latency'] == KeyPool.UNKNOWN and item['last_seen'] == 0.0
+    assert pool.keys([3, 0]) == [KEYS[3], KEYS[0]]
+    assert list(pool.urls([1])) == [KEYS[1]['url']]
+
+
+def test_probe_results():
+    pool = KeyPool.from_keys(KEYS)
+    pool.update_probe(0, 40.0, timestamp=100.0)
+    pool.update_probe(1, 12.5, loss=0.25, timestamp=200.0)
+    pool.update_probe(2, None, timestamp=300.0)
+    assert pool.flags[2] & KeyPool.FLAG_DEAD and pool.loss[2] == 1.0 and pool.last_seen[2] == 0.0
+
+    alive = pool.filter(flags_none=KeyPool.FLAG_INVALID | KeyPool.FLAG_DEAD)
+    assert list(alive) == [0, 1, 3]
+    assert list(pool.filter(max_latency=20.0)) == [1]
+    assert list(pool.filter(max_loss=0.1)) == [0]
+    assert list(pool.filter(seen_since=150.0)) == [1]
+    assert list(pool.filter(flags_all=KeyPool.FLAG_TLS, indices=alive)) == [0]
+
+    # Сервер снова ответил - флаг снимается
+    pool.update_probe(2, 30.0, timestamp=400.0)
+    assert not pool.flags[2] & KeyPool.FLAG_DEAD and pool.last_seen[2] == 400.0
+
+
+def test_sort_and_top_k():
+    pool = KeyPool.from_keys(KEYS)
+    for idx, latency in ((0, 40.0), (1, 12.5), (2, 30.0)):
+        pool.update_probe(idx, latency)
+
+    # Неизмеренные значения - в конце, равные сохраняют порядок добавления
+    assert list(pool.sort('latency')) == [1, 2, 0, 3, 4]
+    assert list(pool.sort('latency', indices=[0, 2, 3])) == [2, 0, 3]
+    assert list(pool.sort('port', reverse=True))[:2] == [2, 0]
+    # По убыванию неизмеренные значения тоже в конце
+    assert list(pool.sort('latency', reverse=True)) == [0, 2, 1, 3, 4]
+    assert list(pool.sort('loss', reverse=True, indices=[3, 1, 0])) == [1, 0, 3]
+    assert list(pool.top_k(2)) == [1, 2]
+    assert list(pool.top_k(10, indices=[4, 0])) == [0, 4]
+    try:
+        pool.sort('name')
+        assert False, "ожидалась ошибка"
+    except ValueError:
+        pass
+
+
+if __name__ == '__main__':
+    test_flags()
+    test_probe_results()
+    test_sort_and_top_k()
+    print("✓ Все тесты пройдены")
@@ -0,0 +1,102 @@
+"""
+Тестовый скрипт для проверки индексированного хранилища ключей
+"""
+import os
+import sqlite3
+import tempfile
+import time
+
+from key_store import KeyStore
+
+REALITY = "vless://uuid@a.com:443?security=reality&sni=a.com&pbk=key&type=tcp#A"
+TLS_WS = "vless://uuid@b.com:443?security=tls&sni=b.com&type=ws#B"
+PLAIN = "vless://uuid@c.com:8080?security=none#C"
+
+
+def key(url: str, name: str = None):
+    return {'name': name or url.rsplit('#', 1)[1], 'url': url}
+
+
+def test_upsert_and_rename():
+    with tempfile.TemporaryDirectory() as tmp, KeyStore(os.path.join(tmp, 'keys.db')) as store:
+        assert store.sync([key(REALITY), key(TLS_WS), key(REALITY)], 'src') == (2, 0, 0)
+        updated = store.query(host='a.com')[0]['updated']
+
+        # Повторная синхронизация без изменений ничего не пишет
+        assert store.sync([key(REALITY), key(TLS_WS)], 'src') == (0, 0, 0)
+        assert store.query(host='a.com')[0]['updated'] == updated
+
+        assert store.sync([key(REALITY, 'A2'), key(TLS_WS)], 'src') == (0, 1, 0)
+        assert store.query(host='a.com')[0]['name'] == 'A2'
+
+        # Пропавший из источника ключ удаляется вместе с его историей
+        store.record_result(TLS_WS, False)
+        assert store.sync([key(REALITY, 'A2')], 'src') == (0, 0, 1)
+        assert store.count() == 1 and store.query(host='b.com') == []
+
+
+def test_cross_source_sync():
+    with tempfile.TemporaryDirectory() as tmp, KeyStore(os.path.join(tmp, 'keys.db')) as store:
+        store.sync([key(REALITY), key(TLS_WS)], 'first')
+        assert store.sync([key(REALITY, 'Other name'), key(PLAIN)], 'second') == (1, 0, 0)
+        assert store.count('first') == 2 and store.count('second') == 2 and store.count() == 3
+        # Имя задает источник, за которым закреплен ключ
+        assert store.query(host='a.com')[0]['name'] == 'A'
+
+        # Ключ, оставшийся в другом источнике, не удаляется и не теряет историю
+        store.record_result(REALITY, False, timestamp=123.0)
+        assert store.sync([], 'first') == (0, 0, 1)
+        rows = store.query(host='a.com')
+        assert len(rows) == 1 and rows[0]['last_fail'] == 123.0 and rows[0]['source'] == 'second'
+        assert [row['url'] for row in store.query(source='second')] == [REALITY, PLAIN]
+        assert store.query(source='first') == [] and store.count() == 2
+
+        assert store.sync([], 'second') == (0, 0, 2)
+        assert store.count() == 0
+
+
+def test_query():
+    with tempfile.TemporaryDirectory() as tmp, KeyStore(os.path.join(tmp, 'keys.db')) as store:
+        store.sync([key(REALITY), key(TLS_WS), key(PLAIN)], 'src')
+        assert [r['url'] for r in store.query(security='reality', port=443)] == [REALITY]
+        assert [r['url'] for r in store.query(transport='ws')] == [TLS_WS]
+        assert [r['url'] for r in store.query(port=443)] == [REALITY, TLS_WS]
+        assert len(store.query(limit=2)) == 2
+
+        now = time.time()
+        store.record_result(REALITY, False, timestamp=now - 60)
+        store.record_result(TLS_WS, False, timestamp=now - 7200)
+        store.record_result(PLAIN, True, timestamp=now)
+        assert [r['url'] for r in store.query(not_failed_within=3600)] == [TLS_WS, PLAIN]
+        assert [r['url'] for r in store.query(port=443, not_failed_within=3600)] == [TLS_WS]
+        assert store.query(host='a.com')[0]['last_ok'] is None
+
+        # Пакетная запись результатов; неизвестные URL пропускаются
+        store.record_results([(REALITY, True), (TLS_WS, False), ("vless://unknown", False)], timestamp=now)
+        rows = {r['url']: r for r in store.query()}
+        assert rows[REALITY]['last_ok'] == now and rows[TLS_WS]['last_fail'] == now
+        assert store.existing([REALITY, "vless://unknown"]) == {REALITY}
+
+
+def test_migration():
+    """База прежней версии без таблицы источников"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'keys.db')
+        with KeyStore(path) as store:
+            store.sync([key(REALITY)], 'src')
+        conn = sqlite3.connect(path)
+        conn.execute('DROP TABLE key_sources')
+        conn.commit()
+        conn.close()
+
+        with KeyStore(path) as store:
+            assert store.count('src') == 1
+            assert store.sync([], 'src') == (0, 0, 1)
+
+
+if __name__ == '__main__':
+    test_upsert_and_rename()
+    test_cross_source_sync()
+    test_query()
+    test_migration()
+    print("✓ Все тесты пройдены")
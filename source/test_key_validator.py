@@ -0,0 +1,67 @@
+"""
+Тестовый скрипт для проверки структурной валидации ключей
+"""
+from key_validator import KeyValidator
+
+UUID = "5f1c3a52-8d2e-4c8b-9a1f-3b7e2d9c4a10"
+PBK = "mChFHtaRmeuO2aDuDPqZvBFaCz6f34sVJIKuJcAR130"
+
+VALID = [
+    f"vless://{UUID}@example.com:443?security=tls&sni=example.com#TLS",
+    f"vless://{UUID}@server.com:443?type=ws&path=/ws&security=tls&sni=server.com",
+    f"vless://{UUID}@[2001:db8::1]:8443?type=grpc&serviceName=grpc&security=tls&sni=cdn.example.org",
+    f"vless://{UUID}@185.22.153.7:443?type=tcp&security=reality&sni=www.microsoft.com"
+    f"&pbk={PBK}&sid=6ba85179e30d4fc2&flow=xtls-rprx-vision&fp=chrome",
+    "vless://uuid@server.com:80",  # Короткий произвольный id допускается Xray
+]
+
+INVALID = {
+    f"vless://{UUID}@1.2.3.4:443?security=reality&sni=example.com&sid=ab": "pbk",
+    f"vless://{UUID}@1.2.3.4:443?security=reality&sni=example.com&pbk={PBK}": "sid",
+    f"vless://{UUID}@1.2.3.4:443?security=reality&pbk={PBK}&sid=ab": "sni",
+    f"vless://{UUID}@example.com:443?security=reality&sni=a.com&pbk={PBK}&sid=xyz": "sid",
+    f"vless://{UUID}@example.com:443?security=reality&type=ws&sni=a.com&pbk={PBK}&sid=ab": "транспорт",
+    f"vless://{UUID}@example.com:0?security=tls": "порт",
+    f"vless://{UUID}@example.com:70000": "порт",
+    "vless://not-a-uuid-but-definitely-longer-than-thirty@example.com:443": "UUID",
+    f"vless://{UUID}@exa mple.com:443": "адрес",
+    f"vless://{UUID}@[::zz]:443": "IPv6",
+    f"vless://{UUID}@example.com:443?security=tls&sni=1.2.3.4": "SNI",
+    f"vless://{UUID}@example.com:443?security=tls&sni=bad_sni..com": "SNI",
+    f"vless://{UUID}@example.com:443?security=xtls": "security",
+    f"vless://{UUID}@example.com:443?type=carrier-pigeon": "транспорт",
+    f"vless://{UUID}@example.com:443?flow=xtls-rprx-vision": "flow",
+    f"vless://{UUID}@example.com:443?encryption=aes-128-gcm": "encryption",
+    f"vless://{UUID}@example.com:443?type=ws&path=ws": "WebSocket",
+    f"vless://{UUID}@example.com": "разбора",
+}
+
+
+def test_valid():
+    for url in VALID:
+        assert KeyValidator.validate(url) == [], (url, KeyValidator.validate(url))
+
+
+def test_invalid():
+    for url, expected in INVALID.items():
+        problems = KeyValidator.validate(url)
+        assert any(expected in problem for problem in problems), (url, problems)
+
+
+def test_iter_valid():
+    keys = [{'name': str(i), 'url': url} for i, url in enumerate(VALID + list(INVALID))]
+    rejected = []
+    valid = list(KeyValidator.iter_valid(keys, rejected))
+    assert [key['url'] for key in valid] == VALID
+    assert len(rejected) == len(INVALID)
+
+    # Уже проверенные URL пропускаются без проверки
+    known = {key['url'] for key in keys}
+    assert len(list(KeyValidator.iter_valid(keys, known=known.__contains__))) == len(keys)
+
+
+if __name__ == '__main__':
+    test_valid()
+    test_invalid()
+    test_iter_valid()
+    print("✓ Все тесты пройдены")
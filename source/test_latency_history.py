@@ -0,0 +1,96 @@
+"""
+Тестовый скрипт для проверки истории задержки серверов
+"""
+import os
+import tempfile
+
+from latency_history import LatencyHistory
+
+
+def test_record_and_stats():
+    history = LatencyHistory(window=4, alpha=0.5)
+    server = LatencyHistory.server_id('[2001:DB8::1]', 443)
+    assert server == '2001:db8::1:443'
+
+    for latency in (100.0, None, 50.0, 70.0, 30.0):
+        history.record(server, latency, timestamp=1.0)
+
+    # Окно из 4 замеров: первый (100) вытеснен
+    assert history.window_samples(server) == [None, 50.0, 70.0, 30.0]
+    stats = history.stats(server)
+    assert stats['success_rate'] == 0.75
+    assert stats['p50'] == 50.0 and stats['p95'] == 70.0
+    assert stats['ewma'] == 0.5 * 30 + 0.5 * (0.5 * 70 + 0.5 * (0.5 * 50 + 0.5 * 100))
+    assert stats['probes'] == 5 and stats['successes'] == 4
+
+    assert history.stats('unknown:1') is None
+
+
+def test_eviction():
+    history = LatencyHistory(window=2, max_servers=2)
+    history.record('a:1', 10.0, timestamp=1.0)
+    history.record('b:1', 20.0, timestamp=3.0)
+    history.record('c:1', 30.0, timestamp=5.0)  # Вытесняет самый давний 'a'
+    assert len(history) == 2 and 'a:1' not in history
+    assert history.window_samples('c:1') == [30.0]
+    assert len(history.samples) == 4
+
+    # Сервер, проверенный после отбора кандидатов, не вытесняется
+    history = LatencyHistory(window=2, max_servers=3)
+    for i, server in enumerate(('a:1', 'b:1', 'c:1', 'd:1')):
+        history.record(server, 10.0, timestamp=i)
+    assert 'a:1' not in history
+    history.record('b:1', 10.0, timestamp=10.0)
+    history.record('e:1', 10.0, timestamp=11.0)
+    assert 'b:1' in history and 'c:1' not in history and len(history) == 3
+
+
+def test_save_load():
+    history = LatencyHistory(window=3)
+    for i in range(100):
+        history.record(f"10.0.0.{i}:443", float(i) if i % 3 else None, timestamp=i)
+
+    path = os.path.join(tempfile.mkdtemp(), 'history.bin')
+    history.save(path)
+    loaded = LatencyHistory.load(path)
+    assert len(loaded) == 100 and loaded.window == 3
+    for server in ('10.0.0.0:443', '10.0.0.5:443', '10.0.0.99:443'):
+        assert loaded.stats(server) == history.stats(server)
+
+    # Поврежденный файл - пустая история
+    with open(path, 'wb') as f:
+        f.write(b'garbage')
+    assert len(LatencyHistory.load(path)) == 0
+    os.unlink(path)
+
+
+def test_concurrent_saves():
+    """Два процесса с общей историей: сохранения не затирают замеры друг друга"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'history.bin')
+        base = LatencyHistory(window=4)
+        base.record('shared:443', 10.0, timestamp=1.0)
+        base.save(path)
+
+        menu = LatencyHistory.load(path)
+        scheduler = LatencyHistory.load(path)
+        menu.record('menu:443', 20.0, timestamp=2.0)
+        scheduler.record('shared:443', 30.0, timestamp=3.0)
+        scheduler.record('scheduler:443', 40.0, timestamp=3.0)
+        scheduler.save(path)
+        menu.save(path)
+
+        merged = LatencyHistory.load(path)
+        assert {'shared:443', 'menu:443', 'scheduler:443'} == set(merged._ids)
+        assert merged.window_samples('shared:443') == [10.0, 30.0]
+        # После сохранения в памяти - то же, что в файле
+        assert menu.window_samples('scheduler:443') == [40.0]
+        assert not [name for name in os.listdir(tmp) if name.endswith('.tmp')]
+
+
+if __name__ == '__main__':
+    test_record_and_stats()
+    test_eviction()
+    test_save_load()
+    test_concurrent_saves()
+    print("✓ Все тесты пройдены")
@@ -1,40 +1,260 @@
-"""
-Тестовый скрипт для проверки парсера VLESS URL
-"""
-from vless_parser import VLESSURLParser
-import json
-
-# Примеры VLESS URL для тестирования
-test_urls = [
-    "vless://uuid@example.com:443?security=tls&sni=example.com#TestServer",
-    "vless://uuid@server.com:443?type=ws&path=/path&security=tls&sni=server.com#WS-Server",
-    "vless://uuid@server.com:443?type=grpc&serviceName=service&security=tls&sni=server.com#gRPC",
-    "vless://uuid@server.com:443?type=tcp&security=reality&sni=example.com&pbk=publicKey&sid=shortId#Reality"
-]
-
-def test_parser():
-    parser = VLESSURLParser()
-    
-    print("=" * 60)
-    print("Тест парсера VLESS URL")
-    print("=" * 60)
-    
-    for i, url in enumerate(test_urls, 1):
-        print(f"\nТест {i}:")
-        print(f"URL: {url}")
-        try:
-            result = parser.parse(url)
-            print("✓ Парсинг успешен:")
-            print(json.dumps(result, indent=2, ensure_ascii=False))
-        except Exception as e:
-            print(f"✗ Ошибка: {e}")
-    
-    print("\n" + "=" * 60)
-    print("Тестирование завершено")
-    print("=" * 60)
-
-if __name__ == '__main__':
-    test_parser()
-
-
-
+"""
+Тесты и бенчмарк парсера VLESS URL
+
+Запуск тестов: python -m pytest test_parser.py
+Бенчмарк:      python test_parser.py [--count 300000] [--seed 1]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+import urllib.parse
+
+from vless_parser import VLESSURLParser, VlessKey
+
+# Примеры VLESS URL для тестирования
+test_urls = [
+    "vless://uuid@example.com:443?security=tls&sni=example.com#TestServer",
+    "vless://uuid@server.com:443?type=ws&path=/path&security=tls&sni=server.com#WS-Server",
+    "vless://uuid@server.com:443?type=grpc&serviceName=service&security=tls&sni=server.com#gRPC",
+    "vless://uuid@server.com:443?type=tcp&security=reality&sni=example.com&pbk=publicKey&sid=shortId#Reality"
+]
+
+TEST_CORPUS_SIZE = 20000  # Размер корпуса для обычного прогона тестов
+BENCH_CORPUS_SIZE = 300000  # Размер корпуса для бенчмарка
+
+HOSTS = ['free-key.tunnely.ru', 'de1.example.com', 'srv-42.vpn.example.net',
+         '185.22.153.7', '[2001:db8::1]', '[2a01:4f8:c17:2d3::2]']
+REMARKS = ['key_v2_1050', 'Сервер 1', '🇩🇪 Germany', 'a#b', 'x y&z=1', '']
+PATHS = ['/', '/ws', '/path with space', '/a?b=c', '/ru/путь']
+
+
+def _random_uuid(rng: random.Random) -> str:
+    hex_digits = '%032x' % rng.getrandbits(128)
+    return '-'.join((hex_digits[:8], hex_digits[8:12], hex_digits[12:16],
+                     hex_digits[16:20], hex_digits[20:]))
+
+
+def _valid_case(rng: random.Random):
+    """Корректный URL и ожидаемые поля разбора"""
+    uuid = _random_uuid(rng)
+    host = rng.choice(HOSTS)
+    port = rng.choice([443, 8443, 80, 2053, rng.randint(1, 65535)])
+    stream_type = rng.choice(['tcp', 'ws', 'grpc', None])
+    security = rng.choice(['tls', 'reality', 'none', None])
+
+    params = []
+    if stream_type:
+        params.append(('type', stream_type))
+    if security:
+        params.append(('security', security))
+
+    sni = None
+    if security in ('tls', 'reality'):
+        sni = rng.choice(['example.com', 'www.microsoft.com', 'cdn.example.org'])
+        params.append(('sni', sni))
+    if security == 'reality':
+        params.append(('pbk', 'mChFHtaRmeuO2aDuDPqZvBFaCz6f34sVJIKuJcAR130'))
+        params.append(('sid', '%016x' % rng.getrandbits(64)))
+        params.append(('fp', rng.choice(['chrome', 'firefox', ''])))
+    if stream_type == 'ws':
+        params.append(('path', rng.choice(PATHS)))
+    if stream_type == 'grpc':
+        params.append(('serviceName', 'grpc-' + str(rng.randint(1, 99))))
+
+    # Повторяющийся параметр: побеждает последнее значение
+    if sni and rng.random() < 0.2:
+        params.insert(0, ('sni', 'stale.example.com'))
+
+    rng.shuffle(params)
+    if sni:
+        # Повтор sni должен остаться раньше актуального значения
+        params = [p for p in params if p != ('sni', sni)] + [('sni', sni)]
+
+    query = '&'.join(f"{k}={urllib.parse.quote(v, safe='/')}" for k, v in params)
+    remark = rng.choice(REMARKS)
+    encoded_remark = urllib.parse.quote(remark, safe='') if remark else None
+
+    url = f"vless://{uuid}@{host}:{port}"
+    if query:
+        url += '?' + query
+    if encoded_remark is not None:
+        url += '#' + encoded_remark
+
+    expected = {
+        'uuid': uuid,
+        'host': host,
+        'port': port,
+        'type': stream_type or 'tcp',
+        'security': security or 'none',
+        'remark': encoded_remark,  # Имя сохраняется как есть, без декодирования
+        'params': dict(params),
+    }
+    if sni:
+        expected['sni'] = sni
+    if stream_type == 'ws':
+        expected['path'] = dict(params)['path']
+    return url, expected
+
+
+def _malformed_case(rng: random.Random) -> str:
+    """Некорректный URL, разбор которого должен завершиться ValueError"""
+    uuid = _random_uuid(rng)
+    host = rng.choice(HOSTS)
+    return rng.choice([
+        f"vless://{uuid}@{host}?security=tls#no-port",  # Нет порта
+        f"vless://{uuid}@{host}:?security=tls",  # Пустой порт
+        f"vless://{uuid}@{host}:44x3",  # Нечисловой порт
+        f"vless://{host}:443?security=tls",  # Нет UUID
+        f"vmess://{uuid}@{host}:443",  # Чужая схема
+        f"VLESS://{uuid}@{host}:443",  # Схема в верхнем регистре
+        "",
+        "vless://",
+    ])
+
+
+def generate_corpus(count: int, seed: int = 1, malformed_ratio: float = 0.1):
+    """
+    Генерирует корпус URL
+
+    Returns:
+        Список пар (url, ожидаемые поля); для некорректных URL вместо полей - None
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        if rng.random() < malformed_ratio:
+            corpus.append((_malformed_case(rng), None))
+        else:
+            corpus.append(_valid_case(rng))
+    return corpus
+
+
+def check_result(url: str, expected, result) -> None:
+    """Сверяет результат разбора с ожидаемыми полями"""
+    for field, value in expected.items():
+        assert result[field] == value, f"{url}: {field}={result[field]!r}, ожидалось {value!r}"
+
+
+def test_examples():
+    expected_types = ['tcp', 'ws', 'grpc', 'tcp']
+    for url, stream_type in zip(test_urls, expected_types):
+        result = VLESSURLParser.parse(url)
+        assert result['uuid'] == 'uuid'
+        assert result['port'] == 443
+        assert result['type'] == stream_type
+    reality = VLESSURLParser.parse(test_urls[3])
+    assert reality['pbk'] == 'publicKey' and reality['sid'] == 'shortId'
+
+
+def test_corpus():
+    for url, expected in generate_corpus(TEST_CORPUS_SIZE):
+        if expected is None:
+            try:
+                VLESSURLParser.parse(url)
+            except ValueError:
+                continue
+            assert False, f"Ожидалась ошибка разбора: {url!r}"
+        check_result(url, expected, VLESSURLParser.parse(url))
+
+
+def test_vless_key():
+    corpus = generate_corpus(TEST_CORPUS_SIZE // 4, seed=2)
+    keys = []
+    for url, expected in corpus:
+        try:
+            key = VlessKey.from_url(url)
+        except ValueError:
+            assert expected is None, url
+            continue
+        assert expected is not None, f"Ожидалась ошибка разбора: {url!r}"
+        assert VlessKey.from_dict(key.to_dict()).to_dict() == key.to_dict(), url
+        keys.append(key)
+
+    # Одинаковые строки разных ключей хранятся один раз
+    by_host = {}
+    for key in keys:
+        assert by_host.setdefault(key.host, key.host) is key.host
+
+
+def _measure(label: str, func, urls, batch: int = 1000) -> None:
+    """
+    Печатает пропускную способность и выделения памяти во время разбора
+
+    Выделения считаются по пакетам из batch URL: пик - наибольший объем
+    памяти сверх исходного за время разбора пакета (вместе с временными
+    объектами), новые блоки и байты - разница снимков tracemalloc до и
+    после разбора пакета (compare_to, count_diff/size_diff).
+    """
+    start = time.perf_counter()
+    func(urls)
+    elapsed = time.perf_counter() - start
+
+    peak_total = blocks = size = 0
+    tracemalloc.start()
+    for offset in range(0, len(urls), batch):
+        part = urls[offset:offset + batch]
+        before = tracemalloc.take_snapshot()
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        result = func(part)
+        peak_total += tracemalloc.get_traced_memory()[1] - baseline
+        after = tracemalloc.take_snapshot()
+        for stat in after.compare_to(before, 'filename'):
+            blocks += stat.count_diff
+            size += stat.size_diff
+        del result
+    tracemalloc.stop()
+
+    count = len(urls)
+    print(f"  {label:<28} {count / elapsed:>10,.0f} URL/с"
+          f"   пик разбора {peak_total / count:>6,.0f} Б/URL"
+          f"   выделено {size / count:>6,.0f} Б/URL, {blocks / count:>5.1f} блоков/URL")
+
+
+def _parse_all(urls):
+    results = []
+    for url in urls:
+        try:
+            results.append(VLESSURLParser.parse(url))
+        except ValueError:
+            pass
+    return results
+
+
+def _parse_keys(urls):
+    keys = []
+    for url in urls:
+        try:
+            keys.append(VlessKey.from_url(url))
+        except ValueError:
+            pass
+    return keys
+
+
+def benchmark(count: int = BENCH_CORPUS_SIZE, seed: int = 1) -> None:
+    """Замеряет скорость и память парсера на сгенерированном корпусе"""
+    print("=" * 60)
+    print(f"Бенчмарк парсера VLESS URL: {count:,} URL (seed={seed})")
+    print("=" * 60)
+
+    corpus = generate_corpus(count, seed)
+    urls = [url for url, _ in corpus]
+
+    _measure("VLESSURLParser.parse", _parse_all, urls)
+    _measure("VlessKey.from_url", _parse_keys, urls)
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Тесты и бенчмарк парсера VLESS URL')
+    arg_parser.add_argument('--count', type=int, default=BENCH_CORPUS_SIZE,
+                            help='Размер корпуса для бенчмарка')
+    arg_parser.add_argument('--seed', type=int, default=1, help='Seed генератора корпуса')
+    args = arg_parser.parse_args()
+
+    test_examples()
+    test_corpus()
+    test_vless_key()
+    print("✓ Тесты парсера пройдены")
+    benchmark(args.count, args.seed)
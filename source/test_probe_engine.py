@@ -0,0 +1,140 @@
+"""
+Тестовый скрипт для проверки массовой асинхронной проверки серверов
+"""
+import socket
+import threading
+import time
+
+from endpoint_resolver import EndpointResolver
+from probe_engine import ProbeEngine
+
+
+class CountingServer:
+    """Локальный TCP сервер, считающий принятые подключения"""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(64)
+        self.port = self.sock.getsockname()[1]
+        self.accepted = 0
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.accepted += 1
+            conn.close()
+
+    def close(self):
+        self.sock.close()
+
+
+def closed_port() -> int:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def key(name: str, port: int, host: str = '127.0.0.1'):
+    return {'name': name, 'url': f"vless://uuid@{host}:{port}?security=none#{name}"}
+
+
+def test_probe_many():
+    server = CountingServer()
+    dead_port = closed_port()
+    try:
+        keys = [
+            key('a', server.port),
+            key('a-copy', server.port),  # Та же конечная точка
+            key('dead', dead_port),
+            {'name': 'broken', 'url': 'vless://uuid@127.0.0.1'},
+        ]
+        results = {r.name: r for r in ProbeEngine.probe_many(keys, deadline=5)}
+
+        assert len(results) == 4
+        assert results['a'].ok and results['a-copy'].ok
+        assert results['a'].latency_ms is not None and results['a'].address == '127.0.0.1'
+        assert not results['dead'].ok and results['dead'].error and not results['dead'].skipped
+        assert not results['broken'].ok and results['broken'].host is None
+
+        time.sleep(0.1)
+        assert server.accepted == 1  # Одно подключение на конечную точку
+    finally:
+        server.close()
+
+
+def test_streaming_and_limits():
+    server = CountingServer()
+    try:
+        # Разные порты одного сервера - разные конечные точки
+        servers = [server] + [CountingServer() for _ in range(9)]
+        keys = [key(str(i), s.port) for i, s in enumerate(servers)]
+
+        seen = []
+        for result in ProbeEngine.iter_probe(keys, concurrency=3, per_host=2, deadline=5):
+            seen.append(result)
+        assert len(seen) == 10 and all(r.ok for r in seen)
+
+        # Досрочное закрытие генератора не зависает
+        stream = ProbeEngine.iter_probe(keys, deadline=5)
+        assert next(stream).ok
+        stream.close()
+    finally:
+        for s in servers:
+            s.close()
+
+
+def test_aliases_share_endpoint():
+    """Разные имена одного IP проверяются одним подключением"""
+    server = CountingServer()
+    try:
+        for alias in ('alias-a.test', 'alias-b.test'):
+            EndpointResolver._cache[alias] = (time.monotonic() + 60, [(socket.AF_INET, '127.0.0.1')])
+        keys = [key('a', server.port, host='alias-a.test'), key('b', server.port, host='alias-b.test')]
+        results = {r.name: r for r in ProbeEngine.probe_many(keys, deadline=5)}
+        assert results['a'].ok and results['b'].ok
+        assert results['a'].host == 'alias-a.test' and results['b'].host == 'alias-b.test'
+
+        time.sleep(0.1)
+        assert server.accepted == 1
+    finally:
+        EndpointResolver.clear_cache()
+        server.close()
+
+
+def test_deadline():
+    keys = [key(str(i), 9) for i in range(5)]
+    results = ProbeEngine.probe_many(keys, deadline=0)
+    assert len(results) == 5
+    assert all(not r.ok and r.skipped and 'срока' in r.error for r in results)
+
+
+def test_deadline_with_slow_dns():
+    """Зависший DNS запрос не задерживает результат дольше общего срока"""
+    release = threading.Event()
+    lookup = EndpointResolver.lookup
+    EndpointResolver.lookup = staticmethod(lambda host, *args, **kwargs: release.wait(5) and [])
+    try:
+        started = time.monotonic()
+        results = ProbeEngine.probe_many([key('slow', 443, host='slow.example')], timeout=3, deadline=1)
+        assert time.monotonic() - started < 2
+        assert len(results) == 1 and not results[0].ok
+    finally:
+        EndpointResolver.lookup = lookup
+        release.set()
+
+
+if __name__ == '__main__':
+    test_probe_many()
+    test_streaming_and_limits()
+    test_aliases_share_endpoint()
+    test_deadline()
+    test_deadline_with_slow_dns()
+    print("✓ Все тесты пройдены")
@@ -0,0 +1,188 @@
+"""
+Тестовый скрипт для проверки адаптивного планировщика проверок
+"""
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from endpoint_resolver import EndpointResolver
+from latency_history import LatencyHistory
+from probe_scheduler import ProbeScheduler, ServerSchedule, TokenBucket
+
+
+def listening_socket() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(64)
+    return sock
+
+
+def closed_port() -> int:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def key(port: int, name: str = 'k', host: str = '127.0.0.1'):
+    return {'name': name, 'url': f"vless://uuid@{host}:{port}?security=none#{name}"}
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=50, burst=5)
+    start = time.monotonic()
+    for _ in range(15):
+        assert bucket.acquire()
+    elapsed = time.monotonic() - start
+    # 5 токенов сразу, остальные 10 - со скоростью 50 в секунду
+    assert 0.15 <= elapsed < 1.0
+
+    stop = threading.Event()
+    stop.set()
+    slow = TokenBucket(rate=0.1, burst=1)
+    assert slow.acquire(stop)
+    assert not slow.acquire(stop)  # Ожидание прервано
+
+
+def test_intervals():
+    scheduler = ProbeScheduler(history=LatencyHistory())
+    state = ServerSchedule('example.com:443', 'example.com', 443)
+
+    # Новый сервер проверяется часто, стабильный - все реже
+    assert scheduler._next_interval(state, 50.0) == ProbeScheduler.MIN_INTERVAL
+    intervals = [scheduler._next_interval(state, 50.0) for _ in range(20)]
+    assert intervals == sorted(intervals) and intervals[-1] == ProbeScheduler.MAX_INTERVAL
+
+    # Резкое изменение задержки возвращает частые проверки
+    assert scheduler._next_interval(state, 200.0) == ProbeScheduler.MIN_INTERVAL
+
+    # Недоступный сервер - экспоненциальная задержка с пределом
+    backoff = [scheduler._next_interval(state, None) for _ in range(8)]
+    assert backoff[:3] == [ProbeScheduler.DEAD_INTERVAL * 2 ** i for i in range(3)]
+    assert backoff[-1] == ProbeScheduler.MAX_BACKOFF
+    assert not state.alive
+
+    # Восстановление - снова частые проверки
+    assert scheduler._next_interval(state, 60.0) == ProbeScheduler.MIN_INTERVAL
+    assert state.alive
+
+    # Медленный стабильный сервер проверяется чаще быстрого
+    slow = ServerSchedule('slow:443', 'slow', 443)
+    for _ in range(20):
+        interval = scheduler._next_interval(slow, 1000.0)
+    assert interval == ProbeScheduler.SLOW_MAX_INTERVAL
+
+
+def test_scheduling():
+    servers = [listening_socket() for _ in range(3)]
+    dead_port = closed_port()
+    results = []
+    history = LatencyHistory()
+    keys = [key(s.getsockname()[1], str(i)) for i, s in enumerate(servers)]
+    keys.append(key(servers[0].getsockname()[1], 'same-server'))
+    keys.append(key(dead_port, 'dead'))
+
+    scheduler = ProbeScheduler(keys, rate=100, burst=2, max_sockets=2, history=history,
+                               on_result=lambda state, changed: results.append((state.server, changed)))
+    scheduler.MIN_INTERVAL = 0.05
+    scheduler.DEAD_INTERVAL = 0.2
+    with tempfile.TemporaryDirectory() as tmp:
+        history.HISTORY_FILE = os.path.join(tmp, 'history.bin')
+        try:
+            assert len(scheduler) == 4  # Ключи одного сервера проверяются вместе
+            scheduler.start()
+            time.sleep(0.6)
+        finally:
+            scheduler.stop(timeout=5)
+        assert os.path.exists(history.HISTORY_FILE)  # История сохраняется при остановке
+
+    dead = f"127.0.0.1:{dead_port}"
+    probes = {}
+    for server, _ in results:
+        probes[server] = probes.get(server, 0) + 1
+    assert set(probes) == {LatencyHistory.server_id('127.0.0.1', s.getsockname()[1])
+                           for s in servers} | {dead}
+    # Живые серверы проверяются чаще, чем недоступный с растущей задержкой
+    assert probes[dead] <= 3
+    assert all(count > probes[dead] for server, count in probes.items() if server != dead)
+    assert history.stats(dead)['success_rate'] == 0
+
+    # Удаленные из ключей серверы снимаются с проверки
+    scheduler.set_keys(keys[:1])
+    assert len(scheduler) == 1
+
+    for s in servers:
+        s.close()
+
+
+def test_aliases_grouped_by_endpoint():
+    """Разные имена одного IP - один сервер в очереди, история - по каждому имени"""
+    for alias in ('alias-a.test', 'alias-b.test'):
+        EndpointResolver._cache[alias] = (time.monotonic() + 60, [(socket.AF_INET, '127.0.0.1')])
+    try:
+        keys = [key(443, 'a', 'alias-a.test'), key(443, 'b', 'alias-b.test'), key(443, 'c', 'unresolved.invalid')]
+        scheduler = ProbeScheduler(keys, history=LatencyHistory())
+        servers = {state.server: state for state in scheduler.servers()}
+        assert set(servers) == {'127.0.0.1:443', 'unresolved.invalid:443'}
+        state = servers['127.0.0.1:443']
+        assert state.host == '127.0.0.1' and state.names == ['alias-a.test:443', 'alias-b.test:443']
+        assert [k['name'] for k in state.keys] == ['a', 'b']
+
+        # Инкрементальные изменения не трогают расписание остальных серверов
+        due = state.next_due
+        scheduler.remove_keys([keys[0], keys[2]])
+        assert [s.server for s in scheduler.servers()] == ['127.0.0.1:443']
+        assert state.names == ['alias-b.test:443'] and [k['name'] for k in state.keys] == ['b']
+        scheduler.add_keys([keys[0], keys[1]])
+        assert state.names == ['alias-b.test:443', 'alias-a.test:443'] and len(state.keys) == 2
+        assert state.next_due == due and len(scheduler) == 1
+    finally:
+        EndpointResolver.clear_cache()
+
+
+def test_restart_keeps_sockets():
+    """Проверка, отмененная при остановке, возвращает свой сокет"""
+    servers = [listening_socket() for _ in range(2)]
+    busy = threading.Event()
+    resume = threading.Event()
+
+    def on_result(state, changed):
+        busy.set()
+        resume.wait(5)  # Рабочий поток занят - следующая проверка ждет в очереди пула
+
+    scheduler = ProbeScheduler([key(s.getsockname()[1], str(i)) for i, s in enumerate(servers)],
+                               rate=100, burst=2, max_sockets=1, history=LatencyHistory(),
+                               on_result=on_result)
+    scheduler._save_state = lambda: None
+    try:
+        scheduler.start()
+        assert busy.wait(5)
+        deadline = time.monotonic() + 5
+        while scheduler._sockets._value and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert scheduler._sockets._value == 0  # Сокет занят проверкой в очереди пула
+
+        stopper = threading.Thread(target=scheduler.stop, kwargs={'timeout': 5})
+        stopper.start()
+        time.sleep(0.3)
+        resume.set()
+        stopper.join(10)
+        assert not stopper.is_alive()
+        assert scheduler._sockets._value == scheduler.max_sockets
+    finally:
+        resume.set()
+        scheduler.stop(timeout=5)
+        for s in servers:
+            s.close()
+
+
+if __name__ == '__main__':
+    test_token_bucket()
+    test_intervals()
+    test_scheduling()
+    test_aliases_grouped_by_endpoint()
+    test_restart_keeps_sockets()
+    print("✓ Все тесты пройдены")
@@ -0,0 +1,66 @@
+"""
+Тестовый скрипт для проверки потокового парсера подписок
+"""
+import base64
+import gzip
+import io
+import lzma
+import zlib
+
+from subscription_parser import SubscriptionParser
+
+# Пример подписки: комментарии, пустые строки, ключи с именем и без
+SUBSCRIPTION = "\n".join([
+    "# Комментарий",
+    "",
+    "vless://uuid@example.com:443?security=tls&sni=example.com#Сервер-1",
+    "vless://uuid@server.com:443?type=ws&path=/path&security=tls",
+    "не ключ",
+] * 500).encode('utf-8')
+
+
+def parse(data: bytes, chunk_size: int = 37):
+    stream = io.BytesIO(data)
+    chunks = SubscriptionParser.iter_stream_chunks(stream, chunk_size)
+    lines = SubscriptionParser.iter_lines(SubscriptionParser.iter_decoded(chunks))
+    return list(SubscriptionParser.iter_keys(lines))
+
+
+def test_plain():
+    keys = parse(SUBSCRIPTION)
+    assert len(keys) == 1000
+    assert keys[0] == {
+        'name': 'Сервер-1',
+        'url': 'vless://uuid@example.com:443?security=tls&sni=example.com#Сервер-1'
+    }
+    assert keys[1]['name'] == 'Сервер 4'
+
+
+def test_encoded_formats():
+    expected = parse(SUBSCRIPTION)
+    encoded = {
+        'base64': base64.b64encode(SUBSCRIPTION),
+        'base64 (с переносами)': base64.encodebytes(SUBSCRIPTION),
+        'base64 (url-safe, без =)': base64.urlsafe_b64encode(SUBSCRIPTION).rstrip(b'='),
+        'gzip': gzip.compress(SUBSCRIPTION),
+        'xz': lzma.compress(SUBSCRIPTION),
+        'zlib': zlib.compress(SUBSCRIPTION),
+        'gzip + base64': gzip.compress(base64.b64encode(SUBSCRIPTION)),
+    }
+    for label, data in encoded.items():
+        for chunk_size in (1, 37, 64 * 1024):
+            assert parse(data, chunk_size) == expected, f"{label}, кусок {chunk_size}"
+
+
+def test_text_like_zlib_header():
+    # "x " проходит контрольную сумму заголовка zlib, но это обычный текст
+    data = b"x \n" + SUBSCRIPTION
+    assert int.from_bytes(data[:2], 'big') % 31 == 0
+    assert [k['url'] for k in parse(data)] == [k['url'] for k in parse(SUBSCRIPTION)]
+
+
+if __name__ == '__main__':
+    test_plain()
+    test_encoded_formats()
+    test_text_like_zlib_header()
+    print("✓ Все тесты парсера подписок пройдены")
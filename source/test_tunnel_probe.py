@@ -0,0 +1,183 @@
+"""
+Тестовый скрипт для проверки туннеля через SOCKS5 вход
+"""
+import socket
+import struct
+import threading
+import time
+
+from tunnel_probe import TunnelMonitor, TunnelProbe
+
+
+class EchoServer:
+    """Локальный эхо-сервер (цель проверки); silent=True - принимает, но не отвечает"""
+
+    def __init__(self, silent: bool = False):
+        self.silent = silent
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._echo, args=(conn,), daemon=True).start()
+
+    def _echo(self, conn):
+        with conn:
+            try:
+                while True:
+                    data = conn.recv(4096)
+                    if not data:
+                        return
+                    if not self.silent:
+                        conn.sendall(data)
+            except OSError:
+                pass
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)  # Прерывает accept в потоке сервера
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class Socks5Server:
+    """Минимальный SOCKS5 сервер вместо Xray: CONNECT только к 127.0.0.1/localhost"""
+
+    def __init__(self, reply: int = 0):
+        self.reply = reply
+        self.targets = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            try:
+                assert conn.recv(3) == b'\x05\x01\x00'
+                conn.sendall(b'\x05\x00')
+                version, command, _, atyp = conn.recv(4)
+                if atyp == 3:
+                    host = conn.recv(conn.recv(1)[0]).decode()
+                else:
+                    host = socket.inet_ntoa(conn.recv(4))
+                (port,) = struct.unpack('!H', conn.recv(2))
+                self.targets.append((host, port))
+                if self.reply:
+                    conn.sendall(bytes([5, self.reply, 0, 1]) + b'\x00' * 6)
+                    return
+                upstream = socket.create_connection(('127.0.0.1', port), timeout=5)
+                conn.sendall(b'\x05\x00\x00\x01' + socket.inet_aton('127.0.0.1') + struct.pack('!H', 0))
+                with upstream:
+                    data = conn.recv(4096)
+                    upstream.sendall(data)
+                    conn.sendall(upstream.recv(4096))
+            except OSError:
+                pass
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)  # Прерывает accept в потоке сервера
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def closed_port() -> int:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_check():
+    echo = EchoServer()
+    proxy = Socks5Server()
+    try:
+        result = TunnelProbe.check(proxy.port, 'localhost', echo.port, payload=b'ping', timeout=5)
+        assert result.ok, result.error
+        assert result.connect_ms is not None and result.ttfb_ms is not None
+        assert proxy.targets == [('localhost', echo.port)]  # Имя передается прокси без разрешения
+
+        result = TunnelProbe.check(proxy.port, '127.0.0.1', echo.port, payload=b'ping', timeout=5)
+        assert result.ok and proxy.targets[-1] == ('127.0.0.1', echo.port)
+    finally:
+        echo.close()
+        proxy.close()
+
+
+def test_failures():
+    result = TunnelProbe.check(closed_port(), '127.0.0.1', 80, timeout=2)
+    assert not result.ok and 'недоступен' in result.error
+
+    refusing = Socks5Server(reply=5)
+    silent = EchoServer(silent=True)
+    proxy = Socks5Server()
+    try:
+        result = TunnelProbe.check(refusing.port, '127.0.0.1', 80, timeout=2)
+        assert not result.ok and result.error == TunnelProbe.REPLIES[5]
+
+        started = time.monotonic()
+        result = TunnelProbe.check(proxy.port, '127.0.0.1', silent.port, payload=b'ping', timeout=0.5)
+        assert not result.ok and 'таймаут' in result.error
+        assert time.monotonic() - started < 2
+    finally:
+        refusing.close()
+        silent.close()
+        proxy.close()
+
+
+def test_monitor():
+    echo = EchoServer()
+    proxy = Socks5Server()
+    changes = []
+    monitor = TunnelMonitor(proxy.port, interval=0.05, target_host='127.0.0.1',
+                            target_port=echo.port, payload=b'ping', timeout=1,
+                            on_change=changes.append)
+    try:
+        assert monitor.probe().ok and monitor.healthy
+        assert len(changes) == 1 and changes[0].ok
+
+        # Туннель перестал работать: единичный сбой тревогу не поднимает
+        proxy.close()
+        assert not monitor.probe().ok and monitor.healthy
+        assert not monitor.probe().ok and monitor.healthy is False
+        assert len(changes) == 2 and not changes[1].ok
+
+        # Фоновая проверка замечает восстановление
+        proxy = Socks5Server()
+        monitor.socks_port = proxy.port
+        monitor.start()
+        deadline = time.monotonic() + 3
+        while not monitor.healthy and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert monitor.healthy and changes[-1].ok
+    finally:
+        monitor.stop(timeout=2)
+        echo.close()
+        proxy.close()
+
+
+if __name__ == '__main__':
+    test_check()
+    test_failures()
+    test_monitor()
+    print("✓ Все тесты пройдены")
@@ -0,0 +1,260 @@
+"""
+Модуль проверки прохождения трафика через туннель (локальный SOCKS5 вход Xray)
+"""
+import ipaddress
+import socket
+import struct
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+
+class TunnelProbeResult:
+    """Результат проверки туннеля"""
+
+    __slots__ = ('ok', 'connect_ms', 'ttfb_ms', 'error', 'target')
+
+    def __init__(self, ok: bool, target: str, connect_ms: Optional[float] = None,
+                 ttfb_ms: Optional[float] = None, error: Optional[str] = None):
+        self.ok = ok
+        self.target = target  # хост:порт цели
+        self.connect_ms = connect_ms  # До ответа SOCKS5 на CONNECT (соединение через туннель)
+        self.ttfb_ms = ttfb_ms  # От отправки запроса до первого байта ответа
+        self.error = error
+
+    def __str__(self) -> str:
+        if not self.ok:
+            return f"{self.target}: {self.error}"
+        return f"{self.target}: подключение {self.connect_ms:.0f} мс, первый байт {self.ttfb_ms:.0f} мс"
+
+    def __repr__(self) -> str:
+        return f"TunnelProbeResult(ok={self.ok}, {self})"
+
+
+class TunnelProbe:
+    """
+    Проверка туннеля встроенным SOCKS5 клиентом
+
+    Через SOCKS5 вход Xray (127.0.0.1:socks_port) устанавливается
+    соединение CONNECT с целевым сервером, затем отправляется запрос и
+    ожидается первый байт ответа. Так проверяется весь путь трафика:
+    локальный вход, VLESS сервер и выход в интернет. Имя цели передается
+    прокси без разрешения на клиенте, поэтому DNS тоже идет через туннель.
+    """
+
+    SOCKS_HOST = '127.0.0.1'
+    TARGET_HOST = 'www.gstatic.com'
+    TARGET_PORT = 80
+    TIMEOUT = 10
+
+    REPLIES = {
+        1: "общая ошибка SOCKS сервера",
+        2: "соединение запрещено правилами",
+        3: "сеть недоступна",
+        4: "хост недоступен",
+        5: "соединение отклонено",
+        6: "истек TTL",
+        7: "команда не поддерживается",
+        8: "тип адреса не поддерживается",
+    }
+
+    @staticmethod
+    def parse_target(value: str) -> Tuple[str, int]:
+        """Разбирает цель проверки вида хост:порт ([IPv6]:порт)"""
+        host, _, port = value.strip().rpartition(':')
+        host = host.strip('[]')
+        if not host or not port.isdigit() or not 0 < int(port) < 65536:
+            raise ValueError(f"Ожидается хост:порт, получено: {value}")
+        return host, int(port)
+
+    @staticmethod
+    def _recv_exact(sock: socket.socket, size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("SOCKS сервер закрыл соединение")
+            data += chunk
+        return data
+
+    @staticmethod
+    def _address(host: str) -> bytes:
+        """Адрес цели в формате SOCKS5 (ATYP + адрес)"""
+        try:
+            ip = ipaddress.ip_address(host.strip('[]'))
+        except ValueError:
+            encoded = host.encode('idna')
+            if len(encoded) > 255:
+                raise ValueError(f"Слишком длинное имя хоста: {host}")
+            return b'\x03' + bytes([len(encoded)]) + encoded
+        return (b'\x01' if ip.version == 4 else b'\x04') + ip.packed
+
+    @staticmethod
+    def _handshake(sock: socket.socket, host: str, port: int) -> None:
+        """Приветствие без аутентификации и команда CONNECT"""
+        sock.sendall(b'\x05\x01\x00')
+        version, method = TunnelProbe._recv_exact(sock, 2)
+        if version != 5:
+            raise ConnectionError("Порт не отвечает по протоколу SOCKS5")
+        if method != 0:
+            raise ConnectionError("SOCKS сервер требует аутентификацию")
+
+        sock.sendall(b'\x05\x01\x00' + TunnelProbe._address(host) + struct.pack('!H', port))
+        version, reply, _, atyp = TunnelProbe._recv_exact(sock, 4)
+        if version != 5:
+            raise ConnectionError("Некорректный ответ SOCKS5")
+        if reply != 0:
+            raise ConnectionError(TunnelProbe.REPLIES.get(reply, f"ошибка SOCKS5 (код {reply})"))
+        # Адрес, выделенный прокси, не нужен - дочитываем его
+        if atyp == 1:
+            TunnelProbe._recv_exact(sock, 4 + 2)
+        elif atyp == 4:
+            TunnelProbe._recv_exact(sock, 16 + 2)
+        elif atyp == 3:
+            TunnelProbe._recv_exact(sock, TunnelProbe._recv_exact(sock, 1)[0] + 2)
+        else:
+            raise ConnectionError("Некорректный тип адреса в ответе SOCKS5")
+
+    @staticmethod
+    def _default_payload(host: str, port: int) -> bytes:
+        """HTTP запрос для цели по умолчанию (для других целей запрос задается явно)"""
+        host_header = host if port == 80 else f"{host}:{port}"
+        return (f"GET /generate_204 HTTP/1.1\r\nHost: {host_header}\r\n"
+                f"User-Agent: blackeggsx\r\nConnection: close\r\n\r\n").encode('ascii')
+
+    @staticmethod
+    def check(socks_port: int, target_host: str = TARGET_HOST,
+              target_port: int = TARGET_PORT, payload: Optional[bytes] = None,
+              timeout: float = TIMEOUT, socks_host: str = SOCKS_HOST) -> TunnelProbeResult:
+        """
+        Проверяет прохождение трафика через SOCKS5 вход
+
+        Args:
+            socks_port: Порт SOCKS5 входа Xray
+            target_host: Цель (имя или IP адрес)
+            target_port: Порт цели
+            payload: Запрос, на который цель отвечает; по умолчанию - HTTP
+                запрос /generate_204
+            timeout: Общий таймаут проверки (сек)
+            socks_host: Адрес SOCKS5 входа
+
+        Returns:
+            TunnelProbeResult
+        """
+        target = f"{target_host}:{target_port}"
+        if payload is None:
+            payload = TunnelProbe._default_payload(target_host, target_port)
+
+        started = time.perf_counter()
+        deadline = started + timeout
+
+        def remaining() -> float:
+            left = deadline - time.perf_counter()
+            if left <= 0:
+                raise socket.timeout()
+            return left
+
+        try:
+            sock = socket.create_connection((socks_host, socks_port), timeout=timeout)
+        except OSError as e:
+            return TunnelProbeResult(False, target, error=f"SOCKS5 вход {socks_host}:{socks_port} недоступен: {e}")
+
+        try:
+            sock.settimeout(remaining())
+            TunnelProbe._handshake(sock, target_host, target_port)
+            connect_ms = (time.perf_counter() - started) * 1000
+
+            sent_at = time.perf_counter()
+            sock.settimeout(remaining())
+            sock.sendall(payload)
+            if not sock.recv(1):
+                raise ConnectionError("цель закрыла соединение без ответа")
+            ttfb_ms = (time.perf_counter() - sent_at) * 1000
+        except socket.timeout:
+            return TunnelProbeResult(False, target, error=f"таймаут ({timeout:g} с)")
+        except (OSError, ValueError) as e:
+            return TunnelProbeResult(False, target, error=str(e))
+        finally:
+            sock.close()
+        return TunnelProbeResult(True, target, connect_ms, ttfb_ms)
+
+
+class TunnelMonitor:
+    """
+    Периодическая проверка туннеля в фоновом потоке
+
+    Обработчик вызывается, когда состояние впервые определено и при каждом
+    его изменении (туннель перестал или снова начал пропускать трафик).
+    Неработающим туннель считается после FAILURES неудачных проверок
+    подряд, чтобы единичный сбой не поднимал тревогу.
+    """
+
+    INTERVAL = 30.0
+    FAILURES = 2
+
+    def __init__(self, socks_port: int, interval: float = INTERVAL,
+                 target_host: str = TunnelProbe.TARGET_HOST,
+                 target_port: int = TunnelProbe.TARGET_PORT,
+                 payload: Optional[bytes] = None, timeout: float = TunnelProbe.TIMEOUT,
+                 on_change: Optional[Callable[[TunnelProbeResult], None]] = None):
+        """
+        Args:
+            socks_port: Порт SOCKS5 входа Xray
+            interval: Пауза между проверками (сек)
+            target_host, target_port, payload, timeout: Как у TunnelProbe.check
+            on_change: Обработчик изменения состояния (вызывается из фонового потока)
+        """
+        self.socks_port = socks_port
+        self.interval = interval
+        self.target_host = target_host
+        self.target_port = target_port
+        self.payload = payload
+        self.timeout = timeout
+        self.on_change = on_change
+
+        self.last_result: Optional[TunnelProbeResult] = None
+        self.healthy: Optional[bool] = None  # None - еще не проверялся
+        self.failures = 0  # Неудачных проверок подряд
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def probe(self) -> TunnelProbeResult:
+        """Выполняет одну проверку и обновляет состояние"""
+        result = TunnelProbe.check(self.socks_port, self.target_host, self.target_port,
+                                   self.payload, self.timeout)
+        self.last_result = result
+        self.failures = 0 if result.ok else self.failures + 1
+
+        if result.ok:
+            healthy = True
+        elif self.failures >= self.FAILURES:
+            healthy = False
+        else:
+            healthy = self.healthy  # Единичный сбой состояние не меняет
+        if healthy is not None and healthy != self.healthy:
+            self.healthy = healthy
+            if self.on_change is not None:
+                try:
+                    self.on_change(result)
+                except Exception:
+                    pass  # Ошибка обработчика не должна останавливать проверки
+        return result
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.probe()
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        """Запускает периодические проверки"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='TunnelMonitor', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Останавливает проверки"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
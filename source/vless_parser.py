@@ -3,18 +3,20 @@
 """
 import urllib.parse
 import base64
-from typing import Dict, Optional
+import sys
+from typing import Dict, Optional, Tuple
 
 
 class VLESSURLParser:
     """Парсер для VLESS URL формата: vless://uuid@host:port?params#remark"""
     
     @staticmethod
-    def parse(vless_url: str) -> Dict[str, any]:
+    def _split(vless_url: str) -> Tuple[str, str, int, Optional[str], Dict[str, str]]:
         """
-        Парсит VLESS URL и возвращает словарь с параметрами
+        Разбивает VLESS URL на составные части
         
-        Формат: vless://uuid@host:port?params#remark
+        Returns:
+            Tuple: (uuid, host, port, remark, params)
         """
         if not vless_url.startswith('vless://'):
             raise ValueError("URL должен начинаться с 'vless://'")
@@ -54,62 +56,131 @@ class VLESSURLParser:
                     key, value = param.split('=', 1)
                     params[key] = urllib.parse.unquote(value)
         
-        result = {
-            'uuid': uuid,
-            'host': host,
-            'port': port,
-            'remark': remark,
-            'params': params
-        }
+        return uuid, host, port, remark, params
+    
+    @staticmethod
+    def parse(vless_url: str) -> Dict[str, any]:
+        """
+        Парсит VLESS URL и возвращает словарь с параметрами
+        
+        Формат: vless://uuid@host:port?params#remark
         
-        # Извлекаем стандартные параметры
-        result['type'] = params.get('type', 'tcp')
-        result['security'] = params.get('security', 'none')
-        result['encryption'] = params.get('encryption', 'none')
-        result['flow'] = params.get('flow', '')
-        
-        # Парсим специальные параметры в зависимости от типа
-        if result['type'] == 'ws':
-            result['path'] = params.get('path', '/')
-            result['host_header'] = params.get('host', host)
-        elif result['type'] == 'grpc':
-            result['serviceName'] = params.get('serviceName', '')
-        elif result['type'] == 'tcp':
-            result['headerType'] = params.get('headerType', 'none')
+        Поля выводятся один раз в VlessKey; словарь - его представление
+        для кода, работающего с параметрами по именам.
+        """
+        return VlessKey.from_url(vless_url).to_dict()
+
+
+class VlessKey:
+    """
+    Компактная запись разобранного VLESS ключа
+    
+    Поля хранятся в __slots__ без дублирования между верхним уровнем и params,
+    строки интернируются. Это единственное место, где из URL выводятся
+    параметры: VLESSURLParser.parse возвращает to_dict() этой записи.
+    """
+    
+    __slots__ = (
+        'uuid', 'host', 'port', 'remark', 'type', 'security', 'encryption', 'flow',
+        'sni', 'alpn', 'pbk', 'sid', 'fp', 'dest', 'path', 'host_header',
+        'service_name', 'header_type', 'params'
+    )
+    
+    def __init__(self, uuid: str, host: str, port: int, remark: Optional[str],
+                 params: Dict[str, str]):
+        """
+        Args:
+            uuid, host, port, remark: Части URL
+            params: Query параметры URL (уже декодированные)
+        """
+        intern = sys.intern
+        get = params.get
+        
+        self.uuid = intern(uuid)
+        self.host = intern(host)
+        self.port = port
+        self.remark = remark
+        self.type = intern(get('type', 'tcp'))
+        self.security = intern(get('security', 'none'))
+        self.encryption = intern(get('encryption', 'none'))
+        self.flow = intern(get('flow', ''))
+        
+        self.path = None
+        self.host_header = None
+        self.service_name = None
+        self.header_type = None
+        if self.type == 'ws':
+            self.path = intern(get('path', '/'))
+            self.host_header = intern(get('host', host))
+        elif self.type == 'grpc':
+            self.service_name = intern(get('serviceName', ''))
+        elif self.type == 'tcp':
+            self.header_type = intern(get('headerType', 'none'))
         
         # SNI для TLS
-        if 'sni' in params:
-            result['sni'] = params['sni']
-        elif 'host' in params and result['type'] != 'ws':
-            result['sni'] = params['host']
-        
-        # ALPN для TLS
-        if 'alpn' in params:
-            result['alpn'] = params['alpn'].split(',')
-        
-        # Параметры для Reality - извлекаем из params и добавляем в result
-        if result.get('security') == 'reality':
-            # pbk = publicKey (публичный ключ сервера) - обязательный
-            if 'pbk' in params:
-                result['pbk'] = params['pbk']
-            # sid = shortId (короткий ID) - обязательный
-            if 'sid' in params:
-                result['sid'] = params['sid']
-            # fp = fingerprint (отпечаток) - опциональный
-            if 'fp' in params:
-                result['fp'] = params['fp']
-            # dest = destination (назначение для маскировки) - опциональный
-            if 'dest' in params:
-                result['dest'] = params['dest']
-            
-            # Также сохраняем в params для обратной совместимости
-            # Это гарантирует, что параметры будут доступны через vless_params.get('params', {}).get('pbk')
-        
-        # Сохраняем все params для доступа через vless_params.get('params', {}).get('key')
-        # Это нужно на случай, если параметры не были извлечены выше
-        # Убеждаемся, что params всегда доступен
-        if 'params' not in result:
-            result['params'] = params
+        sni = get('sni')
+        if sni is None and self.type != 'ws':
+            sni = get('host')
+        self.sni = intern(sni) if sni is not None else None
+        
+        alpn = get('alpn')
+        self.alpn = tuple(intern(a) for a in alpn.split(',')) if alpn is not None else None
+        
+        # Параметры Reality
+        self.pbk = intern(params['pbk']) if 'pbk' in params else None
+        self.sid = intern(params['sid']) if 'sid' in params else None
+        self.fp = intern(params['fp']) if 'fp' in params else None
+        self.dest = intern(params['dest']) if 'dest' in params else None
+        
+        # Исходные параметры - компактным кортежем пар
+        self.params = tuple((intern(k), intern(v)) for k, v in params.items())
+    
+    @staticmethod
+    def from_url(vless_url: str) -> 'VlessKey':
+        """Разбирает VLESS URL в VlessKey"""
+        return VlessKey(*VLESSURLParser._split(vless_url))
+    
+    @staticmethod
+    def from_dict(vless_params: Dict[str, any]) -> 'VlessKey':
+        """Восстанавливает VlessKey из словаря VLESSURLParser.parse"""
+        return VlessKey(vless_params['uuid'], vless_params['host'], vless_params['port'],
+                        vless_params.get('remark'), vless_params.get('params') or {})
+    
+    def to_dict(self) -> Dict[str, any]:
+        """Возвращает словарь в формате VLESSURLParser.parse"""
+        params = dict(self.params)
+        result = {
+            'uuid': self.uuid,
+            'host': self.host,
+            'port': self.port,
+            'remark': self.remark,
+            'params': params,
+            'type': self.type,
+            'security': self.security,
+            'encryption': self.encryption,
+            'flow': self.flow,
+        }
+        
+        if self.type == 'ws':
+            result['path'] = self.path
+            result['host_header'] = self.host_header
+        elif self.type == 'grpc':
+            result['serviceName'] = self.service_name
+        elif self.type == 'tcp':
+            result['headerType'] = self.header_type
+        
+        if self.sni is not None:
+            result['sni'] = self.sni
+        if self.alpn is not None:
+            result['alpn'] = list(self.alpn)
+        
+        if self.security == 'reality':
+            for name in ('pbk', 'sid', 'fp', 'dest'):
+                value = getattr(self, name)
+                if value is not None:
+                    result[name] = value
         
         return result
-
+    
+    def __repr__(self) -> str:
+        return f"VlessKey({self.uuid[:8]}...@{self.host}:{self.port}, {self.type}/{self.security})"
@@ -7,6 +7,7 @@ import os
 import signal
 import atexit
 from pathlib import Path
+from typing import Tuple
 
 # Проверка импортов модулей
 try:
@@ -16,6 +17,13 @@ try:
     from proxy_manager import WindowsProxyManager
     from menu import Menu
     from connection_checker import ConnectionChecker
+    from key_loader import KeyLoader
+    from config_cache import ConfigCache
+    from key_validator import KeyValidator
+    from auto_select import AutoSelector
+    from probe_scheduler import ProbeScheduler
+    from circuit_breaker import CircuitBreaker
+    from tunnel_probe import TunnelMonitor, TunnelProbe
 except ImportError as e:
     print(f"Ошибка импорта модулей: {e}")
     print("Убедитесь, что все файлы проекта находятся в одной директории.")
@@ -28,11 +36,14 @@ class VPNClient:
     def __init__(self):
         self.parser = VLESSURLParser()
         self.config_generator = XrayConfigGenerator()
+        self.config_cache = ConfigCache.shared()
         self.xray_runner = XrayRunner()
         self.proxy_manager = WindowsProxyManager()
         self.config_file = 'config.json'
+        self.tunnel_monitor = None
     
-    def connect(self, vless_url: str, local_port: int = 10808, socks_port: int = 10809):
+    def connect(self, vless_url: str, local_port: int = 10808, socks_port: int = 10809,
+                probe_target: Tuple[str, int] = (TunnelProbe.TARGET_HOST, TunnelProbe.TARGET_PORT)):
         """
         Подключается к VPN используя VLESS URL
         
@@ -40,6 +51,7 @@ class VPNClient:
             vless_url: VLESS URL (vless://...)
             local_port: Локальный порт для HTTP прокси
             socks_port: Локальный порт для SOCKS5 прокси
+            probe_target: Цель проверки туннеля (хост, порт)
         """
         print("=" * 60)
         print("VPN Клиент для VLESS/Xray")
@@ -48,7 +60,7 @@ class VPNClient:
         # Парсим URL
         print("\n[1/5] Парсинг VLESS URL...")
         try:
-            vless_params = self.parser.parse(vless_url)
+            vless_params = self.config_cache.parse(vless_url)
             print(f"✓ UUID: {vless_params['uuid'][:8]}...")
             print(f"✓ Сервер: {vless_params['host']}:{vless_params['port']}")
             print(f"✓ Тип: {vless_params['type']}")
@@ -70,6 +82,21 @@ class VPNClient:
             print(f"✗ Ошибка парсинга URL: {e}")
             return False
         
+        # Структурная проверка до сетевых проверок: ключ с неверными
+        # параметрами все равно не сможет подключиться
+        problems = KeyValidator.check(vless_params)
+        if problems:
+            print("✗ Ключ некорректен:")
+            for problem in problems:
+                print(f"  - {problem}")
+            return False
+        
+        breaker = CircuitBreaker.shared()
+        retry_in = breaker.retry_in(vless_url)
+        if retry_in:
+            print(f"⚠ Ключ в карантине после повторных неудач, "
+                  f"автоматическая повторная попытка через {max(1, round(retry_in / 60))} мин")
+        
         # Проверяем соединение
         print(f"\n[2/5] Проверка соединения с сервером...")
         print(f"  Сервер: {vless_params['host']}:{vless_params['port']}")
@@ -77,8 +104,12 @@ class VPNClient:
             conn_ok, conn_msg = ConnectionChecker.check_connection(
                 vless_params['host'], 
                 vless_params['port'],
-                check_ping=True
+                check_ping=True,
+                tls=vless_params.get('security') in ('tls', 'reality'),
+                sni=(vless_params.get('sni') or '').split(',')[0].strip() or None,
+                alpn=vless_params.get('alpn')
             )
+            KeyLoader.record_probe(vless_url, conn_ok)
             if conn_ok:
                 print(f"✓ {conn_msg}")
             else:
@@ -86,6 +117,8 @@ class VPNClient:
                 response = input("\nПродолжить подключение несмотря на проблемы? (y/n): ").strip().lower()
                 if response != 'y' and response != 'yes' and response != 'да':
                     print("Подключение отменено")
+                    # Попытка закончилась на проверке доступности сервера
+                    self._record_attempt(breaker, vless_url, False, conn_msg, CircuitBreaker.PROBE)
                     return False
         except Exception as e:
             print(f"⚠ Ошибка проверки соединения: {e}")
@@ -105,10 +138,11 @@ class VPNClient:
                 print(f"    pbk: {'есть (' + str(pbk_val)[:20] + '...)' if pbk_val else 'нет'}")
                 print(f"    sid: {'есть (' + str(sid_val) + ')' if sid_val else 'нет'}")
             
-            config = self.config_generator.generate(
-                vless_params, 
+            config = self.config_cache.generate(
+                vless_url,
                 local_port=local_port,
-                socks_port=socks_port
+                socks_port=socks_port,
+                count=False  # URL уже разобран на шаге [1/5]
             )
             self.config_generator.save_config(config, self.config_file)
             print(f"✓ Конфигурация сохранена: {self.config_file}")
@@ -117,19 +151,45 @@ class VPNClient:
             print("\nПроверьте, что в VLESS URL присутствуют все необходимые параметры:")
             print("  - pbk (publicKey) для Reality")
             print("  - sid (shortId) для Reality")
+            self._record_attempt(breaker, vless_url, False, f"ошибка конфигурации: {e}")
             return False
         except Exception as e:
             print(f"✗ Ошибка генерации конфигурации: {e}")
             import traceback
             print("\nДетали ошибки:")
             traceback.print_exc()
+            self._record_attempt(breaker, vless_url, False, f"ошибка конфигурации: {e}")
             return False
         
         # Запускаем Xray
         print(f"\n[4/5] Запуск Xray...")
         if not self.xray_runner.start(self.config_file):
+            if self.xray_runner.last_exit_code is not None:
+                # Xray отверг конфигурацию ключа - учитываем как неудачу ключа
+                # (отсутствие Xray - проблема окружения, а не ключа)
+                self._record_attempt(breaker, vless_url, False,
+                                     f"Xray завершился с кодом {self.xray_runner.last_exit_code}")
             return False
         
+        # Процесс запущен - проверяем, что трафик действительно проходит через туннель
+        target_host, target_port = probe_target
+        print(f"  Проверка туннеля через SOCKS5 127.0.0.1:{socks_port} до {target_host}:{target_port}...")
+        tunnel = TunnelProbe.check(socks_port, target_host, target_port)
+        if tunnel.ok:
+            print(f"✓ Туннель работает: подключение {tunnel.connect_ms:.0f} мс, "
+                  f"первый байт {tunnel.ttfb_ms:.0f} мс")
+        else:
+            print(f"⚠ Трафик через туннель не проходит: {tunnel.error}")
+        # Итог попытки для карантина - только по прохождению трафика
+        self._record_attempt(breaker, vless_url, tunnel.ok,
+                             None if tunnel.ok else f"туннель: {tunnel.error}")
+        
+        # Дальше туннель проверяется периодически, сообщения - только при изменениях
+        self.tunnel_monitor = TunnelMonitor(socks_port, target_host=target_host,
+                                            target_port=target_port, on_change=self._on_tunnel_change)
+        self.tunnel_monitor.healthy = tunnel.ok
+        self.tunnel_monitor.start()
+        
         # Устанавливаем системный прокси
         print(f"\n[5/5] Установка системного прокси...")
         if not self.proxy_manager.set_proxy('127.0.0.1', local_port):
@@ -151,10 +211,22 @@ class VPNClient:
         
         return True
     
+    @staticmethod
+    def _on_tunnel_change(result):
+        """Сообщает об изменении состояния туннеля (вызывается из фонового потока)"""
+        if result.ok:
+            print(f"\n✓ Трафик через туннель снова проходит (первый байт {result.ttfb_ms:.0f} мс)")
+        else:
+            print(f"\n⚠ Трафик через туннель не проходит: {result.error}")
+    
     def disconnect(self):
         """Отключается от VPN"""
         print("\n\nОтключение VPN...")
         
+        if self.tunnel_monitor is not None:
+            self.tunnel_monitor.stop(timeout=1)
+            self.tunnel_monitor = None
+        
         # Удаляем системный прокси
         self.proxy_manager.remove_proxy()
         
@@ -170,6 +242,19 @@ class VPNClient:
         
         print("✓ VPN отключен")
     
+    @staticmethod
+    def _record_attempt(breaker: CircuitBreaker, vless_url: str, ok: bool, reason: str = None,
+                        source: str = CircuitBreaker.CONNECT):
+        """
+        Передает выключателю итог попытки подключения (один на попытку)
+        и сохраняет его состояние (ошибки записи не критичны)
+        """
+        breaker.record(vless_url, ok, reason, source=source)
+        try:
+            breaker.save()
+        except OSError:
+            pass
+    
     def status(self):
         """Показывает статус подключения"""
         xray_status = self.xray_runner.get_status()
@@ -188,6 +273,52 @@ class VPNClient:
         else:
             print("  Не установлен")
         print("=" * 60)
+    
+    def monitor(self, rate: float = ProbeScheduler.RATE, max_sockets: int = ProbeScheduler.MAX_SOCKETS):
+        """
+        Непрерывно проверяет серверы текущего списка ключей (до Ctrl+C)
+        
+        Печатаются только изменения доступности серверов и периодическая сводка.
+        """
+        keys = AutoSelector.current_keys()
+        if not keys:
+            print("✗ Нет ключей для проверки")
+            return
+        
+        def on_result(state, changed):
+            if not changed:
+                return
+            if state.alive:
+                print(f"✓ {', '.join(state.names)} доступен ({state.latency_ms:.0f} мс)")
+            else:
+                print(f"✗ {', '.join(state.names)} недоступен, следующая проверка через {state.interval:.0f} с")
+        
+        scheduler = ProbeScheduler(keys, rate=rate, max_sockets=max_sockets,
+                                   breaker=CircuitBreaker.shared(), store_results=True,
+                                   on_result=on_result)
+        
+        def on_update(diff):
+            # Разбираются и разрешаются только изменившиеся ключи
+            scheduler.remove_keys(diff.removed)
+            scheduler.add_keys(diff.added)
+        
+        KeyLoader.add_update_listener(on_update)
+        print(f"Мониторинг {len(scheduler)} серверов: до {rate:g} проверок/с, "
+              f"до {max_sockets} подключений одновременно. Ctrl+C - выход")
+        scheduler.start()
+        try:
+            import time
+            while True:
+                time.sleep(300)
+                servers = scheduler.servers()
+                alive = sum(1 for state in servers if state.alive)
+                print(f"— Доступно {alive} из {len(servers)} серверов")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            KeyLoader.remove_update_listener(on_update)
+            print("\nОстановка мониторинга...")
+            scheduler.stop(timeout=5)
 
 
 def main():
@@ -199,6 +330,9 @@ def main():
 Примеры использования:
   python vpn_client.py connect "vless://uuid@example.com:443?security=tls&sni=example.com#MyServer"
   python vpn_client.py connect "vless://..." --port 10808
+  python vpn_client.py connect --auto
+  python vpn_client.py connect --auto --security reality --server-port 443 --no-fail-within 3600
+  python vpn_client.py monitor --rate 2
   python vpn_client.py disconnect
   python vpn_client.py status
         """
@@ -213,6 +347,24 @@ def main():
                                 help='Локальный порт для HTTP прокси (по умолчанию: 10808)')
     connect_parser.add_argument('--socks-port', type=int, default=10809,
                                 help='Локальный порт для SOCKS5 прокси (по умолчанию: 10809)')
+    connect_parser.add_argument('--probe-target', type=TunnelProbe.parse_target,
+                                default=f"{TunnelProbe.TARGET_HOST}:{TunnelProbe.TARGET_PORT}",
+                                help='Цель проверки туннеля, хост:порт '
+                                     f'(по умолчанию: {TunnelProbe.TARGET_HOST}:{TunnelProbe.TARGET_PORT})')
+    connect_parser.add_argument('--auto', action='store_true',
+                                help='Автоматически выбрать лучший сервер из текущего списка ключей')
+    connect_parser.add_argument('--top', type=int, default=AutoSelector.TOP_N,
+                                help=f'Сколько лучших серверов показать при --auto (по умолчанию: {AutoSelector.TOP_N})')
+    connect_parser.add_argument('--deadline', type=float, default=AutoSelector.DEADLINE,
+                                help=f'Срок автовыбора в секундах (по умолчанию: {AutoSelector.DEADLINE})')
+    connect_parser.add_argument('--security', choices=['none', 'tls', 'reality'],
+                                help='При --auto: только ключи с этим типом безопасности')
+    connect_parser.add_argument('--transport',
+                                help='При --auto: только ключи с этим транспортом (tcp, ws, grpc, ...)')
+    connect_parser.add_argument('--server-port', type=int,
+                                help='При --auto: только ключи с этим портом сервера')
+    connect_parser.add_argument('--no-fail-within', type=float, metavar='SEC',
+                                help='При --auto: исключить ключи со сбоем за последние SEC секунд')
     
     # Команда menu
     subparsers.add_parser('menu', help='Открыть меню выбора сервера')
@@ -223,12 +375,29 @@ def main():
     # Команда status
     subparsers.add_parser('status', help='Показать статус подключения')
     
+    # Команда monitor
+    monitor_parser = subparsers.add_parser('monitor', help='Непрерывно проверять серверы из списка ключей')
+    monitor_parser.add_argument('--rate', type=float, default=ProbeScheduler.RATE,
+                                help=f'Проверок в секунду (по умолчанию: {ProbeScheduler.RATE:g})')
+    monitor_parser.add_argument('--sockets', type=int, default=ProbeScheduler.MAX_SOCKETS,
+                                help=f'Одновременных подключений (по умолчанию: {ProbeScheduler.MAX_SOCKETS})')
+    
     args = parser.parse_args()
     
     if not args.command:
         # Если команда не указана, показываем меню
         args.command = 'menu'
-    
+
+    if args.command == 'connect' and args.url:
+        # URL задает сервер явно - автовыбор и его фильтры с ним несовместимы
+        conflicting = [flag for flag, value in (
+            ('--auto', args.auto), ('--security', args.security),
+            ('--transport', args.transport), ('--server-port', args.server_port),
+            ('--no-fail-within', args.no_fail_within)
+        ) if value not in (None, False)]
+        if conflicting:
+            connect_parser.error(f"{', '.join(conflicting)}: нельзя использовать вместе с URL")
+
     client = VPNClient()
     
     # Регистрируем обработчик для корректного завершения
@@ -278,11 +447,22 @@ def main():
     
     # Выполняем команду
     if args.command == 'connect':
-        # Если URL не указан, показываем меню
+        # Если URL не указан, выбираем сервер автоматически или показываем меню
         if not args.url:
-            selected_url = Menu.select_key()
+            if args.auto:
+                criteria = {name: value for name, value in (
+                    ('security', args.security), ('transport', args.transport),
+                    ('port', args.server_port), ('not_failed_within', args.no_fail_within)
+                ) if value is not None}
+                selected_url = AutoSelector.select(deadline=args.deadline, top_n=args.top,
+                                                   criteria=criteria)
+            else:
+                selected_url = Menu.select_key()
             if not selected_url:
-                print("\nПодключение отменено. Закройте окно для выхода.")
+                if args.auto:
+                    print("\nАвтовыбор не удался. Закройте окно для выхода.")
+                else:
+                    print("\nПодключение отменено. Закройте окно для выхода.")
                 try:
                     # Ожидаем закрытия окна
                     import time
@@ -293,7 +473,8 @@ def main():
                 return
             args.url = selected_url
         
-        if client.connect(args.url, local_port=args.port, socks_port=args.socks_port):
+        if client.connect(args.url, local_port=args.port, socks_port=args.socks_port,
+                          probe_target=args.probe_target):
             try:
                 # Ожидаем закрытия окна (бесконечный цикл)
                 # VPN работает постоянно, пока окно открыто
@@ -376,6 +557,9 @@ def main():
     
     elif args.command == 'status':
         client.status()
+    
+    elif args.command == 'monitor':
+        client.monitor(rate=args.rate, max_sockets=args.sockets)
 
 
 if __name__ == '__main__':
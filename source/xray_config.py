@@ -4,6 +4,8 @@
 import json
 from typing import Dict
 
+from vless_parser import VlessKey
+
 
 class XrayConfigGenerator:
     """Генератор конфигурации для Xray"""
@@ -15,7 +17,57 @@ class XrayConfigGenerator:
         Генерирует конфигурацию Xray на основе параметров VLESS
         
         Args:
-            vless_params: Параметры из парсера VLESS URL
+            vless_params: Параметры из парсера VLESS URL (словарь или VlessKey)
+            local_port: Локальный порт для HTTP прокси
+            socks_port: Локальный порт для SOCKS5 прокси
+        """
+        return XrayConfigGenerator.build_config(
+            XrayConfigGenerator.generate_outbound(vless_params),
+            local_port=local_port,
+            socks_port=socks_port
+        )
+    
+    @staticmethod
+    def generate_outbound(vless_params: Dict[str, any]) -> Dict:
+        """
+        Генерирует outbound VLESS (вместе с streamSettings)
+        
+        Эта часть конфигурации зависит только от ключа и не зависит
+        от локальных портов, поэтому ее можно кэшировать.
+        
+        Args:
+            vless_params: VlessKey или словарь VLESSURLParser.parse
+        """
+        key = vless_params if isinstance(vless_params, VlessKey) else VlessKey.from_dict(vless_params)
+        
+        return {
+            "protocol": "vless",
+            "settings": {
+                "vnext": [
+                    {
+                        "address": key.host,
+                        "port": key.port,
+                        "users": [
+                            {
+                                "id": key.uuid,
+                                "encryption": key.encryption,
+                                "flow": key.flow
+                            }
+                        ]
+                    }
+                ]
+            },
+            "streamSettings": XrayConfigGenerator._generate_stream_settings(key),
+            "tag": "proxy"
+        }
+    
+    @staticmethod
+    def build_config(outbound: Dict, local_port: int = 10808, socks_port: int = 10809) -> Dict:
+        """
+        Собирает полную конфигурацию Xray из готового outbound и локальных портов
+        
+        Args:
+            outbound: Результат generate_outbound (включается без копирования)
             local_port: Локальный порт для HTTP прокси
             socks_port: Локальный порт для SOCKS5 прокси
         """
@@ -43,26 +95,7 @@ class XrayConfigGenerator:
                 }
             ],
             "outbounds": [
-                {
-                    "protocol": "vless",
-                    "settings": {
-                        "vnext": [
-                            {
-                                "address": vless_params['host'],
-                                "port": vless_params['port'],
-                                "users": [
-                                    {
-                                        "id": vless_params['uuid'],
-                                        "encryption": vless_params.get('encryption', 'none'),
-                                        "flow": vless_params.get('flow', '')
-                                    }
-                                ]
-                            }
-                        ]
-                    },
-                    "streamSettings": XrayConfigGenerator._generate_stream_settings(vless_params),
-                    "tag": "proxy"
-                },
+                outbound,
                 {
                     "protocol": "freedom",
                     "tag": "direct"
@@ -85,10 +118,10 @@ class XrayConfigGenerator:
         return config
     
     @staticmethod
-    def _generate_stream_settings(vless_params: Dict[str, any]) -> Dict:
+    def _generate_stream_settings(key: VlessKey) -> Dict:
         """Генерирует настройки потока в зависимости от типа"""
-        stream_type = vless_params.get('type', 'tcp')
-        security = vless_params.get('security', 'none')
+        stream_type = key.type
+        security = key.security
         
         stream_settings = {
             "network": stream_type
@@ -98,35 +131,23 @@ class XrayConfigGenerator:
         if security in ['tls', 'reality']:
             tls_settings = {
                 "allowInsecure": False,
-                "serverName": vless_params.get('sni', vless_params['host'])
+                "serverName": key.sni if key.sni is not None else key.host
             }
             
-            if 'alpn' in vless_params:
-                tls_settings["alpn"] = vless_params['alpn']
+            if key.alpn is not None:
+                tls_settings["alpn"] = list(key.alpn)
             
             if security == 'reality':
                 # Проверяем наличие обязательных параметров для Reality
-                # Пробуем разные способы получения параметров
-                pbk = (vless_params.get('pbk') or 
-                       vless_params.get('params', {}).get('pbk') or
-                       vless_params.get('params', {}).get('pbk', ''))
-                
-                sid = (vless_params.get('sid') or 
-                      vless_params.get('params', {}).get('sid') or
-                      vless_params.get('params', {}).get('sid', ''))
-                
-                # Если параметры не найдены, пробуем извлечь из params напрямую
-                if not pbk and 'params' in vless_params:
-                    pbk = vless_params['params'].get('pbk', '')
-                if not sid and 'params' in vless_params:
-                    sid = vless_params['params'].get('sid', '')
+                pbk = key.pbk or ''
+                sid = key.sid or ''
                 
                 if not pbk or not sid:
                     error_msg = (
                         f"Для Reality требуются обязательные параметры: pbk (publicKey) и sid (shortId).\n"
                         f"Найдено: pbk={'есть (' + pbk[:20] + '...)' if pbk else 'нет'}, "
                         f"sid={'есть (' + sid + ')' if sid else 'нет'}\n"
-                        f"Доступные параметры: {list(vless_params.keys())}"
+                        f"Доступные параметры: {[name for name, _ in key.params]}"
                     )
                     raise ValueError(error_msg)
                 
@@ -134,43 +155,19 @@ class XrayConfigGenerator:
                 reality_config = {
                     "show": False,
                     "xver": 0,
-                    "publicKey": str(pbk).strip()  # Обязательный параметр
+                    "publicKey": pbk.strip()  # Обязательный параметр
                 }
                 
-                # Short ID (sid в URL) - обязательный параметр
-                if sid:
-                    sid_str = str(sid).strip()
-                    # Может быть несколько через запятую
-                    if ',' in sid_str:
-                        reality_config["shortId"] = [s.strip() for s in sid_str.split(',')]
-                    else:
-                        reality_config["shortId"] = [sid_str]
-                
-                # Server names (sni в URL) - обязательный параметр
-                sni_value = (vless_params.get('sni') or 
-                            vless_params.get('params', {}).get('sni') or 
-                            vless_params.get('host', ''))
+                # Short ID (sid в URL) - обязательный параметр, может быть несколько через запятую
+                reality_config["shortId"] = [s.strip() for s in sid.strip().split(',')]
                 
-                if not sni_value:
-                    sni_value = vless_params.get('host', '')
-                
-                if sni_value:
-                    sni_str = str(sni_value).strip()
-                    if ',' in sni_str:
-                        reality_config["serverNames"] = [s.strip() for s in sni_str.split(',')]
-                    else:
-                        reality_config["serverNames"] = [sni_str]
-                else:
-                    # Если нет sni, используем host
-                    reality_config["serverNames"] = [str(vless_params.get('host', '')).strip()]
+                # Server names (sni в URL), без sni - host
+                sni_value = (key.sni or key.host).strip()
+                reality_config["serverNames"] = [s.strip() for s in sni_value.split(',')]
                 
                 # Fingerprint (fp в URL) - опциональный
-                fp = (vless_params.get('fp') or 
-                     vless_params.get('params', {}).get('fp') or
-                     vless_params.get('params', {}).get('fp', ''))
-                
-                if fp and str(fp).strip():
-                    reality_config["fingerprint"] = str(fp).strip()
+                if key.fp and key.fp.strip():
+                    reality_config["fingerprint"] = key.fp.strip()
                 
                 # Убеждаемся, что конфигурация не пустая
                 if not reality_config.get("publicKey") or not reality_config.get("shortId"):
@@ -186,31 +183,27 @@ class XrayConfigGenerator:
         
         # Настройки для WebSocket
         if stream_type == 'ws':
-            ws_settings = {
-                "path": vless_params.get('path', '/')
-            }
-            if 'host_header' in vless_params:
-                ws_settings["headers"] = {
-                    "Host": vless_params['host_header']
+            stream_settings["wsSettings"] = {
+                "path": key.path,
+                "headers": {
+                    "Host": key.host_header
                 }
-            stream_settings["wsSettings"] = ws_settings
+            }
         
         # Настройки для gRPC
         elif stream_type == 'grpc':
             stream_settings["grpcSettings"] = {
-                "serviceName": vless_params.get('serviceName', '')
+                "serviceName": key.service_name
             }
         
         # Настройки для TCP
         elif stream_type == 'tcp':
-            header_type = vless_params.get('headerType', 'none')
-            if header_type != 'none':
-                tcp_settings = {
+            if key.header_type != 'none':
+                stream_settings["tcpSettings"] = {
                     "header": {
-                        "type": header_type
+                        "type": key.header_type
                     }
                 }
-                stream_settings["tcpSettings"] = tcp_settings
         
         return stream_settings
     
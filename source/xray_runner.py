@@ -23,6 +23,9 @@ class XrayRunner:
         self.xray_path = xray_path or self._find_xray()
         self.process = None
         self.config_path = 'config.json'
+        # Код выхода, если Xray запустился, но сразу завершился (ошибка конфигурации
+        # или ключа, а не окружения); None - такого не было
+        self.last_exit_code = None
     
     def _find_xray(self) -> str:
         """Ищет исполняемый файл Xray"""
@@ -73,6 +76,7 @@ class XrayRunner:
         Returns:
             True если процесс запущен успешно
         """
+        self.last_exit_code = None
         if not os.path.exists(config_path):
             print(f"✗ Файл конфигурации не найден: {config_path}")
             return False
@@ -160,6 +164,7 @@ class XrayRunner:
             else:
                 # Процесс завершился, получаем вывод ошибок
                 stdout, stderr = self.process.communicate()
+                self.last_exit_code = self.process.returncode
                 print(f"✗ Xray завершился с ошибкой (код: {self.process.returncode})")
                 
                 # Показываем ошибки
@@ -178,8 +183,9 @@ class XrayRunner:
                     error_lines = error_output.split('\n')[:10]
                     for line in error_lines:
                         print(f"  {line}")
-                    if len(error_output.split('\n')) > 10:
-                        print(f"  ... (еще {len(error_output.split('\n')) - 10} строк)")
+                    line_count = len(error_output.split('\n'))
+                    if line_count > 10:
+                        print(f"  ... (еще {line_count - 10} строк)")
                     print("=" * 60)
                     
                     # Проверяем типичные ошибки